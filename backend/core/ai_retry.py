@@ -10,8 +10,13 @@ from tenacity import (
     retry_if_exception,
     before_sleep_log,
 )
+import asyncio
+import contextvars
 import logging
-from typing import Callable, TypeVar, Any
+import os
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Dict, Optional, TypeVar, Any
 from functools import wraps
 import time
 
@@ -30,10 +35,80 @@ class AIRateLimitError(Exception):
     pass
 
 
+class AIProviderUnavailableError(Exception):
+    """服务商熔断中或本地限流排队超时：应快速失败/切换服务商，不做重试"""
+    pass
+
+
+class AIDeadlineExceededError(TimeoutError):
+    """调用的截止时间已过，不再重试"""
+    pass
+
+
+# 当前调用链的截止时间（time.monotonic），线程与协程各自独立；由 ai_deadline 设置，向下传给 HTTP 超时
+_deadline: contextvars.ContextVar = contextvars.ContextVar("ai_deadline", default=None)
+
+
+@contextmanager
+def ai_deadline(seconds: float):
+    """
+    在当前线程/协程上下文中设置截止时间；嵌套时取更早的那个
+    """
+    deadline = time.monotonic() + max(0.0, float(seconds))
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time(default: Optional[float] = None) -> Optional[float]:
+    """
+    距截止时间的剩余秒数；没有截止时间时返回 default，有 default 时取两者较小值
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return default
+    remaining = max(0.0, deadline - time.monotonic())
+    return remaining if default is None else min(float(default), remaining)
+
+
+def check_deadline(what: str = "AI call") -> None:
+    if remaining_time() == 0.0:
+        raise AIDeadlineExceededError(f"{what} exceeded its deadline")
+
+
+def _deadline_stop(backoff: Callable[[Any], float]) -> Callable[[Any], bool]:
+    """
+    截止时间已到，或下一次退避等待会睡到截止时间之后时停止重试（继续等也来不及再发一次请求）
+    """
+    def _stop(retry_state: Any) -> bool:
+        remaining = remaining_time()
+        if remaining is None:
+            return False
+        return remaining <= 0.0 or backoff(retry_state) >= remaining
+    return _stop
+
+
+def _deadline_capped(backoff: Callable[[Any], float]) -> Callable[[Any], float]:
+    """退避等待不超过剩余时间"""
+    def _wait(retry_state: Any) -> float:
+        delay = backoff(retry_state)
+        remaining = remaining_time()
+        return delay if remaining is None else max(0.0, min(delay, remaining))
+    return _wait
+
+
 def should_retry_ai_error(exception: BaseException) -> bool:
     """
     判断是否应该重试的错误
     """
+    if isinstance(exception, (AIProviderUnavailableError, AIDeadlineExceededError)):
+        return False
+
     # 网络相关错误
     if isinstance(exception, (AIServiceUnavailableError, ConnectionError)):
         return True
@@ -72,9 +147,10 @@ def ai_retry(
         max_wait: 最大等待时间（秒）
         exponential_base: 指数退避基数
     """
+    backoff = wait_exponential(multiplier=1, min=min_wait, max=max_wait, exp_base=exponential_base)
     return retry(
-        stop=stop_after_attempt(max_attempts),
-        wait=wait_exponential(multiplier=1, min=min_wait, max=max_wait, exp_base=exponential_base),
+        stop=stop_after_attempt(max_attempts) | _deadline_stop(backoff),
+        wait=_deadline_capped(backoff),
         retry=retry_if_exception(should_retry_ai_error),
         before_sleep=before_sleep_log(logger, logging.WARNING),
         reraise=True,
@@ -109,9 +185,10 @@ def ai_retry_with_fallback(
                 raise exc
             raise RuntimeError("AI service failed after retries, but no exception captured")
 
+        backoff = wait_exponential(multiplier=1, min=1.0, max=10.0)
         decorated = retry(
-            stop=stop_after_attempt(max_attempts),
-            wait=wait_exponential(multiplier=1, min=1.0, max=10.0),
+            stop=stop_after_attempt(max_attempts) | _deadline_stop(backoff),
+            wait=_deadline_capped(backoff),
             retry=retry_if_exception(should_retry_ai_error),
             before_sleep=before_sleep_log(logger, logging.WARNING),
             retry_error_callback=_retry_error_callback,
@@ -122,6 +199,272 @@ def ai_retry_with_fallback(
     return decorator
 
 
+AI_PROVIDER_RATE_PER_MINUTE = float(os.getenv("AI_PROVIDER_RATE_PER_MINUTE", "120"))
+AI_PROVIDER_BURST = max(1, int(os.getenv("AI_PROVIDER_BURST", "10")))
+AI_PROVIDER_MAX_IN_FLIGHT = max(1, int(os.getenv("AI_PROVIDER_MAX_IN_FLIGHT", "4")))
+AI_PROVIDER_ACQUIRE_TIMEOUT_SECONDS = float(os.getenv("AI_PROVIDER_ACQUIRE_TIMEOUT_SECONDS", "30"))
+AI_BREAKER_FAILURE_THRESHOLD = max(1, int(os.getenv("AI_BREAKER_FAILURE_THRESHOLD", "5")))
+AI_BREAKER_RECOVERY_SECONDS = float(os.getenv("AI_BREAKER_RECOVERY_SECONDS", "60"))
+
+
+class TokenBucket:
+    """
+    令牌桶：rate_per_sec 速率补充，最多积攒 capacity 个；rate_per_sec<=0 表示不限速
+    """
+
+    def __init__(self, rate_per_sec: float, capacity: int):
+        self.rate = float(rate_per_sec)
+        self.capacity = float(max(1, capacity))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take_or_wait_locked(self) -> float:
+        """拿到令牌返回 0，否则返回还需等待的秒数"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def try_acquire(self) -> float:
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            return self._take_or_wait_locked()
+
+    def acquire(self, timeout: float) -> bool:
+        deadline = time.monotonic() + max(0.0, timeout)
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    async def acquire_async(self, timeout: float) -> bool:
+        deadline = time.monotonic() + max(0.0, timeout)
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+    def available(self) -> float:
+        if self.rate <= 0:
+            return self.capacity
+        with self._lock:
+            elapsed = time.monotonic() - self._updated
+            return min(self.capacity, self._tokens + elapsed * self.rate)
+
+
+class CircuitBreaker:
+    """
+    熔断器：closed 下连续失败 failure_threshold 次转 open；open 持续 recovery_seconds 后转 half_open，
+    只放行一个探测请求，成功则 closed，失败则重新 open
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, recovery_seconds: float):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.recovery_seconds = float(recovery_seconds)
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._trips = 0
+        self._lock = threading.Lock()
+
+    def _state_locked(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_seconds:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state_locked()
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state_locked()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            state = self._state_locked()
+            self._failures += 1
+            if state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if state != self.OPEN:
+                    self._trips += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """探测请求既不算成功也不算失败（如非服务商原因的报错）时归还探测名额"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            state = self._state_locked()
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "trips": self._trips,
+                "retry_in_seconds": (
+                    max(0.0, self.recovery_seconds - (time.monotonic() - self._opened_at)) if state == self.OPEN else 0.0
+                ),
+            }
+
+
+class ProviderGuard:
+    """
+    单个 AI 服务商（按 base_url 区分）的令牌桶 + 最大并发 + 熔断。
+    熔断中或排队超过 acquire_timeout 时抛 AIProviderUnavailableError，不在调度线程里长时间阻塞
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate_per_minute: float = AI_PROVIDER_RATE_PER_MINUTE,
+        burst: int = AI_PROVIDER_BURST,
+        max_in_flight: int = AI_PROVIDER_MAX_IN_FLIGHT,
+        failure_threshold: int = AI_BREAKER_FAILURE_THRESHOLD,
+        recovery_seconds: float = AI_BREAKER_RECOVERY_SECONDS,
+    ):
+        self.name = name
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.bucket = TokenBucket(float(rate_per_minute) / 60.0, burst)
+        self.breaker = CircuitBreaker(failure_threshold, recovery_seconds)
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = {"calls": 0, "successes": 0, "failures": 0, "rejected_open": 0, "rejected_busy": 0}
+
+    def is_available(self) -> bool:
+        return self.breaker.state != CircuitBreaker.OPEN
+
+    def _count(self, key: str, delta: int = 1) -> None:
+        with self._lock:
+            self._stats[key] += delta
+
+    def _admit(self) -> None:
+        if not self.breaker.allow():
+            self._count("rejected_open")
+            raise AIProviderUnavailableError(f"AI provider {self.name} circuit is open")
+
+    def _reject_busy(self) -> None:
+        self.breaker.release_probe()
+        self._count("rejected_busy")
+        raise AIProviderUnavailableError(f"AI provider {self.name} is saturated")
+
+    def _finish(self, exc: Optional[BaseException]) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+        if exc is None:
+            self.breaker.record_success()
+            self._count("successes")
+        elif should_retry_ai_error(exc):
+            self.breaker.record_failure()
+            self._count("failures")
+        else:
+            self.breaker.release_probe()
+            self._count("failures")
+
+    def _enter(self) -> None:
+        with self._lock:
+            self._in_flight += 1
+            self._stats["calls"] += 1
+
+    @contextmanager
+    def slot(self, timeout: float = AI_PROVIDER_ACQUIRE_TIMEOUT_SECONDS):
+        timeout = remaining_time(timeout)
+        self._admit()
+        deadline = time.monotonic() + max(0.0, timeout)
+        if not self.bucket.acquire(timeout):
+            self._reject_busy()
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            self._reject_busy()
+        self._enter()
+        try:
+            yield
+        except BaseException as e:
+            self._finish(e)
+            raise
+        self._finish(None)
+
+    @asynccontextmanager
+    async def async_slot(self, timeout: float = AI_PROVIDER_ACQUIRE_TIMEOUT_SECONDS):
+        timeout = remaining_time(timeout)
+        self._admit()
+        deadline = time.monotonic() + max(0.0, timeout)
+        if not await self.bucket.acquire_async(timeout):
+            self._reject_busy()
+        # 不在事件循环里阻塞等信号量：非阻塞尝试，拿不到就让出后重试
+        while not self._slots.acquire(blocking=False):
+            if time.monotonic() >= deadline:
+                self._reject_busy()
+            await asyncio.sleep(0.05)
+        self._enter()
+        try:
+            yield
+        except BaseException as e:
+            self._finish(e)
+            raise
+        self._finish(None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["in_flight"] = self._in_flight
+        out["max_in_flight"] = self.max_in_flight
+        out["tokens_available"] = round(self.bucket.available(), 2)
+        out.update(self.breaker.stats())
+        return out
+
+
+_provider_guards: Dict[str, ProviderGuard] = {}
+_provider_guards_lock = threading.Lock()
+
+
+def get_provider_guard(name: str) -> ProviderGuard:
+    with _provider_guards_lock:
+        guard = _provider_guards.get(name)
+        if guard is None:
+            guard = ProviderGuard(name)
+            _provider_guards[name] = guard
+        return guard
+
+
+def get_provider_stats() -> dict:
+    with _provider_guards_lock:
+        guards = list(_provider_guards.values())
+    return {g.name: g.stats() for g in guards}
+
+
 class RetryableAIService:
     """
     可重试的AI服务包装器
@@ -171,7 +514,8 @@ class RetryableAIService:
         **kwargs: Any
     ) -> T:
         """
-        执行带超时的AI服务调用
+        执行带超时的AI服务调用。可在任意线程中使用：在调用方线程内以 ai_deadline(timeout) 执行，
+        截止时间传给被调函数（AIService 据此设置 HTTP 超时）并约束重试与退避，不另开线程
 
         Args:
             func: 要执行的函数
@@ -183,32 +527,48 @@ class RetryableAIService:
             函数执行结果
 
         Raises:
-            TimeoutError: 超时异常
+            AIDeadlineExceededError: 超时异常（TimeoutError 子类）
         """
-        import signal
-
-        def timeout_handler(signum, frame):
-            raise TimeoutError(f"Call to {func.__name__} timed out after {timeout}s")
-
-        # 设置超时信号
-        old_handler = signal.signal(signal.SIGALRM, timeout_handler)
-        signal.alarm(int(timeout))
-
-        try:
-            result = self.call_with_retry(func, *args, **kwargs)
-            return result
-        finally:
-            signal.alarm(0)
-            signal.signal(signal.SIGALRM, old_handler)
+        timeout = remaining_time(timeout)
+        with ai_deadline(timeout):
+            check_deadline(f"Call to {getattr(func, '__name__', func)}")
+            try:
+                return self.call_with_retry(func, *args, **kwargs)
+            except AIDeadlineExceededError:
+                raise
+            except Exception as e:
+                if remaining_time() == 0.0:
+                    raise AIDeadlineExceededError(f"Call to {getattr(func, '__name__', func)} timed out after {timeout}s") from e
+                raise
+
+    async def call_with_timeout_async(
+        self,
+        func: Callable[..., Any],
+        timeout: float,
+        *args: Any,
+        **kwargs: Any
+    ) -> Any:
+        """
+        call_with_timeout 的协程版本：func 返回协程，超时后取消该协程
+        """
+        timeout = remaining_time(timeout)
+        self._call_count += 1
+        with ai_deadline(timeout):
+            try:
+                return await asyncio.wait_for(func(*args, **kwargs), timeout=timeout)
+            except asyncio.TimeoutError:
+                self._failure_count += 1
+                raise AIDeadlineExceededError(f"Call to {getattr(func, '__name__', func)} timed out after {timeout}s")
 
-    def get_stats(self) -> dict[str, int]:
+    def get_stats(self) -> dict:
         """
-        获取调用统计信息
+        获取调用统计信息（providers 为各服务商的限流与熔断状态）
 
         Returns:
             统计信息字典
         """
         return {
+            "providers": get_provider_stats(),
             "total_calls": self._call_count,
             "retries": self._retry_count,
             "failures": self._failure_count,
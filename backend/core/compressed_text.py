@@ -0,0 +1,77 @@
+"""
+透明压缩的文本列
+超过阈值的字符串压缩后以带标记前缀的 BLOB 写入；读取时按前缀解压，旧的明文行原样返回
+"""
+
+import os
+import zlib
+from typing import Optional, Union
+
+from sqlalchemy.types import Text, TypeDecorator
+
+LOG_BLOB_COMPRESSION = str(os.getenv("LOG_BLOB_COMPRESSION", "zlib")).strip().lower()
+LOG_BLOB_COMPRESS_MIN_BYTES = max(0, int(os.getenv("LOG_BLOB_COMPRESS_MIN_BYTES", "512")))
+LOG_BLOB_ZLIB_LEVEL = min(9, max(1, int(os.getenv("LOG_BLOB_ZLIB_LEVEL", "6"))))
+
+_ZLIB_MARKER = b"\x00ZLIB1:"
+_ZSTD_MARKER = b"\x00ZSTD1:"
+
+
+def _zstd():
+    try:
+        import zstandard
+
+        return zstandard
+    except ImportError:
+        return None
+
+
+def compress_text(text: Optional[str], codec: str = LOG_BLOB_COMPRESSION) -> Union[str, bytes, None]:
+    """
+    压缩字符串；codec 为 none、内容过短或压缩后不更小时返回原字符串
+    """
+    if text is None or codec in ("", "none", "off", "0"):
+        return text
+    raw = text.encode("utf-8")
+    if len(raw) < LOG_BLOB_COMPRESS_MIN_BYTES:
+        return text
+
+    packed = None
+    if codec == "zstd":
+        zstandard = _zstd()
+        if zstandard is not None:
+            packed = _ZSTD_MARKER + zstandard.ZstdCompressor(level=10).compress(raw)
+    if packed is None:
+        packed = _ZLIB_MARKER + zlib.compress(raw, LOG_BLOB_ZLIB_LEVEL)
+    return packed if len(packed) < len(raw) else text
+
+
+def decompress_text(value: Union[str, bytes, memoryview, None]) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    data = bytes(value)
+    if data.startswith(_ZLIB_MARKER):
+        return zlib.decompress(data[len(_ZLIB_MARKER):]).decode("utf-8")
+    if data.startswith(_ZSTD_MARKER):
+        zstandard = _zstd()
+        if zstandard is None:
+            raise RuntimeError("zstd-compressed log blob found but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data[len(_ZSTD_MARKER):]).decode("utf-8")
+    return data.decode("utf-8", errors="replace")
+
+
+class CompressedText(TypeDecorator):
+    """
+    Text 列的透明压缩。SQLite 的 TEXT 列可直接存 BLOB，无需迁移表结构，新旧数据可以混存
+    """
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress_text(str(value))
+
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
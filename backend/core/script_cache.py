@@ -0,0 +1,63 @@
+"""
+用户脚本编译缓存
+按源码 sha256 缓存 code object，同一脚本只编译一次；脚本被修改/删除时由路由主动失效
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from types import CodeType
+
+SCRIPT_CACHE_MAX_ENTRIES = max(1, int(os.getenv("SCRIPT_CACHE_MAX_ENTRIES", "512")))
+
+_lock = threading.Lock()
+_codes: "OrderedDict[tuple, CodeType]" = OrderedDict()
+_stats = {"hits": 0, "compiles": 0, "invalidations": 0}
+
+
+def script_hash(source: str) -> str:
+    return hashlib.sha256((source or "").encode("utf-8")).hexdigest()
+
+
+def compile_script(source: str, filename: str = "<string>") -> CodeType:
+    """
+    返回脚本的 code object；语法错误照常抛出 SyntaxError，且不会被缓存
+    """
+    key = (script_hash(source), filename)
+    with _lock:
+        code = _codes.get(key)
+        if code is not None:
+            _codes.move_to_end(key)
+            _stats["hits"] += 1
+            return code
+
+    code = compile(source, filename, "exec")
+    with _lock:
+        _codes[key] = code
+        _codes.move_to_end(key)
+        _stats["compiles"] += 1
+        while len(_codes) > SCRIPT_CACHE_MAX_ENTRIES:
+            _codes.popitem(last=False)
+    return code
+
+
+def invalidate_script(source: str | None) -> None:
+    """丢弃某段源码对应的全部缓存条目（脚本更新/删除时调用）"""
+    if not source:
+        return
+    h = script_hash(source)
+    with _lock:
+        for key in [k for k in _codes if k[0] == h]:
+            _codes.pop(key, None)
+            _stats["invalidations"] += 1
+
+
+def clear_script_cache() -> None:
+    with _lock:
+        _codes.clear()
+
+
+def get_script_cache_stats() -> dict:
+    with _lock:
+        return {"entries": len(_codes), "max_entries": SCRIPT_CACHE_MAX_ENTRIES, **_stats}
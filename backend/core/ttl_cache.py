@@ -0,0 +1,135 @@
+"""
+进程内 TTL + LRU 缓存
+按条数与估算字节数双重限额，线程安全
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+
+def estimate_size(value: Any) -> int:
+    """
+    估算缓存值占用的字节数：DataFrame 用 memory_usage(deep=True)，字符串/bytes 用长度，
+    其它对象按 1 KB 粗估
+    """
+    try:
+        import pandas as pd
+
+        if isinstance(value, pd.DataFrame):
+            return int(value.memory_usage(deep=True).sum())
+        if isinstance(value, pd.Series):
+            return int(value.memory_usage(deep=True))
+    except Exception:
+        pass
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8", errors="ignore"))
+    return 1024
+
+
+class TTLCache:
+    """
+    TTL + LRU 缓存
+
+    Args:
+        max_entries: 最大条数，超出后淘汰最久未使用的条目
+        max_bytes: 估算总字节数上限，0 表示不限
+        default_ttl: 默认存活秒数
+        sizeof: 估算单个值字节数的函数
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        max_bytes: int = 0,
+        default_ttl: float = 60.0,
+        sizeof: Callable[[Any], int] = estimate_size,
+    ):
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self.default_ttl = float(default_ttl)
+        self._sizeof = sizeof
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self._misses += 1
+                return default
+            expires_at, size, value = item
+            if expires_at <= now:
+                self._data.pop(key, None)
+                self._bytes -= size
+                self._misses += 1
+                return default
+            self._data.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl_s = self.default_ttl if ttl is None else float(ttl)
+        if ttl_s <= 0:
+            return
+        size = max(0, int(self._sizeof(value)))
+        if self.max_bytes and size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + ttl_s
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (expires_at, size, value)
+            self._bytes += size
+            self._evict_locked()
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is None:
+                return default
+            self._bytes -= item[1]
+            return item[2]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _evict_locked(self) -> None:
+        now = time.monotonic()
+        for k in [k for k, (exp, _, _) in self._data.items() if exp <= now]:
+            self._bytes -= self._data.pop(k)[1]
+        while self._data and (
+            len(self._data) > self.max_entries or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            _, (_, size, _) = self._data.popitem(last=False)
+            self._bytes -= size
+            self._evictions += 1
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+            }
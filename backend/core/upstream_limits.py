@@ -0,0 +1,110 @@
+"""
+按上游分别限制并发
+akshare / tushare / pytdx / 每个 AI 服务商各自一组信号量，同步调用与 asyncio 调用分别提供
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict
+
+_DEFAULT_LIMITS = {
+    "akshare": 8,
+    "tushare": 4,
+    "pytdx": 8,
+    "ai": 4,
+}
+
+_lock = threading.Lock()
+_sync_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+# 事件循环被回收后其信号量随之释放
+_async_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+# 正在占用名额的调用数，只用于统计
+_sync_in_use: Dict[str, int] = {}
+_async_in_use: Dict[str, int] = {}
+
+
+def upstream_limit(name: str) -> int:
+    """
+    读取上游并发上限：UPSTREAM_LIMIT_<KIND>，AI 服务商按 "ai:<provider>" 命名、共用 UPSTREAM_LIMIT_AI
+    """
+    kind = str(name).split(":", 1)[0]
+    default = _DEFAULT_LIMITS.get(kind, 4)
+    try:
+        return max(1, int(os.getenv(f"UPSTREAM_LIMIT_{kind.upper()}", str(default))))
+    except Exception:
+        return default
+
+
+def ai_upstream_name(ai_config: dict) -> str:
+    """AI 服务商的上游名：按 base_url 区分，同一服务商的不同模型共享额度"""
+    base_url = str((ai_config or {}).get("base_url") or "").strip().lower().rstrip("/")
+    return f"ai:{base_url or 'default'}"
+
+
+def _sync_semaphore(name: str) -> threading.BoundedSemaphore:
+    with _lock:
+        sem = _sync_semaphores.get(name)
+        if sem is None:
+            sem = threading.BoundedSemaphore(upstream_limit(name))
+            _sync_semaphores[name] = sem
+        return sem
+
+
+def _async_semaphore(name: str) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    with _lock:
+        per_loop = _async_semaphores.get(loop)
+        if per_loop is None:
+            per_loop = {}
+            _async_semaphores[loop] = per_loop
+        sem = per_loop.get(name)
+        if sem is None:
+            sem = asyncio.Semaphore(upstream_limit(name))
+            per_loop[name] = sem
+        return sem
+
+
+def _track(counter: Dict[str, int], name: str, delta: int) -> None:
+    with _lock:
+        counter[name] = counter.get(name, 0) + delta
+
+
+@contextmanager
+def upstream_slot(name: str):
+    """同步调用占用一个上游名额"""
+    sem = _sync_semaphore(name)
+    sem.acquire()
+    _track(_sync_in_use, name, 1)
+    try:
+        yield
+    finally:
+        _track(_sync_in_use, name, -1)
+        sem.release()
+
+
+@asynccontextmanager
+async def async_upstream_slot(name: str):
+    """协程占用一个上游名额；信号量按事件循环隔离"""
+    sem = _async_semaphore(name)
+    async with sem:
+        _track(_async_in_use, name, 1)
+        try:
+            yield
+        finally:
+            _track(_async_in_use, name, -1)
+
+
+def get_upstream_stats() -> dict:
+    with _lock:
+        out = {}
+        for name in _sync_semaphores:
+            in_use = _sync_in_use.get(name, 0)
+            out[name] = {"limit": upstream_limit(name), "sync_in_use": in_use, "sync_available": upstream_limit(name) - in_use}
+        for name, in_use in _async_in_use.items():
+            entry = out.setdefault(name, {"limit": upstream_limit(name)})
+            entry["async_in_use"] = in_use
+            entry["async_available"] = max(0, upstream_limit(name) - in_use)
+        return out
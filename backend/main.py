@@ -10,6 +10,8 @@ if _backend_dir not in sys.path:
 
 from routers import stocks, ai_configs, logs, indicators, settings, screeners, research, rules, news
 from services.monitor_service import start_scheduler
+from services.signal_cache import last_signal_cache
+from services.log_writer import log_writer
 from services.screener_service import restore_screener_jobs
 from services.streamlit_service import start_streamlit, stop_streamlit
 from database import Base, engine
@@ -44,6 +46,12 @@ def ensure_db_schema():
         if "post_process_json" not in cols:
             with engine.begin() as conn:
                 conn.execute(text("ALTER TABLE indicator_definitions ADD COLUMN post_process_json TEXT"))
+        if "cache_ttl_seconds" not in cols:
+            with engine.begin() as conn:
+                conn.execute(text("ALTER TABLE indicator_definitions ADD COLUMN cache_ttl_seconds INTEGER"))
+        if "priority" not in cols:
+            with engine.begin() as conn:
+                conn.execute(text("ALTER TABLE indicator_definitions ADD COLUMN priority INTEGER DEFAULT 0"))
 
     if "ai_configs" in inspector.get_table_names():
         cols = {c["name"] for c in inspector.get_columns("ai_configs")}
@@ -62,13 +70,37 @@ def ensure_db_schema():
             with engine.begin() as conn:
                 conn.execute(text("ALTER TABLE stocks ADD COLUMN is_pinned BOOLEAN DEFAULT 0"))
 
+    optimize_db_schema()
+
+# 旧库不会因 create_all 补建索引，这里用 IF NOT EXISTS 补齐（与 models 中的 Index 定义同名）
+_SCHEMA_INDEXES = [
+    ("logs", "ix_logs_stock_id_timestamp", "stock_id, timestamp"),
+    ("logs", "ix_logs_timestamp", "timestamp"),
+    ("screener_results", "ix_screener_results_screener_id_run_at", "screener_id, run_at"),
+    ("stock_news", "ix_stock_news_publish_time", "publish_time"),
+]
+
+def optimize_db_schema():
+    """
+    开启 WAL（库级持久设置，API 读请求不再阻塞调度器写入），补建热点查询索引并刷新统计信息。
+    连接级的 synchronous / cache_size 在 database.py 的 connect 事件里设置。
+    """
+    with engine.connect() as conn:
+        mode = conn.exec_driver_sql("PRAGMA journal_mode=WAL").scalar()
+        print(f"SQLite journal_mode={mode}")
+
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table, index_name, columns in _SCHEMA_INDEXES:
+            if table in tables:
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({columns})"))
+        conn.execute(text("PRAGMA optimize"))
+
 @app.on_event("startup")
 def startup_event():
     ensure_db_schema()
-    # 可选：自动优化数据库索引（首次运行或定期执行）
-    # from db_optimize_indexes import DatabaseIndexOptimizer
-    # optimizer = DatabaseIndexOptimizer()
-    # optimizer.optimize_all_tables()
+    last_signal_cache.warm()
     start_scheduler()
     restore_screener_jobs()
     start_streamlit()
@@ -76,6 +108,7 @@ def startup_event():
 @app.on_event("shutdown")
 def shutdown_event():
     stop_streamlit()
+    log_writer.stop()
 
 @app.get("/")
 def read_root():
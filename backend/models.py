@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Text, DateTime, JSON, Table, Float
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Text, DateTime, JSON, Table, Float, Index
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
 from database import Base
+from core.compressed_text import CompressedText
 
 stock_indicators = Table(
     "stock_indicators",
@@ -76,6 +77,8 @@ class IndicatorDefinition(Base):
     post_process_json = Column(Text, nullable=True)
     python_code = Column(Text, nullable=True)
     is_pinned = Column(Boolean, default=False)
+    cache_ttl_seconds = Column(Integer, nullable=True) # 数据缓存秒数，None 用默认值，0 不缓存
+    priority = Column(Integer, default=0) # AI 上下文超出预算时优先级低的指标先被截短/丢弃
 
     stocks = relationship("Stock", secondary=stock_indicators, back_populates="indicators")
 
@@ -100,13 +103,19 @@ class Log(Base):
     stock_id = Column(Integer, ForeignKey("stocks.id"))
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
     
-    raw_data = Column(Text) # JSON/Text of fetched indicators
-    ai_response = Column(Text) # The raw response from AI
+    # 大字段压缩存储且默认不加载，只有访问时（日志详情、归档）才读取并解压
+    raw_data = deferred(Column(CompressedText), group="blobs") # JSON/Text of fetched indicators
+    ai_response = deferred(Column(CompressedText), group="blobs") # The raw response from AI
     ai_analysis = Column(JSON) # Parsed JSON: {type, message}
     is_alert = Column(Boolean, default=False)
     
     stock = relationship("Stock", back_populates="logs")
 
+    __table_args__ = (
+        Index("ix_logs_stock_id_timestamp", "stock_id", "timestamp"),
+        Index("ix_logs_timestamp", "timestamp"),
+    )
+
 class KnowledgeBase(Base):
     __tablename__ = "knowledge_base"
 
@@ -153,6 +162,10 @@ class ScreenerResult(Base):
 
     screener = relationship("StockScreener", back_populates="results")
 
+    __table_args__ = (
+        Index("ix_screener_results_screener_id_run_at", "screener_id", "run_at"),
+    )
+
 class ResearchScript(Base):
     __tablename__ = "research_scripts"
 
@@ -175,7 +188,7 @@ class StockNews(Base):
     title = Column(String, index=True)
     content = Column(Text)
     source = Column(String, nullable=True) # e.g. "CLS", "EastMoney"
-    publish_time = Column(DateTime(timezone=True), nullable=True)
+    publish_time = Column(DateTime(timezone=True), nullable=True, index=True)
     url = Column(String, nullable=True)
     
     # Optional: if we want to associate with specific stocks (many-to-many is better but string is simpler for now)
@@ -6,6 +6,7 @@ import models
 import schemas
 import json
 from services.data_fetcher import data_fetcher
+from core.script_cache import invalidate_script
 
 router = APIRouter(prefix="/indicators", tags=["indicators"])
 
@@ -69,6 +70,8 @@ def update_indicator(indicator_id: int, indicator: schemas.IndicatorDefinitionUp
 
     candidate_python_code = update_data.get("python_code", _normalize_optional_str(db_indicator.python_code))
     _validate_indicator_payload(candidate_python_code)
+    if "python_code" in update_data and update_data["python_code"] != db_indicator.python_code:
+        invalidate_script(db_indicator.python_code)
 
     for key, value in update_data.items():
         setattr(db_indicator, key, value)
@@ -86,6 +89,7 @@ def delete_indicator(indicator_id: int, db: Session = Depends(get_db)):
     )
     if not db_indicator:
         raise HTTPException(status_code=404, detail="Indicator not found")
+    invalidate_script(db_indicator.python_code)
     db.delete(db_indicator)
     db.commit()
     return {"ok": True}
@@ -109,6 +113,7 @@ def test_indicator(indicator_id: int, payload: schemas.IndicatorTestRequest, db:
         context=context,
         post_process_json=None,
         python_code=db_indicator.python_code,
+        cache_ttl=0,
     )
 
     if isinstance(raw, str) and (raw.startswith("Error") or raw.startswith("No data returned")):
@@ -1,21 +1,38 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import func
+from sqlalchemy.orm import Session, undefer_group
+from typing import List, Optional
 from database import get_db
 import models
 import schemas
+from services.signal_cache import last_signal_cache
+from services.log_pagination import fetch_log_summaries
 
 router = APIRouter(prefix="/logs", tags=["logs"])
 
-@router.get("/", response_model=List[schemas.Log])
-def read_logs(stock_id: int = None, limit: int = 50, db: Session = Depends(get_db)):
-    query = db.query(models.Log).join(models.Stock)
+@router.get("/", response_model=List[schemas.LogSummary])
+def read_logs(
+    stock_id: int = None,
+    limit: int = 50,
+    before_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    return fetch_log_summaries(db, stock_id=stock_id, limit=limit, before_id=before_id)
+
+@router.get("/count", response_model=dict)
+def count_logs(stock_id: int = None, db: Session = Depends(get_db)):
+    # 只数 id：有 stock_id 时走 ix_logs_stock_id_timestamp，否则 SQLite 选最小的索引扫描
+    query = db.query(func.count(models.Log.id))
     if stock_id:
         query = query.filter(models.Log.stock_id == stock_id)
-    
-    # Order by timestamp desc
-    logs = query.order_by(models.Log.timestamp.desc()).limit(limit).all()
-    return logs
+    return {"total": int(query.scalar() or 0)}
+
+@router.get("/{log_id}", response_model=schemas.Log)
+def read_log(log_id: int, db: Session = Depends(get_db)):
+    log = db.query(models.Log).options(undefer_group("blobs")).filter(models.Log.id == log_id).first()
+    if not log:
+        raise HTTPException(status_code=404, detail="Log not found")
+    return log
 
 @router.delete("/", response_model=dict)
 def clear_logs(log_ids: List[int] = None, db: Session = Depends(get_db)):
@@ -24,4 +41,5 @@ def clear_logs(log_ids: List[int] = None, db: Session = Depends(get_db)):
     else:
         db.query(models.Log).delete()
     db.commit()
+    last_signal_cache.invalidate()
     return {"ok": True}
@@ -4,6 +4,7 @@ from typing import List
 from database import get_db
 import models
 import schemas
+from core.script_cache import compile_script, invalidate_script
 
 router = APIRouter(prefix="/rules", tags=["rules"])
 
@@ -27,6 +28,8 @@ def update_rule(rule_id: int, rule_update: schemas.RuleScriptUpdate, db: Session
         raise HTTPException(status_code=404, detail="Rule script not found")
     
     update_data = rule_update.dict(exclude_unset=True)
+    if "code" in update_data and update_data["code"] != db_rule.code:
+        invalidate_script(db_rule.code)
     for key, value in update_data.items():
         setattr(db_rule, key, value)
     
@@ -44,6 +47,7 @@ def delete_rule(rule_id: int, db: Session = Depends(get_db)):
     if db.query(models.Stock).filter(models.Stock.rule_script_id == rule_id).first():
          raise HTTPException(status_code=400, detail="Cannot delete rule script that is in use by a stock")
 
+    invalidate_script(db_rule.code)
     db.delete(db_rule)
     db.commit()
     return {"ok": True}
@@ -97,7 +101,7 @@ def test_rule(rule_id: int, payload: schemas.RuleTestPayload, db: Session = Depe
         }
         
         try:
-            exec(script_code, {}, local_scope)
+            exec(compile_script(script_code), {}, local_scope)
             triggered = bool(local_scope.get("triggered", False))
             message = str(local_scope.get("message", ""))
             signal = local_scope.get("signal", None)
@@ -8,6 +8,7 @@ import json
 from database import get_db
 from models import StockScreener, ScreenerResult
 from services.screener_service import execute_screener_script, update_screener_job
+from core.script_cache import invalidate_script
 
 router = APIRouter(prefix="/screeners", tags=["screeners"])
 
@@ -57,7 +58,10 @@ def update_screener(screener_id: int, screener: ScreenerUpdate, db: Session = De
     
     if screener.name is not None: db_screener.name = screener.name
     if screener.description is not None: db_screener.description = screener.description
-    if screener.script_content is not None: db_screener.script_content = screener.script_content
+    if screener.script_content is not None:
+        if screener.script_content != db_screener.script_content:
+            invalidate_script(db_screener.script_content)
+        db_screener.script_content = screener.script_content
     if screener.cron_expression is not None: db_screener.cron_expression = screener.cron_expression
     if screener.is_active is not None: db_screener.is_active = screener.is_active
     if screener.is_pinned is not None: db_screener.is_pinned = screener.is_pinned
@@ -77,6 +81,7 @@ def delete_screener(screener_id: int, db: Session = Depends(get_db)):
         
     # Stop job
     update_screener_job(screener_id, "", False)
+    invalidate_script(db_screener.script_content)
     
     db.delete(db_screener)
     db.commit()
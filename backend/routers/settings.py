@@ -9,6 +9,7 @@ from email.mime.multipart import MIMEMultipart
 from database import get_db
 import models
 import schemas
+from services.system_config_cache import system_config_cache
 
 router = APIRouter(
     prefix="/settings",
@@ -39,6 +40,7 @@ def update_email_config(config: schemas.EmailConfig, db: Session = Depends(get_d
         db_config.value = value_str
     
     db.commit()
+    system_config_cache.invalidate()
     return config
 
 @router.post("/email/test")
@@ -92,6 +94,7 @@ def update_global_prompt(config: schemas.GlobalPromptConfig, db: Session = Depen
         db_config.value = value_str
     
     db.commit()
+    system_config_cache.invalidate()
     return config
 
 @router.get("/alert-rate-limit", response_model=schemas.AlertRateLimitConfig)
@@ -117,4 +120,5 @@ def update_alert_rate_limit_config(config: schemas.AlertRateLimitConfig, db: Ses
         db_config.value = value_str
 
     db.commit()
+    system_config_cache.invalidate()
     return config
@@ -7,6 +7,7 @@ import schemas
 import json
 import datetime
 from services.monitor_service import process_stock, update_stock_job, analyze_stock_manual, fetch_stock_indicators_data
+from services.signal_cache import last_signal_cache
 import akshare as ak
 from utils.ak_fallback import get_a_minute_data_with_error
 
@@ -88,6 +89,7 @@ def delete_stock(stock_id: int, db: Session = Depends(get_db)):
     
     db.delete(db_stock)
     db.commit()
+    last_signal_cache.forget(stock_id)
     return {"ok": True}
 
 @router.post("/{stock_id}/test-run", response_model=schemas.StockTestRunResponse)
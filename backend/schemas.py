@@ -58,6 +58,8 @@ class IndicatorDefinitionBase(BaseModel):
     post_process_json: Optional[str] = None
     python_code: Optional[str] = None
     is_pinned: bool = False
+    cache_ttl_seconds: Optional[int] = None
+    priority: Optional[int] = 0
 
 class IndicatorDefinitionCreate(IndicatorDefinitionBase):
     pass
@@ -69,6 +71,8 @@ class IndicatorDefinitionUpdate(BaseModel):
     post_process_json: Optional[str] = None
     python_code: Optional[str] = None
     is_pinned: Optional[bool] = None
+    cache_ttl_seconds: Optional[int] = None
+    priority: Optional[int] = None
 
 class IndicatorDefinition(ORMModel, IndicatorDefinitionBase):
     id: int
@@ -143,9 +147,11 @@ class StockTestRunResponse(BaseModel):
     user_prompt: Optional[str] = None
     ai_reply: Optional[Dict[str, Any]] = None
     raw_response: Optional[str] = None
+    log_id: Optional[int] = None
 
     data_truncated: Optional[bool] = None
-    data_char_limit: Optional[int] = None
+    data_token_limit: Optional[int] = None
+    data_dropped: Optional[List[str]] = None
 
     fetch_ok: Optional[int] = None
     fetch_error: Optional[int] = None
@@ -171,6 +177,20 @@ class Log(ORMModel, LogBase):
     timestamp: datetime
     stock: Optional[Stock] = None
 
+class LogStockBrief(ORMModel):
+    id: int
+    symbol: str
+    name: str
+
+class LogSummary(ORMModel):
+    """日志列表用的投影：不含 raw_data / ai_response 大字段，完整内容走 /logs/{id}"""
+    id: int
+    stock_id: int
+    timestamp: datetime
+    ai_analysis: Dict[str, Any]
+    is_alert: bool
+    stock: Optional[LogStockBrief] = None
+
 # System Config
 class EmailConfig(BaseModel):
     smtp_server: str = "smtp.gmail.com"
@@ -0,0 +1,129 @@
+import itertools
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.ai_retry import AIDeadlineExceededError, remaining_time
+from core.upstream_limits import ai_upstream_name, upstream_slot
+from services.ai_service import ai_service
+
+AI_BATCH_ENABLED = str(os.getenv("AI_BATCH_ENABLED", "0")).strip() in ("1", "true", "True", "yes", "YES")
+AI_BATCH_MAX_STOCKS = max(1, int(os.getenv("AI_BATCH_MAX_STOCKS", "8")))
+AI_BATCH_WINDOW_MS = max(0, int(os.getenv("AI_BATCH_WINDOW_MS", "500")))
+
+
+class _PendingAnalysis:
+    __slots__ = ("key", "data_context", "prompt_template", "current_time_str", "event", "result")
+
+    def __init__(self, key: str, data_context: str, prompt_template: str, current_time_str: Optional[str]):
+        self.key = key
+        self.data_context = data_context
+        self.prompt_template = prompt_template
+        self.current_time_str = current_time_str
+        self.event = threading.Event()
+        self.result: Optional[Tuple[Dict[str, Any], str]] = None
+
+
+class AIAnalysisBatcher:
+    """
+    把同一时刻、同一 AI 配置下多只股票的分析请求攒成一批，用 ai_service.analyze_batch 一次请求完成。
+    第一个到达的请求等待 window_ms 收集同伴，攒满 max_stocks 时立即发出；每个调用方拿回自己那只股票的结果。
+    等待受调用方的 ai_deadline 约束：到期仍未拿到结果时返回超时错误，迟到的批次结果直接丢弃
+    """
+
+    def __init__(self, max_stocks: int = AI_BATCH_MAX_STOCKS, window_ms: int = AI_BATCH_WINDOW_MS):
+        self.max_stocks = max(1, int(max_stocks))
+        self.window = max(0, int(window_ms)) / 1000.0
+        self._lock = threading.Lock()
+        self._groups: Dict[tuple, List[_PendingAnalysis]] = {}
+        self._seq = itertools.count(1)
+        self._stats = {"requests": 0, "batches": 0, "batched_stocks": 0, "timeouts": 0}
+
+    def _group_key(self, ai_config: Dict[str, Any]) -> tuple:
+        return (
+            str(ai_config.get("base_url") or ""),
+            str(ai_config.get("api_key") or ""),
+            str(ai_config.get("model_name") or ""),
+            str(ai_config.get("temperature", 0.1)),
+        )
+
+    def analyze(
+        self,
+        data_context: str,
+        prompt_template: str,
+        ai_config: Dict[str, Any],
+        current_time_str: Optional[str] = None,
+        label: Optional[str] = None,
+    ) -> Tuple[Dict[str, Any], str]:
+        """与 ai_service.analyze 相同的返回值；label（如股票代码）只用于生成批内 stock_key，方便模型区分"""
+        gkey = self._group_key(ai_config)
+        item = _PendingAnalysis(
+            f"{label or 'S'}#{next(self._seq)}", data_context, prompt_template, current_time_str
+        )
+        with self._lock:
+            self._stats["requests"] += 1
+            group = self._groups.get(gkey)
+            leader = group is None
+            if leader:
+                group = []
+                self._groups[gkey] = group
+            group.append(item)
+            full = len(group) >= self.max_stocks
+            if full:
+                self._groups.pop(gkey, None)
+
+        if full:
+            self._dispatch(group, ai_config)
+        elif leader and not item.event.wait(remaining_time(self.window)):
+            with self._lock:
+                if self._groups.get(gkey) is group:
+                    self._groups.pop(gkey, None)
+                else:
+                    group = None
+            if group is not None:
+                self._dispatch(group, ai_config)
+
+        if item.event.wait(remaining_time()):
+            return item.result
+
+        # 截止时间已到：还没发出的从组里撤下，已发出的结果到达时没人再读取
+        with self._lock:
+            pending = self._groups.get(gkey)
+            if pending is not None and item in pending:
+                pending.remove(item)
+                if not pending:
+                    self._groups.pop(gkey, None)
+            self._stats["timeouts"] += 1
+        return ai_service._error_result(AIDeadlineExceededError("AI batch wait exceeded its deadline")), ""
+
+    def _dispatch(self, group: List[_PendingAnalysis], ai_config: Dict[str, Any]) -> None:
+        try:
+            time_str = max((p.current_time_str or "" for p in group), default="") or None
+            items = [
+                {"key": p.key, "data_context": p.data_context, "prompt_template": p.prompt_template}
+                for p in group
+            ]
+            with upstream_slot(ai_upstream_name(ai_config)):
+                results = ai_service.analyze_batch(items, ai_config, current_time_str=time_str)
+            with self._lock:
+                self._stats["batches"] += 1
+                self._stats["batched_stocks"] += len(group)
+        except Exception as e:
+            results = {}
+            print(f"AI batch dispatch failed: {e}")
+        for p in group:
+            p.result = results.get(p.key) or ({"type": "error", "message": "AI Error: batch returned no result"}, "")
+            p.event.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": AI_BATCH_ENABLED,
+                "max_stocks": self.max_stocks,
+                "window_ms": int(self.window * 1000),
+                "pending": sum(len(g) for g in self._groups.values()),
+                **self._stats,
+            }
+
+
+ai_batcher = AIAnalysisBatcher()
@@ -1,8 +1,36 @@
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+import copy
+import hashlib
 import json
-from typing import Dict, Any, Optional, Tuple
+import os
+import re
+import threading
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from core.ai_retry import AIProviderUnavailableError, ProviderGuard, check_deadline, get_provider_guard, remaining_time
+from core.ttl_cache import TTLCache
+from core.upstream_limits import ai_upstream_name
+
+# 相同输入（模型 + system prompt + 去掉 Current Time 行的 user 内容）在 TTL 内直接复用上一次的分析结果
+AI_RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("AI_RESPONSE_CACHE_TTL_SECONDS", "300"))
+AI_RESPONSE_CACHE_MAX_ENTRIES = max(1, int(os.getenv("AI_RESPONSE_CACHE_MAX_ENTRIES", "512")))
+
+# 流式解析时提前取出的决策字段（按输出 schema 排在 message 之前）；值必须完整：字符串闭合，数字后跟 , 或 }
+_EARLY_FIELD_PATTERNS = {
+    field: re.compile(r'"%s"\s*:\s*("(?:[^"\\]|\\.)*"|-?\d+(?:\.\d+)?(?=\s*[,}])|null)' % field)
+    for field in ("type", "signal", "action_advice", "suggested_position", "duration", "stop_loss_price")
+}
 
 class AIService:
+    def __init__(self):
+        self._async_clients: Dict[Tuple[int, str, str], AsyncOpenAI] = {}
+        self._async_clients_lock = threading.Lock()
+        self._response_cache = TTLCache(
+            max_entries=AI_RESPONSE_CACHE_MAX_ENTRIES,
+            default_ttl=AI_RESPONSE_CACHE_TTL_SECONDS,
+            sizeof=lambda v: len(v[1] or "") * 2,
+        )
+
     def _truncate_text(self, text: str, limit: int = 2000) -> str:
         normalized = text or ""
         if len(normalized) <= limit:
@@ -83,58 +111,127 @@ class AIService:
             + "Return strictly JSON format."
         )
 
+    def _client_options(self, default_timeout: float) -> Dict[str, Any]:
+        """
+        HTTP 超时取 default_timeout 与当前 ai_deadline 剩余时间的较小值；有截止时间时关闭 SDK 自带重试，
+        保证一次调用的总耗时不超过截止时间
+        """
+        remaining = remaining_time()
+        if remaining is None:
+            return {"timeout": default_timeout}
+        check_deadline()
+        return {"timeout": min(default_timeout, remaining), "max_retries": 0}
+
+    def _provider_guard(self, ai_config: Dict[str, Any]) -> ProviderGuard:
+        return get_provider_guard(ai_upstream_name(ai_config))
+
+    def _error_result(self, e: Exception) -> Dict[str, Any]:
+        result = {"type": "error", "message": f"AI Error: {str(e)}"}
+        if isinstance(e, AIProviderUnavailableError):
+            # 服务商熔断/饱和：调用方可以换用其它 AIConfig
+            result["provider_unavailable"] = True
+        return result
+
+    def _response_cache_key(self, ai_config: Dict[str, Any], system_prompt: str, user_content: str) -> str:
+        # Current Time 每次都不同，不参与指纹；数据和策略不变时命中缓存
+        lines = (user_content or "").split("\n")
+        if lines and lines[0].startswith("Current Time: "):
+            lines = lines[1:]
+        h = hashlib.sha256()
+        for part in (
+            str(ai_config.get("base_url") or ""),
+            str(ai_config.get("model_name") or ""),
+            str(ai_config.get("temperature", 0.1)),
+            system_prompt or "",
+            "\n".join(lines),
+        ):
+            h.update(part.encode("utf-8", errors="ignore"))
+            h.update(b"\x00")
+        return h.hexdigest()
+
+    def _get_cached_response(self, key: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        if AI_RESPONSE_CACHE_TTL_SECONDS <= 0:
+            return None
+        hit = self._response_cache.get(key)
+        if hit is None:
+            return None
+        return copy.deepcopy(hit[0]), hit[1]
+
+    def _store_cached_response(self, key: str, result: Dict[str, Any], content: str) -> None:
+        # 只缓存成功解析的结果，报错/解析失败的下次重新请求
+        if AI_RESPONSE_CACHE_TTL_SECONDS <= 0 or not isinstance(result, dict):
+            return
+        if result.get("parse_error") or result.get("type") == "error":
+            return
+        self._response_cache.set(key, (copy.deepcopy(result), content))
+
+    def get_response_cache_stats(self) -> dict:
+        return {"ttl_seconds": AI_RESPONSE_CACHE_TTL_SECONDS, **self._response_cache.stats()}
+
+    def clear_response_cache(self) -> None:
+        self._response_cache.clear()
+
+    def _parse_analysis_content(self, content: str) -> Dict[str, Any]:
+        try:
+            # Clean markdown code blocks if present
+            clean_content = (content or "").replace("```json", "").replace("```", "").strip()
+            result = json.loads(clean_content)
+
+            # Ensure signal field exists
+            if "signal" not in result:
+                result["signal"] = "WAIT"
+
+            return result
+        except json.JSONDecodeError as e:
+            clean_content = (content or "").replace("```json", "").replace("```", "").strip()
+            raw_head = self._truncate_text(clean_content, 500)
+            msg = f"AI returned invalid JSON ({str(e)}). raw_head={raw_head}"
+            return {
+                "type": "error",
+                "message": msg,
+                "signal": "WAIT",
+                "parse_error": str(e),
+                "raw_response": clean_content,
+            }
+
     def analyze(self, data_context: str, prompt_template: str, ai_config: Dict[str, Any], current_time_str: Optional[str] = None) -> Dict[str, Any]:
         """
         Send data to AI and get analysis result.
         ai_config: {api_key, base_url, model_name}
         """
         try:
+            system_prompt = self._build_system_prompt()
+            user_content = self._build_user_content(data_context, prompt_template, current_time_str=current_time_str)
+            cache_key = self._response_cache_key(ai_config, system_prompt, user_content)
+            cached = self._get_cached_response(cache_key)
+            if cached is not None:
+                return cached
+
             client = OpenAI(
                 api_key=ai_config["api_key"],
                 base_url=ai_config["base_url"],
                 timeout=300.0,
             )
             
-            system_prompt = self._build_system_prompt()
-            user_content = self._build_user_content(data_context, prompt_template, current_time_str=current_time_str)
-            
-            response = client.chat.completions.create(
-                model=ai_config["model_name"],
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_content}
-                ],
-                response_format={"type": "json_object"}, # Force JSON if model supports it, else prompt engineering
-                temperature=ai_config.get("temperature", 0.1),
+            with self._provider_guard(ai_config).slot():
+                response = client.with_options(**self._client_options(300.0)).chat.completions.create(
+                    model=ai_config["model_name"],
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_content}
+                    ],
+                    response_format={"type": "json_object"}, # Force JSON if model supports it, else prompt engineering
+                    temperature=ai_config.get("temperature", 0.1),
                 
-            )
+                )
             
             content = response.choices[0].message.content or ""
-            
-            try:
-                # Clean markdown code blocks if present
-                clean_content = content.replace("```json", "").replace("```", "").strip()
-                result = json.loads(clean_content)
-                
-                # Ensure signal field exists
-                if "signal" not in result:
-                    result["signal"] = "WAIT"
-                    
-                return result, content
-            except json.JSONDecodeError as e:
-                clean_content = (content or "").replace("```json", "").replace("```", "").strip()
-                raw_head = self._truncate_text(clean_content, 500)
-                msg = f"AI returned invalid JSON ({str(e)}). raw_head={raw_head}"
-                return {
-                    "type": "error", 
-                    "message": msg,
-                    "signal": "WAIT",
-                    "parse_error": str(e),
-                    "raw_response": clean_content,
-                }, content
+            result = self._parse_analysis_content(content)
+            self._store_cached_response(cache_key, result, content)
+            return result, content
                 
         except Exception as e:
-            return {"type": "error", "message": f"AI Error: {str(e)}"}, str(e)
+            return self._error_result(e), str(e)
 
     def analyze_debug(self, data_context: str, prompt_template: str, ai_config: Dict[str, Any], current_time_str: Optional[str] = None) -> Tuple[Dict[str, Any], str, Dict[str, str]]:
         try:
@@ -147,40 +244,299 @@ class AIService:
             system_prompt = self._build_system_prompt()
             user_content = self._build_user_content(data_context, prompt_template, current_time_str=current_time_str)
 
-            response = client.chat.completions.create(
-                model=ai_config["model_name"],
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_content}
-                ],
-                response_format={"type": "json_object"},
-                temperature=ai_config.get("temperature", 0.1),
-            )
+            with self._provider_guard(ai_config).slot():
+                response = client.with_options(**self._client_options(300.0)).chat.completions.create(
+                    model=ai_config["model_name"],
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_content}
+                    ],
+                    response_format={"type": "json_object"},
+                    temperature=ai_config.get("temperature", 0.1),
+                )
             
             content = response.choices[0].message.content or ""
-            
-            try:
-                clean_content = content.replace("```json", "").replace("```", "").strip()
-                result = json.loads(clean_content)
-                
-                if "signal" not in result:
-                    result["signal"] = "WAIT"
-                    
-                return result, content, {"system_prompt": system_prompt, "user_prompt": user_content}
-            except json.JSONDecodeError as e:
-                clean_content = (content or "").replace("```json", "").replace("```", "").strip()
-                raw_head = self._truncate_text(clean_content, 500)
-                msg = f"AI returned invalid JSON ({str(e)}). raw_head={raw_head}"
-                return {
-                    "type": "error", 
-                    "message": msg,
-                    "signal": "WAIT",
-                    "parse_error": str(e),
-                    "raw_response": clean_content,
-                }, content, {"system_prompt": system_prompt, "user_prompt": user_content}
+            return self._parse_analysis_content(content), content, {"system_prompt": system_prompt, "user_prompt": user_content}
                 
         except Exception as e:
-            return {"type": "error", "message": f"AI Error: {str(e)}"}, str(e), {"system_prompt": "", "user_prompt": ""}
+            return self._error_result(e), str(e), {"system_prompt": "", "user_prompt": ""}
+
+    def _extract_early_fields(self, buffer: str) -> Dict[str, Any]:
+        """从尚未收完的 JSON 文本里取出已经完整的顶层决策字段"""
+        out: Dict[str, Any] = {}
+        for field, rx in _EARLY_FIELD_PATTERNS.items():
+            m = rx.search(buffer)
+            if not m:
+                continue
+            try:
+                out[field] = json.loads(m.group(1))
+            except Exception:
+                continue
+        return out
+
+    def analyze_stream(
+        self,
+        data_context: str,
+        prompt_template: str,
+        ai_config: Dict[str, Any],
+        current_time_str: Optional[str] = None,
+        on_signal: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        流式版 analyze：边接收边解析。signal 与其后的决策字段齐全（或 message 字段开始输出）时回调一次 on_signal(partial)，
+        调用方可据此提前发送告警；返回值与 analyze 相同
+        """
+        try:
+            system_prompt = self._build_system_prompt()
+            user_content = self._build_user_content(data_context, prompt_template, current_time_str=current_time_str)
+            cache_key = self._response_cache_key(ai_config, system_prompt, user_content)
+            cached = self._get_cached_response(cache_key)
+            if cached is not None:
+                return cached
+
+            client = OpenAI(
+                api_key=ai_config["api_key"],
+                base_url=ai_config["base_url"],
+                timeout=300.0,
+            )
+
+            chunks: List[str] = []
+            fired = on_signal is None
+            with self._provider_guard(ai_config).slot():
+                stream = client.with_options(**self._client_options(300.0)).chat.completions.create(
+                    model=ai_config["model_name"],
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_content}
+                    ],
+                    response_format={"type": "json_object"},
+                    temperature=ai_config.get("temperature", 0.1),
+                    stream=True,
+                )
+                for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content or ""
+                    if not delta:
+                        continue
+                    chunks.append(delta)
+                    if fired:
+                        continue
+                    buffer = "".join(chunks)
+                    early = self._extract_early_fields(buffer)
+                    if "signal" in early and ('"message"' in buffer or len(early) == len(_EARLY_FIELD_PATTERNS)):
+                        fired = True
+                        try:
+                            on_signal(early)
+                        except Exception as e:
+                            print(f"Early signal callback failed: {e}")
+
+            content = "".join(chunks)
+            result = self._parse_analysis_content(content)
+            self._store_cached_response(cache_key, result, content)
+            return result, content
+
+        except Exception as e:
+            return self._error_result(e), str(e)
+
+    def _get_async_client(self, ai_config: Dict[str, Any]) -> AsyncOpenAI:
+        """
+        AsyncOpenAI 客户端按 (事件循环, base_url, api_key) 复用，连接池跨请求共享
+        """
+        import asyncio
+
+        key = (id(asyncio.get_running_loop()), str(ai_config.get("base_url") or ""), str(ai_config.get("api_key") or ""))
+        with self._async_clients_lock:
+            client = self._async_clients.get(key)
+            if client is None:
+                client = AsyncOpenAI(
+                    api_key=ai_config["api_key"],
+                    base_url=ai_config["base_url"],
+                    timeout=300.0,
+                )
+                self._async_clients[key] = client
+            return client
+
+    async def analyze_async(
+        self,
+        data_context: str,
+        prompt_template: str,
+        ai_config: Dict[str, Any],
+        current_time_str: Optional[str] = None,
+        debug: bool = False,
+    ):
+        """
+        analyze / analyze_debug 的协程版本；debug=True 时与 analyze_debug 返回相同的三元组
+        """
+        system_prompt = ""
+        user_content = ""
+        try:
+            system_prompt = self._build_system_prompt()
+            user_content = self._build_user_content(data_context, prompt_template, current_time_str=current_time_str)
+            # debug（测试运行）总是真实请求
+            cache_key = None if debug else self._response_cache_key(ai_config, system_prompt, user_content)
+            cached = self._get_cached_response(cache_key) if cache_key else None
+            if cached is not None:
+                return cached
+
+            client = self._get_async_client(ai_config)
+
+            async with self._provider_guard(ai_config).async_slot():
+                response = await client.with_options(**self._client_options(300.0)).chat.completions.create(
+                    model=ai_config["model_name"],
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_content}
+                    ],
+                    response_format={"type": "json_object"},
+                    temperature=ai_config.get("temperature", 0.1),
+                )
+
+            content = response.choices[0].message.content or ""
+            result = self._parse_analysis_content(content)
+            if cache_key:
+                self._store_cached_response(cache_key, result, content)
+        except Exception as e:
+            result, content = self._error_result(e), str(e)
+            system_prompt, user_content = "", ""
+
+        if debug:
+            return result, content, {"system_prompt": system_prompt, "user_prompt": user_content}
+        return result, content
+
+    def _build_batch_system_prompt(self) -> str:
+        return (
+            self._build_system_prompt()
+            + "\n\n"
+            "【批量模式】\n"
+            "本次请求包含多只股票，每只股票以 === STOCK <stock_key> === 开头，各自带有独立的分析策略与数据。\n"
+            "批量模式下以本段为准：你必须只输出一个合法的 JSON 数组，输出必须以 [ 开始、以 ] 结束，"
+            "每只股票对应数组中的一个对象，字段与上面的单只股票 JSON 完全相同，另外必须增加 stock_key 字段（原样复制）。\n"
+            "每只股票独立分析，不要互相参考；不得遗漏或新增股票。"
+        )
+
+    def _build_batch_user_content(self, items: List[Dict[str, Any]], current_time_str: Optional[str] = None) -> str:
+        import datetime
+
+        now_str = current_time_str or datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        blocks = []
+        for item in items:
+            blocks.append(
+                f"=== STOCK {item['key']} ===\n"
+                + "Analysis Instructions (Strategy):\n"
+                + (item.get("prompt_template") or "")
+                + "\n\n"
+                + "Real-time Indicators Data:\n"
+                + (item.get("data_context") or "")
+            )
+        return (
+            "Current Time: "
+            + now_str
+            + "\n\n"
+            + f"Task: Analyze each of the following {len(items)} stocks independently and generate one investment decision JSON per stock.\n\n"
+            + "\n\n".join(blocks)
+            + "\n\n"
+            + "Remember: Be decisive. If the signal is strictly unclear, allow 'WAIT'. Otherwise, give a direction.\n"
+            + "Return strictly a JSON array, one object per stock, each with its stock_key."
+        )
+
+    def _parse_batch_content(self, content: str, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        解析批量返回并按 stock_key 对应回去；无法解析或缺少的股票不出现在结果里
+        """
+        clean_content = (content or "").replace("```json", "").replace("```", "").strip()
+        try:
+            parsed = json.loads(clean_content)
+        except json.JSONDecodeError:
+            return {}
+        if isinstance(parsed, dict):
+            # 部分模型坚持输出对象：接受 {"results": [...]} 一类的包装
+            parsed = next((v for v in parsed.values() if isinstance(v, list)), [parsed])
+        if not isinstance(parsed, list):
+            return {}
+
+        wanted = set(keys)
+        out: Dict[str, Dict[str, Any]] = {}
+        for entry in parsed:
+            if not isinstance(entry, dict):
+                continue
+            key = str(entry.pop("stock_key", "")).strip()
+            if key not in wanted or key in out or "signal" not in entry:
+                continue
+            out[key] = entry
+        return out
+
+    def analyze_batch(
+        self,
+        items: List[Dict[str, Any]],
+        ai_config: Dict[str, Any],
+        current_time_str: Optional[str] = None,
+    ) -> Dict[str, Tuple[Dict[str, Any], str]]:
+        """
+        多只股票合并成一次请求分析。items: [{key, data_context, prompt_template}]，返回 {key: (result, content)}。
+        命中单股缓存的不进批次；批量输出解析失败或缺股票时对剩余部分二分重试，只剩一只时退回 analyze。
+        批量结果是在批量指令和同批其它股票的上下文下得到的，不写入单股缓存（单股 prompt 并未发送过）
+        """
+        results: Dict[str, Tuple[Dict[str, Any], str]] = {}
+        system_prompt = self._build_system_prompt()
+        cache_keys: Dict[str, str] = {}
+        pending: List[Dict[str, Any]] = []
+        for item in items:
+            user_content = self._build_user_content(item.get("data_context"), item.get("prompt_template"), current_time_str=current_time_str)
+            cache_keys[item["key"]] = self._response_cache_key(ai_config, system_prompt, user_content)
+            cached = self._get_cached_response(cache_keys[item["key"]])
+            if cached is not None:
+                results[item["key"]] = cached
+            else:
+                pending.append(item)
+
+        def _run(group: List[Dict[str, Any]]) -> None:
+            if not group:
+                return
+            if len(group) == 1:
+                item = group[0]
+                results[item["key"]] = self.analyze(item.get("data_context"), item.get("prompt_template"), ai_config, current_time_str=current_time_str)
+                return
+
+            keys = [item["key"] for item in group]
+            try:
+                client = OpenAI(
+                    api_key=ai_config["api_key"],
+                    base_url=ai_config["base_url"],
+                    timeout=300.0,
+                )
+                with self._provider_guard(ai_config).slot():
+                    response = client.with_options(**self._client_options(300.0)).chat.completions.create(
+                        model=ai_config["model_name"],
+                        messages=[
+                            {"role": "system", "content": self._build_batch_system_prompt()},
+                            {"role": "user", "content": self._build_batch_user_content(group, current_time_str=current_time_str)},
+                        ],
+                        temperature=ai_config.get("temperature", 0.1),
+                    )
+            except Exception as e:
+                # 请求本身失败（网络/鉴权等）拆分重试也无济于事，与 analyze 一样按错误结果返回
+                for key in keys:
+                    results[key] = (self._error_result(e), str(e))
+                return
+            parsed = self._parse_batch_content(response.choices[0].message.content or "", keys)
+
+            for key, result in parsed.items():
+                results[key] = (result, json.dumps(result, ensure_ascii=False))
+
+            missing = [item for item in group if item["key"] not in parsed]
+            if not missing:
+                return
+            if len(missing) < len(group):
+                # 部分成功：缺的股票再单独组批
+                _run(missing)
+                return
+            mid = len(missing) // 2
+            _run(missing[:mid])
+            _run(missing[mid:])
+
+        _run(pending)
+        return results
 
     def chat(self, message: str, ai_config: Dict[str, Any], system_prompt: Optional[str] = None) -> str:
         client = OpenAI(
@@ -207,11 +563,12 @@ class AIService:
                 ]
         else:
             messages = [{"role": "user", "content": normalized_message}]
-        response = client.chat.completions.create(
-            model=ai_config["model_name"],
-            messages=messages,
-            temperature=ai_config.get("temperature", 0.7)
-        )
+        with self._provider_guard(ai_config).slot():
+            response = client.with_options(**self._client_options(120.0)).chat.completions.create(
+                model=ai_config["model_name"],
+                messages=messages,
+                temperature=ai_config.get("temperature", 0.7)
+            )
         return response.choices[0].message.content or ""
 
     def analyze_raw(self, data_context: str, custom_prompt: str, ai_config: Dict[str, Any]) -> str:
@@ -231,13 +588,14 @@ class AIService:
             # Build user content: data + custom prompt only, no extra formatting
             user_content = f"{data_context}\n\n{custom_prompt}"
 
-            response = client.chat.completions.create(
-                model=ai_config["model_name"],
-                messages=[
-                    {"role": "user", "content": user_content}
-                ],
-                temperature=ai_config.get("temperature", 0.7),
-            )
+            with self._provider_guard(ai_config).slot():
+                response = client.with_options(**self._client_options(300.0)).chat.completions.create(
+                    model=ai_config["model_name"],
+                    messages=[
+                        {"role": "user", "content": user_content}
+                    ],
+                    temperature=ai_config.get("temperature", 0.7),
+                )
 
             return response.choices[0].message.content or ""
 
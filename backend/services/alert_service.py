@@ -3,18 +3,13 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
 import json
-from database import SessionLocal
-import models
+from services.system_config_cache import system_config_cache
 
 class AlertService:
     def get_email_config(self):
-        db = SessionLocal()
-        try:
-            config = db.query(models.SystemConfig).filter(models.SystemConfig.key == "email_config").first()
-            if config and config.value:
-                return json.loads(config.value)
-        finally:
-            db.close()
+        value = system_config_cache.get("email_config")
+        if value:
+            return json.loads(value)
         return None
 
     def send_email(self, subject: str, body: str, is_html: bool = False):
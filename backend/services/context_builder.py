@@ -0,0 +1,222 @@
+import csv
+import io
+import json
+import math
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+AI_CONTEXT_FLOAT_DIGITS = max(0, int(os.getenv("AI_CONTEXT_FLOAT_DIGITS", "4")))
+# 单个指标至少保留的 token 数；预算分不到这么多时按优先级从低到高整块丢弃
+AI_CONTEXT_MIN_INDICATOR_TOKENS = max(16, int(os.getenv("AI_CONTEXT_MIN_INDICATOR_TOKENS", "200")))
+
+_encoders: Dict[str, Any] = {}
+_encoders_lock = threading.Lock()
+_CJK_RE = re.compile(r"[^\x00-\x7f]")
+
+
+def _get_encoder(model: Optional[str]):
+    """tiktoken 可选：安装了就按模型取编码器，否则返回 None 使用估算"""
+    key = str(model or "")
+    with _encoders_lock:
+        if key in _encoders:
+            return _encoders[key]
+    try:
+        import tiktoken
+
+        try:
+            enc = tiktoken.encoding_for_model(key)
+        except Exception:
+            enc = tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        enc = None
+    with _encoders_lock:
+        _encoders[key] = enc
+    return enc
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    token 数：有 tiktoken 时精确计算；否则按 ASCII 约 4 字符 1 个、中文等非 ASCII 字符约 1 个估算（偏保守）
+    """
+    if not text:
+        return 0
+    enc = _get_encoder(model)
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    non_ascii = len(_CJK_RE.findall(text))
+    return int(math.ceil((len(text) - non_ascii) / 4.0)) + non_ascii
+
+
+def _round_value(value: Any, digits: int) -> Any:
+    if isinstance(value, float):
+        if math.isnan(value) or math.isinf(value):
+            return ""
+        rounded = round(value, digits)
+        return int(rounded) if rounded == int(rounded) and abs(rounded) < 1e15 else rounded
+    return value
+
+
+def _cell(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    return value
+
+
+def compact_indicator_data(data: Any, float_digits: int = AI_CONTEXT_FLOAT_DIGITS) -> Tuple[str, bool]:
+    """
+    压缩指标数据：DataFrame 的 records JSON（对象数组）转成 CSV 风格的表头 + 行，浮点数按 float_digits 取整；
+    其它 JSON 去掉多余空白；非 JSON 文本原样返回。第二个返回值表示是否为表格
+    """
+    text = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False, default=str)
+    stripped = text.strip()
+    if not stripped or stripped[0] not in "[{":
+        return text, False
+    try:
+        parsed = json.loads(stripped)
+    except Exception:
+        return text, False
+
+    if isinstance(parsed, list) and parsed and all(isinstance(r, dict) for r in parsed):
+        columns: List[str] = []
+        seen = set()
+        for row in parsed:
+            for k in row.keys():
+                if k not in seen:
+                    seen.add(k)
+                    columns.append(k)
+        buf = io.StringIO()
+        writer = csv.writer(buf, lineterminator="\n")
+        writer.writerow(columns)
+        for row in parsed:
+            writer.writerow([_cell(_round_value(row.get(c), float_digits)) for c in columns])
+        return buf.getvalue().rstrip("\n"), True
+
+    def _walk(obj):
+        if isinstance(obj, dict):
+            return {k: _walk(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [_walk(v) for v in obj]
+        return _round_value(obj, float_digits)
+
+    return json.dumps(_walk(parsed), ensure_ascii=False, separators=(",", ":")), False
+
+
+def _fit_block(body: str, is_table: bool, budget: int, model: Optional[str]) -> Tuple[str, bool]:
+    """
+    把单个指标压到 budget 个 token 以内。表格保留表头与最近的行（行情数据通常按时间升序），文本按行截断
+    """
+    if count_tokens(body, model) <= budget:
+        return body, False
+    lines = body.split("\n")
+    if is_table and len(lines) > 2:
+        header, rows = lines[0], lines[1:]
+        note = "...(earlier rows omitted)"
+        used = count_tokens(header, model) + count_tokens(note, model) + 2
+        kept: List[str] = []
+        for row in reversed(rows):
+            cost = count_tokens(row, model) + 1
+            if used + cost > budget:
+                break
+            kept.append(row)
+            used += cost
+        kept.reverse()
+        return "\n".join([header, note] + kept), True
+
+    note = "...(truncated)"
+    used = count_tokens(note, model) + 1
+    kept = []
+    for line in lines:
+        cost = count_tokens(line, model) + 1
+        if used + cost > budget:
+            # 单行过长（如整段 JSON）时按比例截字符
+            remain = budget - used
+            if remain > 0 and not kept:
+                ratio = remain / float(max(1, cost))
+                kept.append(line[: max(0, int(len(line) * ratio) - 1)])
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept + [note]), True
+
+
+def build_ai_context(
+    items: List[Dict[str, Any]],
+    max_tokens: int,
+    model: Optional[str] = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    按 token 预算拼装发给 AI 的指标数据。items: [{name, data, priority}]，priority 越大越重要。
+
+    1. 每个指标先压缩（表格化、浮点取整）；
+    2. 总量超预算时按“注水”方式分配：用量小于平均份额的指标完整保留，剩余预算平分给其余指标后各自截短；
+    3. 每份分不到 AI_CONTEXT_MIN_INDICATOR_TOKENS 时，先整块丢弃优先级最低的指标再重新分配。
+    输出顺序与 items 一致，返回 (文本, 统计)
+    """
+    budget = max(1, int(max_tokens))
+    blocks = []
+    for idx, item in enumerate(items):
+        body, is_table = compact_indicator_data(item.get("data"))
+        header = f"--- Indicator: {item.get('name')} ---\n"
+        blocks.append({
+            "idx": idx,
+            "name": item.get("name"),
+            "priority": int(item.get("priority") or 0),
+            "header": header,
+            "body": body,
+            "is_table": is_table,
+            "header_tokens": count_tokens(header, model) + 1,
+            "tokens": count_tokens(body, model),
+        })
+
+    raw_tokens = sum(count_tokens(f"--- Indicator: {it.get('name')} ---\n{it.get('data')}\n", model) for it in items)
+    dropped: List[str] = []
+    truncated: List[str] = []
+
+    active = list(blocks)
+    # 优先级低、同优先级时靠后的先丢
+    drop_order = sorted(blocks, key=lambda b: (b["priority"], -b["idx"]))
+    caps: Dict[int, int] = {}
+    while active:
+        remaining = budget - sum(b["header_tokens"] for b in active)
+        pending = sorted(active, key=lambda b: b["tokens"])
+        caps = {}
+        while pending:
+            share = remaining // len(pending) if remaining > 0 else 0
+            b = pending[0]
+            if b["tokens"] <= share:
+                caps[b["idx"]] = b["tokens"]
+                remaining -= b["tokens"]
+                pending.pop(0)
+                continue
+            for rest in pending:
+                caps[rest["idx"]] = share
+            break
+        starved = [b for b in active if caps[b["idx"]] < min(b["tokens"], AI_CONTEXT_MIN_INDICATOR_TOKENS)]
+        if not starved or len(active) == 1:
+            break
+        victim = next(b for b in drop_order if b in active)
+        active.remove(victim)
+        dropped.append(victim["name"])
+
+    parts = []
+    used = 0
+    for b in active:
+        body, cut = _fit_block(b["body"], b["is_table"], max(1, caps.get(b["idx"], b["tokens"])), model)
+        if cut:
+            truncated.append(b["name"])
+        parts.append(f"{b['header']}{body}\n")
+        used += b["header_tokens"] + count_tokens(body, model)
+
+    stats = {
+        "token_budget": budget,
+        "tokens": used,
+        "raw_tokens": raw_tokens,
+        "dropped": dropped,
+        "truncated": truncated,
+        "exact": _get_encoder(model) is not None,
+    }
+    return "\n".join(parts), stats
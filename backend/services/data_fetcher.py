@@ -2,15 +2,85 @@ from pymr_compat import ensure_py_mini_racer
 ensure_py_mini_racer()
 import akshare as ak
 from utils.tushare_client import ts, pro
+from core.script_cache import compile_script
+from core.single_flight import SingleFlight
+from core.ttl_cache import TTLCache
+import os
 import json
 import datetime
 from typing import Dict, Any, Optional
 
+DATA_FETCH_CACHE_TTL_SECONDS = float(os.getenv("DATA_FETCH_CACHE_TTL_SECONDS", "30"))
+DATA_FETCH_CACHE_MAX_ENTRIES = int(os.getenv("DATA_FETCH_CACHE_MAX_ENTRIES", "256"))
+DATA_FETCH_CACHE_MAX_MB = float(os.getenv("DATA_FETCH_CACHE_MAX_MB", "256"))
+
+
+class _CachedAkshare:
+    """
+    脚本内的 ak 代理：ak.xxx(...) 经 DataFetcher 的缓存调用，其余属性透传给 akshare
+    """
+
+    def __init__(self, fetcher: "DataFetcher", ttl: Optional[float]):
+        self._fetcher = fetcher
+        self._ttl = ttl
+
+    def __getattr__(self, name: str):
+        attr = getattr(ak, name)
+        if not callable(attr) or name.startswith("_"):
+            return attr
+
+        def call(*args, **kwargs):
+            return self._fetcher.call_akshare(name, *args, _ttl=self._ttl, **kwargs)
+
+        return call
+
+
 class DataFetcher:
     def __init__(self):
-        pass
+        # 缓存原始 DataFrame（post_process 之前），同一张全市场表跨股票只下载一次
+        self.cache = TTLCache(
+            max_entries=DATA_FETCH_CACHE_MAX_ENTRIES,
+            max_bytes=int(DATA_FETCH_CACHE_MAX_MB * 1024 * 1024),
+            default_ttl=DATA_FETCH_CACHE_TTL_SECONDS,
+        )
+        self.flight = SingleFlight()
+
+    def _cache_key(self, api_name: str, args: tuple, kwargs: Dict[str, Any]) -> tuple:
+        return (
+            str(api_name),
+            json.dumps(list(args), ensure_ascii=False, default=str),
+            json.dumps(kwargs, ensure_ascii=False, sort_keys=True, default=str),
+        )
+
+    def call_akshare(self, api_name: str, *args, _ttl: Optional[float] = None, **kwargs):
+        """
+        带 TTL 缓存的 akshare 调用；同参数的并发调用合并为一次下载。
+        返回 DataFrame 副本，避免调用方修改缓存或共享结果
+        """
+        import pandas as pd
+
+        ttl = DATA_FETCH_CACHE_TTL_SECONDS if _ttl is None else float(_ttl)
+        fn = getattr(ak, str(api_name))
+        key = self._cache_key(api_name, args, kwargs)
+
+        df = self.cache.get(key) if ttl > 0 else None
+        if df is None:
+            df = self.flight.do(key, self._load_akshare, key, fn, args, kwargs, ttl)
+        return df.copy() if isinstance(df, pd.DataFrame) else df
+
+    def _load_akshare(self, key: tuple, fn, args: tuple, kwargs: Dict[str, Any], ttl: float):
+        import pandas as pd
+
+        if ttl > 0:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        df = fn(*args, **kwargs)
+        if ttl > 0 and df is not None and not (isinstance(df, pd.DataFrame) and df.empty):
+            self.cache.set(key, df, ttl=ttl)
+        return df
 
-    def execute_script(self, python_code: str, context: Dict[str, Any], df=None) -> str:
+    def execute_script(self, python_code: str, context: Dict[str, Any], df=None, cache_ttl: Optional[float] = None) -> str:
         if not python_code or not python_code.strip():
             return "Error: No script provided for pure script mode."
 
@@ -22,7 +92,8 @@ class DataFetcher:
             import time
             
             local_scope = {
-                "ak": ak,
+                "ak": _CachedAkshare(self, cache_ttl),
+                "ak_raw": ak,
                 "ts": ts,
                 "pro": pro,
                 "pd": pd,
@@ -38,7 +109,7 @@ class DataFetcher:
             if context:
                 local_scope.update(context)
             
-            exec(python_code, local_scope)
+            exec(compile_script(python_code), local_scope)
             
             if "df" in local_scope and local_scope["df"] is not None:
                 df = local_scope["df"]
@@ -197,6 +268,7 @@ class DataFetcher:
         context: Dict[str, Any],
         post_process_json: str = None,
         python_code: str = None,
+        cache_ttl: Optional[float] = None,
     ) -> str:
         import pandas as pd
 
@@ -207,7 +279,7 @@ class DataFetcher:
 
             params = self._parse_params(params_json, context)
             try:
-                df = fn(**params)
+                df = self.call_akshare(str(api_name), _ttl=cache_ttl, **params)
             except Exception as e:
                 return f"Error fetching {api_name}: {str(e)}"
 
@@ -218,12 +290,12 @@ class DataFetcher:
                 df = self._apply_post_process(df, post_process_json, context=context)
 
             if python_code and python_code.strip():
-                return self.execute_script(python_code, context, df=df)
+                return self.execute_script(python_code, context, df=df, cache_ttl=cache_ttl)
 
             if isinstance(df, pd.DataFrame):
                 return df.to_json(orient="records", force_ascii=False)
             return json.dumps(df, ensure_ascii=False)
 
-        return self.execute_script(python_code, context, df=None)
+        return self.execute_script(python_code, context, df=None, cache_ttl=cache_ttl)
 
 data_fetcher = DataFetcher()
@@ -0,0 +1,48 @@
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from models import Log, Stock
+
+LOGS_PAGE_MAX = 500
+
+
+def fetch_log_summaries(
+    db: Session,
+    stock_id: Optional[int] = None,
+    limit: int = 50,
+    before_id: Optional[int] = None,
+) -> List[dict]:
+    """
+    按 id 倒序的游标分页：下一页把本页最后一条的 id 作为 before_id 传回。
+    id 随写入单调递增，与时间顺序一致；不用 timestamp 做游标，因为 SQLite 里同一秒（同一批写入）的行很常见，
+    且库里存的 CURRENT_TIMESTAMP 文本与绑定的 datetime 参数格式不同，无法可靠比较。
+    只查列表需要的列，raw_data / ai_response 通过日志详情获取
+    """
+    limit = max(1, min(int(limit), LOGS_PAGE_MAX))
+    query = db.query(
+        Log.id,
+        Log.stock_id,
+        Log.timestamp,
+        Log.ai_analysis,
+        Log.is_alert,
+        Stock.symbol,
+        Stock.name,
+    ).join(Stock, Stock.id == Log.stock_id)
+    if stock_id:
+        query = query.filter(Log.stock_id == stock_id)
+    if before_id is not None:
+        query = query.filter(Log.id < before_id)
+
+    rows = query.order_by(Log.id.desc()).limit(limit).all()
+    return [
+        {
+            "id": r.id,
+            "stock_id": r.stock_id,
+            "timestamp": r.timestamp,
+            "ai_analysis": r.ai_analysis or {},
+            "is_alert": bool(r.is_alert),
+            "stock": {"id": r.stock_id, "symbol": r.symbol, "name": r.name},
+        }
+        for r in rows
+    ]
@@ -0,0 +1,162 @@
+import datetime
+import gzip
+import json
+import os
+import time
+from typing import Iterator, List, Optional
+
+from sqlalchemy.orm import undefer_group
+
+from database import SessionLocal
+from models import Log
+
+LOG_RETENTION_DAYS = float(os.getenv("LOG_RETENTION_DAYS", "3"))
+LOG_RETENTION_BATCH_SIZE = max(1, int(os.getenv("LOG_RETENTION_BATCH_SIZE", "500")))
+LOG_RETENTION_INTERVAL_MINUTES = max(1, int(os.getenv("LOG_RETENTION_INTERVAL_MINUTES", "60")))
+LOG_ARCHIVE_ENABLED = str(os.getenv("LOG_ARCHIVE_ENABLED", "0")).strip() in ("1", "true", "True", "yes", "YES")
+LOG_ARCHIVE_FORMAT = str(os.getenv("LOG_ARCHIVE_FORMAT", "gz")).strip().lower()
+LOG_ARCHIVE_DIR = os.getenv(
+    "LOG_ARCHIVE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "log_archive"),
+)
+
+
+def _archive_ext() -> str:
+    if LOG_ARCHIVE_FORMAT == "zst":
+        try:
+            import zstandard  # noqa: F401
+
+            return "zst"
+        except ImportError:
+            print("LOG_ARCHIVE_FORMAT=zst but zstandard is not installed, falling back to gz")
+    return "gz"
+
+
+def _archive_path(day: str, ext: str) -> str:
+    return os.path.join(LOG_ARCHIVE_DIR, f"logs-{day}.jsonl.{ext}")
+
+
+def _log_to_record(log: Log) -> dict:
+    ts = log.timestamp
+    return {
+        "id": log.id,
+        "stock_id": log.stock_id,
+        "timestamp": ts.isoformat() if ts else None,
+        "raw_data": log.raw_data,
+        "ai_response": log.ai_response,
+        "ai_analysis": log.ai_analysis,
+        "is_alert": bool(log.is_alert),
+    }
+
+
+def _append_archive(records: List[dict]) -> None:
+    """
+    按日志日期追加到 logs-YYYY-MM-DD.jsonl.{gz|zst}。gzip/zstd 都支持多段拼接，追加写入后仍可整体解压
+    """
+    ext = _archive_ext()
+    by_day = {}
+    for rec in records:
+        day = (rec.get("timestamp") or "unknown")[:10]
+        by_day.setdefault(day, []).append(rec)
+
+    os.makedirs(LOG_ARCHIVE_DIR, exist_ok=True)
+    for day, items in by_day.items():
+        payload = "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in items).encode("utf-8")
+        path = _archive_path(day, ext)
+        if ext == "zst":
+            import zstandard
+
+            payload = zstandard.ZstdCompressor(level=10).compress(payload)
+            with open(path, "ab") as f:
+                f.write(payload)
+        else:
+            with gzip.open(path, "ab") as f:
+                f.write(payload)
+
+
+def read_archived_logs(day: str, stock_id: Optional[int] = None) -> Iterator[dict]:
+    """读取某天的归档日志（YYYY-MM-DD），可按 stock_id 过滤"""
+    for ext in ("gz", "zst"):
+        path = _archive_path(day, ext)
+        if not os.path.exists(path):
+            continue
+        if ext == "zst":
+            import io
+            import zstandard
+
+            with open(path, "rb") as raw:
+                stream = io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True), encoding="utf-8")
+                lines = list(stream)
+        else:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                lines = list(f)
+        for line in lines:
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            if stock_id is None or rec.get("stock_id") == stock_id:
+                yield rec
+
+
+def run_log_retention(
+    retention_days: float = LOG_RETENTION_DAYS,
+    batch_size: int = LOG_RETENTION_BATCH_SIZE,
+    archive: bool = LOG_ARCHIVE_ENABLED,
+) -> dict:
+    """
+    删除超过保留期的日志：按 id 分批、每批一个短事务，避免长时间占用 SQLite 写锁。
+    archive=True 时先把该批写入压缩归档再删除
+    """
+    start = time.time()
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=float(retention_days))
+    deleted = 0
+    archived = 0
+    last_id = 0
+    db = SessionLocal()
+    try:
+        while True:
+            if archive:
+                rows = (
+                    db.query(Log)
+                    .options(undefer_group("blobs"))
+                    .filter(Log.timestamp < cutoff, Log.id > last_id)
+                    .order_by(Log.id.asc())
+                    .limit(batch_size)
+                    .all()
+                )
+                ids = [r.id for r in rows]
+                if rows:
+                    _append_archive([_log_to_record(r) for r in rows])
+                    archived += len(rows)
+            else:
+                ids = [
+                    r[0]
+                    for r in db.query(Log.id)
+                    .filter(Log.timestamp < cutoff, Log.id > last_id)
+                    .order_by(Log.id.asc())
+                    .limit(batch_size)
+                    .all()
+                ]
+            if not ids:
+                break
+            deleted += db.query(Log).filter(Log.id.in_(ids)).delete(synchronize_session=False)
+            db.commit()
+            db.expunge_all()
+            last_id = ids[-1]
+            if len(ids) < batch_size:
+                break
+    except Exception as e:
+        db.rollback()
+        print(f"Error running log retention: {e}")
+    finally:
+        db.close()
+
+    stats = {
+        "cutoff": cutoff.isoformat(),
+        "deleted": deleted,
+        "archived": archived,
+        "duration_ms": int((time.time() - start) * 1000),
+    }
+    if deleted:
+        print(f"Log retention: {json.dumps(stats, ensure_ascii=False)}")
+    return stats
@@ -0,0 +1,142 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import inspect as sa_inspect
+
+from database import SessionLocal
+from models import Log
+
+LOG_WRITER_ENABLED = str(os.getenv("LOG_WRITER_ENABLED", "1")).strip() in ("1", "true", "True", "yes", "YES")
+LOG_WRITER_FLUSH_MS = max(10, int(os.getenv("LOG_WRITER_FLUSH_MS", "200")))
+LOG_WRITER_BATCH_ROWS = max(1, int(os.getenv("LOG_WRITER_BATCH_ROWS", "100")))
+
+_STOP = object()
+_LOG_COLUMNS = frozenset(c.key for c in Log.__table__.columns) - {"id"}
+
+
+def _snapshot(log_entry: Log) -> Dict[str, Any]:
+    """
+    取出调用方显式设置过的列值。队列里只放普通 dict，每次写入都新建 Log，
+    批量失败回滚后逐条重试时不会复用已挂在失败 Session 上的 ORM 实例；
+    没设置的列不放进去，timestamp 等仍走数据库默认值
+    """
+    return {k: v for k, v in sa_inspect(log_entry).dict.items() if k in _LOG_COLUMNS}
+
+
+class LogWriter:
+    """
+    Log 的写后批量落库：监控线程只入队，单个写线程每 flush_ms 毫秒或攒满 batch_rows 行提交一次事务，
+    多只股票同时结束时不再逐条争抢 SQLite 写锁。
+    """
+
+    def __init__(self, flush_ms: int = LOG_WRITER_FLUSH_MS, batch_rows: int = LOG_WRITER_BATCH_ROWS):
+        self.flush_interval = flush_ms / 1000.0
+        self.batch_rows = batch_rows
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stats = {"enqueued": 0, "written": 0, "batches": 0, "failed": 0}
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._thread.start()
+
+    def enqueue(self, log_entry: Log) -> None:
+        """入队一条尚未加入任何 Session 的 Log（入队的是列值快照）"""
+        self.start()
+        self._queue.put(_snapshot(log_entry))
+        with self._lock:
+            self._stats["enqueued"] += 1
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_rows:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    nxt = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if nxt is _STOP:
+                    stop = True
+                    break
+                batch.append(nxt)
+            self._flush(batch)
+            if stop:
+                return
+
+    def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        db = SessionLocal()
+        try:
+            db.add_all([Log(**row) for row in batch])
+            db.commit()
+            with self._lock:
+                self._stats["written"] += len(batch)
+                self._stats["batches"] += 1
+            return
+        except Exception as e:
+            db.rollback()
+            print(f"Log writer batch of {len(batch)} failed, retrying row by row: {e}")
+        finally:
+            db.close()
+
+        for row in batch:
+            db = SessionLocal()
+            try:
+                db.add(Log(**row))
+                db.commit()
+                with self._lock:
+                    self._stats["written"] += 1
+            except Exception as e:
+                db.rollback()
+                with self._lock:
+                    self._stats["failed"] += 1
+                print(f"Log writer dropped log for stock {row.get('stock_id')}: {e}")
+            finally:
+                db.close()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """停止写线程，队列中已有的日志全部落库后返回"""
+        with self._lock:
+            thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout=timeout)
+        with self._lock:
+            self._thread = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": self._queue.qsize(), **self._stats}
+
+
+log_writer = LogWriter()
+atexit.register(log_writer.stop)
+
+
+def write_log(db, log_entry: Log, sync: bool = False) -> Optional[int]:
+    """
+    写入一条 Log。sync=True（或关闭写后队列）时用调用方的 Session 立即提交并返回行 id；
+    否则入队由写线程批量提交，返回 None
+    """
+    if sync or not LOG_WRITER_ENABLED:
+        db.add(log_entry)
+        db.commit()
+        return log_entry.id
+    log_writer.enqueue(log_entry)
+    return None
@@ -1,11 +1,21 @@
 from apscheduler.schedulers.background import BackgroundScheduler
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload, joinedload
 from typing import Optional, List
 from database import SessionLocal
-from models import Stock, Log, AIConfig, SystemConfig, RuleScript, IndicatorDefinition
+from models import Stock, Log, AIConfig, IndicatorDefinition
 from services.data_fetcher import data_fetcher
 from services.ai_service import ai_service
+from services.ai_batcher import ai_batcher, AI_BATCH_ENABLED
+from services.context_builder import build_ai_context
 from services.alert_service import alert_service
+from core.script_cache import compile_script
+from core.ttl_cache import TTLCache
+from services.system_config_cache import system_config_cache
+from services.signal_cache import last_signal_cache
+from services.log_retention import run_log_retention, LOG_RETENTION_INTERVAL_MINUTES
+from services.log_writer import write_log
+from core.upstream_limits import async_upstream_slot, ai_upstream_name, upstream_slot
+from core.ai_retry import ai_deadline, get_provider_guard
 import datetime
 import json
 import time
@@ -13,12 +23,51 @@ import os
 import html
 import io
 import sys
+import threading
+import asyncio
 from pymr_compat import ensure_py_mini_racer
 ensure_py_mini_racer()
 import akshare as ak
 from utils.tushare_client import ts, pro
 import pandas as pd
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+# 单次 AI 调用（含排队、限流等待）的截止时间，向下传给 HTTP 超时，卡住的请求到点即释放工作线程
+AI_CALL_DEADLINE_SECONDS = float(os.getenv("AI_CALL_DEADLINE_SECONDS", "300"))
+# 流式接收 AI 输出，signal 一出现就评估强信号告警，不必等 message 全文生成完
+AI_STREAM_ENABLED = str(os.getenv("AI_STREAM_ENABLED", "0")).strip() in ("1", "true", "True", "yes", "YES")
+INDICATOR_FETCH_WORKERS = max(1, int(os.getenv("INDICATOR_FETCH_WORKERS", "6")))
+_indicator_executor = ThreadPoolExecutor(max_workers=INDICATOR_FETCH_WORKERS, thread_name_prefix="indicator-fetch")
+# 流式提前告警的发信线程：SMTP 慢时不能拖住仍在读取的 AI 流与它占用的上游名额
+_early_alert_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="early-alert")
+
+def _indicator_spec(ind) -> tuple:
+    return (ind.name, ind.akshare_api, ind.params_json, ind.post_process_json, ind.python_code, ind.cache_ttl_seconds)
+
+def _fetch_indicator_spec(spec: tuple, context: dict) -> dict:
+    name, api, params_json, post_process_json, python_code, cache_ttl = spec
+    start = time.time()
+    try:
+        data = data_fetcher.fetch(api, params_json, dict(context), post_process_json, python_code, cache_ttl=cache_ttl)
+    except Exception as e:
+        data = f"Error fetching {name}: {e}"
+    return {"name": name, "api": api, "data": data, "duration_ms": int((time.time() - start) * 1000)}
+
+def _fetch_indicator_spec_limited(spec: tuple, context: dict) -> dict:
+    """同步路径占用 akshare 名额，与协程路径的 async_upstream_slot 限额一致"""
+    with upstream_slot("akshare"):
+        return _fetch_indicator_spec(spec, context)
+
+def _fetch_indicators(indicators, context: dict) -> list:
+    """
+    并发拉取一只股票的全部指标，返回顺序与 indicators 一致的
+    [{"name", "api", "data", "duration_ms"}]。ORM 字段在提交前读出，工作线程不触碰 Session。
+    """
+    specs = [_indicator_spec(ind) for ind in indicators]
+    if len(specs) <= 1:
+        return [_fetch_indicator_spec_limited(spec, context) for spec in specs]
+    return list(_indicator_executor.map(lambda spec: _fetch_indicator_spec_limited(spec, context), specs))
 
 def analyze_stock_manual(
     stock_id: int,
@@ -44,9 +93,10 @@ def analyze_stock_manual(
 
         context = {"symbol": stock.symbol, "name": stock.name}
         data_parts = []
-        for ind in indicators:
-            data = data_fetcher.fetch(ind.akshare_api, ind.params_json, context, ind.post_process_json, ind.python_code)
-            data_parts.append(f"--- Indicator: {ind.name} ---\n{data}\n")
+        context_items = []
+        for ind, item in zip(indicators, _fetch_indicators(indicators, context)):
+            data_parts.append(f"--- Indicator: {item['name']} ---\n{item['data']}\n")
+            context_items.append({"name": item["name"], "data": item["data"], "priority": getattr(ind, "priority", 0)})
         full_data = "\n".join(data_parts)
 
         # 2. AI Analysis - use raw mode (only custom prompt, no system prompts)
@@ -62,8 +112,8 @@ def analyze_stock_manual(
             "temperature": getattr(ai_config, "temperature", 0.7),
         }
 
-        max_chars = ai_config.max_tokens if ai_config.max_tokens else 100000
-        data_for_ai = full_data[:max_chars]
+        max_tokens = ai_config.max_tokens if ai_config.max_tokens else 100000
+        data_for_ai, _ = build_ai_context(context_items, max_tokens, model=ai_config.model_name)
 
         # Use the new analyze_raw method - only custom prompt, raw response
         raw_response = ai_service.analyze_raw(data_for_ai, custom_prompt, config_dict)
@@ -98,15 +148,15 @@ def fetch_stock_indicators_data(
         context = {"symbol": stock.symbol, "name": stock.name}
         results = {}
         
-        for ind in indicators:
-            data_str = data_fetcher.fetch(ind.akshare_api, ind.params_json, context, ind.post_process_json, ind.python_code)
+        for item in _fetch_indicators(indicators, context):
+            data_str = item["data"]
             # Try to parse as JSON to return structured data
             try:
                 data_obj = json.loads(data_str)
             except:
                 data_obj = data_str # Fallback to string if not valid JSON
             
-            results[ind.name] = data_obj
+            results[item["name"]] = data_obj
 
         return {
             "ok": True,
@@ -157,8 +207,35 @@ def _emit(event: str, payload: dict):
     except Exception:
         print(f"{event} {payload}")
 
+def _stock_hot_path_options():
+    """监控热路径一次性载入的关联：指标、AI 配置、规则脚本"""
+    return (
+        selectinload(Stock.indicators),
+        joinedload(Stock.ai_config),
+        joinedload(Stock.rule_script),
+    )
+
+# 【当前监控股票】列表对所有股票相同，短时间内复用，避免每只股票各查一次
+_monitored_stocks_cache = TTLCache(max_entries=1, default_ttl=30.0)
+
+def _get_monitored_stocks_snapshot(db: Session) -> list:
+    rows = _monitored_stocks_cache.get("monitored")
+    if rows is None:
+        rows = [
+            (s.id, s.symbol, s.name, getattr(s, "monitoring_mode", None) or "ai_only")
+            for s in (
+                db.query(Stock)
+                .filter(Stock.is_monitoring == True)
+                .order_by(Stock.id.asc())
+                .limit(200)
+                .all()
+            )
+        ]
+        _monitored_stocks_cache.set("monitored", rows)
+    return rows
+
 def _get_alert_config(db: Session):
-    config = db.query(SystemConfig).filter(SystemConfig.key == "alert_rate_limit").first()
+    config_value = system_config_cache.get("alert_rate_limit", db)
     
     result = {
         "enabled": False,
@@ -168,9 +245,9 @@ def _get_alert_config(db: Session):
         "bypass_rate_limit_for_strong_signals": True
     }
 
-    if config and config.value:
+    if config_value:
         try:
-            data = json.loads(config.value)
+            data = json.loads(config_value)
             if "enabled" in data: result["enabled"] = bool(data["enabled"])
             if "max_per_hour_per_stock" in data: result["max_per_hour_per_stock"] = int(data["max_per_hour_per_stock"] or 0)
             if "allowed_signals" in data: result["allowed_signals"] = data["allowed_signals"]
@@ -252,6 +329,51 @@ def _to_html(text_value):
     text = "" if text_value is None else str(text_value)
     return html.escape(text).replace("\n", "<br/>")
 
+def _render_alert_email(stock, canonical_signal: str, action_advice, suggested_position, duration_text, stop_loss, msg, now_dt) -> str:
+    signal_cn, signal_color = _signal_display(canonical_signal)
+    duration_level, duration_color = _duration_severity(duration_text)
+    return f"""
+<div style="font-family:-apple-system,BlinkMacSystemFont,Segoe UI,Roboto,Helvetica,Arial; font-size:14px; color:#111827; line-height:1.6;">
+  <div style="font-size:18px; font-weight:700; margin-bottom:12px;">AI 盯盘提醒</div>
+  <div style="margin-bottom:12px;">
+    <span style="color:#6B7280;">股票</span>：<span style="font-weight:700;">{_to_html(stock.symbol)}</span> {_to_html(stock.name)}
+  </div>
+  <table style="border-collapse:collapse; width:100%; max-width:720px;">
+    <tr>
+      <td style="padding:8px 10px; border:1px solid #E5E7EB; width:140px; color:#374151;">信号</td>
+      <td style="padding:8px 10px; border:1px solid #E5E7EB;">
+        <span style="color:{signal_color}; font-weight:800;">{_to_html(signal_cn)}</span>
+        <span style="color:#6B7280;">（{_to_html(canonical_signal)}）</span>
+      </td>
+    </tr>
+    <tr>
+      <td style="padding:8px 10px; border:1px solid #E5E7EB; color:#374151;">操作建议</td>
+      <td style="padding:8px 10px; border:1px solid #E5E7EB;">{_to_html(action_advice)}</td>
+    </tr>
+    <tr>
+      <td style="padding:8px 10px; border:1px solid #E5E7EB; color:#374151;">建议仓位</td>
+      <td style="padding:8px 10px; border:1px solid #E5E7EB;">{_to_html(suggested_position)}</td>
+    </tr>
+    <tr>
+      <td style="padding:8px 10px; border:1px solid #E5E7EB; color:#374151;">建议持仓时间</td>
+      <td style="padding:8px 10px; border:1px solid #E5E7EB;">
+        <span style="color:{duration_color}; font-weight:800;">{_to_html(duration_text)}</span>
+        <span style="color:{duration_color};">（{_to_html(duration_level)}）</span>
+      </td>
+    </tr>
+    <tr>
+      <td style="padding:8px 10px; border:1px solid #E5E7EB; color:#374151;">止损价</td>
+      <td style="padding:8px 10px; border:1px solid #E5E7EB;">{_to_html(stop_loss)}</td>
+    </tr>
+    <tr>
+      <td style="padding:8px 10px; border:1px solid #E5E7EB; color:#374151;">分析摘要</td>
+      <td style="padding:8px 10px; border:1px solid #E5E7EB;">{_to_html(msg)}</td>
+    </tr>
+  </table>
+  <div style="margin-top:12px; color:#6B7280;">触发时间：{_to_html(now_dt.strftime("%Y-%m-%d %H:%M:%S"))}</div>
+</div>
+""".strip()
+
 def _execute_rule_script(stock, rule_script):
     if not rule_script or not rule_script.code:
         return False, "No script code", ""
@@ -275,7 +397,7 @@ def _execute_rule_script(stock, rule_script):
         }
         
         try:
-            exec(rule_script.code, {}, local_scope)
+            exec(compile_script(rule_script.code), {}, local_scope)
             triggered = bool(local_scope.get("triggered", False))
             message = str(local_scope.get("message", ""))
             signal = local_scope.get("signal", None)
@@ -296,50 +418,73 @@ def _execute_rule_script(stock, rule_script):
         print(f"Error executing rule script for {stock.symbol}: {e}")
         return False, f"Error: {e}", "", None
 
-def _get_last_signal_from_db(stock_id: int, db: Session) -> str:
+def _get_last_signal(stock_id: int, db: Session) -> str:
     """
-    Get the last signal from the DB logs for a specific stock.
+    Get the last signal for a specific stock from the in-memory last-signal cache
+    (warmed from the logs table, updated on every committed Log insert).
     Returns "WAIT" if no logs found or signal is missing.
     """
     try:
-        last_log = db.query(Log).filter(Log.stock_id == stock_id).order_by(Log.timestamp.desc()).first()
-        if last_log and last_log.ai_analysis:
-            # ai_analysis is stored as JSON
-            analysis = last_log.ai_analysis
-            if isinstance(analysis, str):
-                 try:
-                     analysis = json.loads(analysis)
-                 except:
-                     pass
-            
-            if isinstance(analysis, dict):
-                signal = analysis.get("signal")
-                return _canonicalize_signal(signal)
+        return _canonicalize_signal(last_signal_cache.get(stock_id, db))
     except Exception as e:
         print(f"Error fetching last signal for stock {stock_id}: {e}")
     
     return "WAIT"
 
+def _pick_fallback_ai_config(db: Session, current) -> Optional[AIConfig]:
+    """
+    当前服务商熔断/饱和时找一个可用的备选：其它启用中的 AIConfig，base_url 不同且其熔断器未打开
+    """
+    current_upstream = ai_upstream_name({"base_url": getattr(current, "base_url", None)})
+    try:
+        candidates = (
+            db.query(AIConfig)
+            .filter(AIConfig.is_active == True, AIConfig.id != getattr(current, "id", None))
+            .order_by(AIConfig.id.asc())
+            .all()
+        )
+    except Exception as e:
+        print(f"Error loading fallback AI configs: {e}")
+        return None
+    for cfg in candidates:
+        upstream = ai_upstream_name({"base_url": cfg.base_url})
+        if upstream != current_upstream and get_provider_guard(upstream).is_available():
+            return cfg
+    return None
+
 def _log_chain(run_id, message):
     """Log execution chain step for debugging"""
     print(f"[ExecChain][{run_id}] {message}")
 
-def process_stock(
+def _process_stock_flow(
     stock_id: int,
     bypass_checks: bool = False,
     send_alerts: bool = True,
     is_test: bool = False,
     return_result: bool = False,
     db: Optional[Session] = None,
+    preloaded_stock: Optional[Stock] = None,
 ):
+    """
+    监控主流程（生成器）。阻塞 I/O 以步骤元组 yield 出去，由驱动方执行后 send 回结果：
+    ("rule", stock, rule) / ("fetch", indicators, context) / ("ai", data, prompt, config, time_str, debug, symbol, on_signal) / ("email", subject, body)。
+    同步驱动见 process_stock，协程驱动见 process_stock_async。
+    """
     start_time_perf = time.time()
     owns_db = db is None
     if db is None:
         db = SessionLocal()
     run_id = f"{stock_id}-{time.time_ns()}"
+    # 测试/需要返回结果的调用同步写库拿到行 id，常规监控走写后批量队列
+    sync_log_write = is_test or return_result
+    log_id = None
+    # 流式分析中提前发出的强信号告警：{"signal": ..., "future": 发信任务}
+    early_alert = {}
     _log_chain(run_id, f"START process_stock stock_id={stock_id}")
     try:
-        stock = db.query(Stock).filter(Stock.id == stock_id).first()
+        stock = preloaded_stock
+        if stock is None:
+            stock = db.query(Stock).options(*_stock_hot_path_options()).filter(Stock.id == stock_id).first()
         if not stock:
             _log_chain(run_id, "SKIP: stock_not_found")
             _emit("monitor_skip", {"run_id": run_id, "stock_id": stock_id, "reason": "stock_not_found"})
@@ -448,7 +593,7 @@ def process_stock(
         monitoring_mode = getattr(stock, "monitoring_mode", "ai_only") or "ai_only"
         
         # Get Last Signal from DB
-        last_signal = _get_last_signal_from_db(stock.id, db)
+        last_signal = _get_last_signal(stock.id, db)
         
         _log_chain(run_id, f"Step: Mode Check. Mode={monitoring_mode}, LastSignal={last_signal}")
 
@@ -503,8 +648,7 @@ def process_stock(
                         ai_analysis=analysis_json,
                         is_alert=False,
                     )
-                    db.add(log_entry)
-                    db.commit()
+                    log_id = write_log(db, log_entry, sync=sync_log_write)
                 if return_result:
                     return {
                         "ok": False,
@@ -519,7 +663,7 @@ def process_stock(
                     }
                 return
 
-            rule = db.query(RuleScript).filter(RuleScript.id == stock.rule_script_id).first()
+            rule = stock.rule_script
             if not rule:
                 _log_chain(run_id, f"SKIP: rule_not_found ID={stock.rule_script_id}")
                 msg = f"Rule script {stock.rule_script_id} not found"
@@ -541,8 +685,7 @@ def process_stock(
                         ai_analysis=analysis_json,
                         is_alert=False,
                     )
-                    db.add(log_entry)
-                    db.commit()
+                    log_id = write_log(db, log_entry, sync=sync_log_write)
                 if return_result:
                     return {
                         "ok": False,
@@ -558,7 +701,7 @@ def process_stock(
                 return
 
             _log_chain(run_id, f"Executing Rule Script ID={rule.id}")
-            script_triggered, script_msg, script_log, script_signal = _execute_rule_script(stock, rule)
+            script_triggered, script_msg, script_log, script_signal = yield ("rule", stock, rule)
             _log_chain(run_id, f"Rule Result: Triggered={script_triggered}, Signal={script_signal}, Msg={script_msg}")
             
             if monitoring_mode == "hybrid":
@@ -597,8 +740,7 @@ def process_stock(
                         ai_analysis=analysis_json,
                         is_alert=False,
                     )
-                    db.add(log_entry)
-                    db.commit()
+                    log_id = write_log(db, log_entry, sync=sync_log_write)
 
                     _emit(
                         "monitor_skip",
@@ -623,6 +765,7 @@ def process_stock(
                             "script_message": script_msg,
                             "script_log": script_log,
                             "ai_reply": analysis_json,
+                            "log_id": log_id,
                         }
                     return
 
@@ -649,8 +792,7 @@ def process_stock(
                         ai_analysis=analysis_json,
                         is_alert=False,
                     )
-                    db.add(log_entry)
-                    db.commit()
+                    log_id = write_log(db, log_entry, sync=sync_log_write)
 
                     _emit(
                         "monitor_skip",
@@ -669,6 +811,7 @@ def process_stock(
                             "script_message": script_msg,
                             "script_log": script_log,
                             "ai_reply": analysis_json,
+                            "log_id": log_id,
                         }
                     return
 
@@ -689,12 +832,14 @@ def process_stock(
         fetch_ok = 0
         fetch_error = 0
         fetch_errors = []
+        fetch_wall_ms = 0
         ai_duration_ms = 0
         is_alert = False
         prompt_source = ""
         prompt = ""
         data_truncated = False
-        max_chars = 0
+        max_tokens = 0
+        context_stats = {}
         data_for_ai = ""
         ai_request_payload_text = ""
         ai_model_name = "-"
@@ -761,8 +906,7 @@ def process_stock(
                         ai_analysis=analysis_json,
                         is_alert=False,
                     )
-                    db.add(log_entry)
-                    db.commit()
+                    log_id = write_log(db, log_entry, sync=sync_log_write)
                 if return_result:
                     return {
                         "ok": False,
@@ -782,22 +926,25 @@ def process_stock(
             data_parts = []
             
             _log_chain(run_id, f"Fetching data for {len(stock.indicators)} indicators")
-            for indicator in stock.indicators:
-                fetch_start = time.time()
-                data = data_fetcher.fetch(indicator.akshare_api, indicator.params_json, context, indicator.post_process_json, indicator.python_code)
-                fetch_duration_ms = int((time.time() - fetch_start) * 1000)
+            fetch_start = time.time()
+            fetched = yield ("fetch", stock.indicators, context)
+            context_items = []
+            for ind, item in zip(stock.indicators, fetched):
+                data = item["data"]
                 if isinstance(data, str) and data.startswith("Error"):
                     fetch_error += 1
-                    fetch_errors.append({"indicator": indicator.name, "api": indicator.akshare_api, "duration_ms": fetch_duration_ms, "error": data[:200]})
+                    fetch_errors.append({"indicator": item["name"], "api": item["api"], "duration_ms": item["duration_ms"], "error": data[:200]})
                 else:
                     fetch_ok += 1
-                data_parts.append(f"--- Indicator: {indicator.name} ---\n{data}\n")
+                data_parts.append(f"--- Indicator: {item['name']} ---\n{data}\n")
+                context_items.append({"name": item["name"], "data": data, "priority": getattr(ind, "priority", 0)})
+            fetch_wall_ms = int((time.time() - fetch_start) * 1000)
             
-            _log_chain(run_id, f"Data fetch done. OK={fetch_ok}, Err={fetch_error}")
+            _log_chain(run_id, f"Data fetch done. OK={fetch_ok}, Err={fetch_error}, Wall={fetch_wall_ms}ms")
             full_data = "\n".join(data_parts)
 
             # 2. AI Analysis
-            ai_config = db.query(AIConfig).filter(AIConfig.id == stock.ai_provider_id).first()
+            ai_config = stock.ai_config
             if not ai_config:
                 print("AI Config not found")
                 if is_test:
@@ -821,8 +968,7 @@ def process_stock(
                         ai_analysis=analysis_json,
                         is_alert=False,
                     )
-                    db.add(log_entry)
-                    db.commit()
+                    log_id = write_log(db, log_entry, sync=sync_log_write)
                 if return_result:
                     return {
                         "ok": False,
@@ -846,17 +992,23 @@ def process_stock(
                 "temperature": getattr(ai_config, "temperature", 0.1),
             }
 
-            max_chars = ai_config.max_tokens if ai_config.max_tokens else 100000
-            data_for_ai = full_data[:max_chars]
-            data_truncated = len(full_data) > max_chars
+            # max_tokens 按 token 预算使用：表格化压缩后按指标分配，超出时先丢低优先级指标
+            max_tokens = ai_config.max_tokens if ai_config.max_tokens else 100000
+            data_for_ai, context_stats = build_ai_context(context_items, max_tokens, model=ai_config.model_name)
+            data_truncated = bool(context_stats["dropped"] or context_stats["truncated"])
+            _log_chain(
+                run_id,
+                f"AI context: {context_stats['tokens']}/{max_tokens} tokens (raw {context_stats['raw_tokens']}), "
+                f"dropped={context_stats['dropped']}, truncated={context_stats['truncated']}",
+            )
 
             # Load Prompts
             global_prompt = ""
             global_account_info = ""
-            global_prompt_config = db.query(SystemConfig).filter(SystemConfig.key == "global_prompt").first()
-            if global_prompt_config and global_prompt_config.value:
+            global_prompt_value = system_config_cache.get("global_prompt", db)
+            if global_prompt_value:
                 try:
-                    raw_value = global_prompt_config.value
+                    raw_value = global_prompt_value
                     prompt_text = raw_value
                     try:
                         parsed = json.loads(raw_value)
@@ -888,19 +1040,12 @@ def process_stock(
             if stock_prompt:
                 prompt_parts.append(f"【个股特别设定/持仓信息】\n{stock_prompt}")
             try:
-                monitored_stocks = (
-                    db.query(Stock)
-                    .filter(Stock.is_monitoring == True)
-                    .order_by(Stock.id.asc())
-                    .limit(200)
-                    .all()
-                )
+                monitored_stocks = _get_monitored_stocks_snapshot(db)
                 if monitored_stocks:
                     lines = []
-                    for s in monitored_stocks:
-                        label = f"{s.symbol} {s.name}".strip()
-                        mode = getattr(s, "monitoring_mode", None) or "ai_only"
-                        if s.id == stock.id:
+                    for s_id, s_symbol, s_name, mode in monitored_stocks:
+                        label = f"{s_symbol} {s_name}".strip()
+                        if s_id == stock.id:
                             lines.append(f"- {label}（当前） mode={mode}")
                         else:
                             lines.append(f"- {label} mode={mode}")
@@ -944,12 +1089,77 @@ def process_stock(
             }
             ai_request_payload_text = json.dumps(ai_request_payload, ensure_ascii=False, indent=2)
 
+            on_signal = None
+            if AI_STREAM_ENABLED and send_alerts and not return_result and not AI_BATCH_ENABLED:
+                early_alert_config = _get_alert_config(db)
+
+                def on_signal(partial):
+                    # 只对强信号提前发信；其余情况等完整结果走常规告警流程。每次执行最多提前发一封
+                    if early_alert.get("signal"):
+                        return
+                    early_signal = _canonicalize_signal(partial.get("signal"))
+                    if early_signal not in ("STRONG_BUY", "STRONG_SELL") or early_signal == last_signal:
+                        return
+                    if early_signal not in early_alert_config.get("allowed_signals", ["BUY", "SELL", "STRONG_BUY", "STRONG_SELL"]):
+                        return
+                    # 强信号不受限频约束时才能在拿到全文前确定要发送
+                    if not early_alert_config.get("bypass_rate_limit_for_strong_signals", True):
+                        return
+                    early_duration = partial.get("duration", "-")
+                    early_level, _ = _duration_severity(early_duration)
+                    if early_level not in early_alert_config.get("allowed_urgencies", ["紧急", "一般", "不紧急"]):
+                        return
+                    early_signal_cn, _ = _signal_display(early_signal)
+                    body = _render_alert_email(
+                        stock,
+                        early_signal,
+                        partial.get("action_advice", "No advice"),
+                        partial.get("suggested_position", "-"),
+                        early_duration,
+                        partial.get("stop_loss_price", "-"),
+                        "AI 分析全文仍在生成，完整内容见监控日志",
+                        datetime.datetime.now(),
+                    )
+                    # 回调在读流的线程里执行：只把发信交给后台线程，立即返回继续读流
+                    early_alert["future"] = _early_alert_executor.submit(
+                        alert_service.send_email,
+                        subject=f"【AI盯盘】{stock.symbol} {stock.name} - {early_signal_cn}",
+                        body=body,
+                        is_html=True,
+                    )
+                    early_alert["signal"] = early_signal
+                    _alert_history_by_stock_id.setdefault(stock.id, []).append(time.time())
+                    _log_chain(run_id, f"Early alert queued from stream: Signal={early_signal}, after {int((time.time() - ai_start) * 1000)}ms")
+                    _emit("alert_early", {"run_id": run_id, "stock_id": stock.id, "symbol": stock.symbol, "signal": early_signal})
+
             ai_start = time.time()
             _log_chain(run_id, f"Calling AI Model: {ai_model_name}")
             if return_result:
-                analysis_json, raw_response, prompt_debug = ai_service.analyze_debug(data_for_ai, prompt, config_dict, current_time_str=ai_request_time_str)
+                analysis_json, raw_response, prompt_debug = yield ("ai", data_for_ai, prompt, config_dict, ai_request_time_str, True, stock.symbol, None)
             else:
-                analysis_json, raw_response = ai_service.analyze(data_for_ai, prompt, config_dict, current_time_str=ai_request_time_str)
+                analysis_json, raw_response = yield ("ai", data_for_ai, prompt, config_dict, ai_request_time_str, False, stock.symbol, on_signal)
+
+            if analysis_json.get("provider_unavailable"):
+                fallback = _pick_fallback_ai_config(db, ai_config)
+                if fallback is not None:
+                    _log_chain(run_id, f"AI provider unavailable ({ai_base_url}), falling back to {fallback.name}: {fallback.model_name}")
+                    _emit("ai_fallback", {"run_id": run_id, "stock_id": stock.id, "from": ai_config.name, "to": fallback.name})
+                    ai_config = fallback
+                    ai_model_name = fallback.model_name
+                    ai_base_url = fallback.base_url
+                    config_dict = {
+                        "api_key": fallback.api_key,
+                        "base_url": fallback.base_url,
+                        "model_name": fallback.model_name,
+                        "temperature": getattr(fallback, "temperature", 0.1),
+                    }
+                    ai_request_payload["model"] = fallback.model_name
+                    ai_request_payload["temperature"] = config_dict["temperature"]
+                    ai_request_payload_text = json.dumps(ai_request_payload, ensure_ascii=False, indent=2)
+                    if return_result:
+                        analysis_json, raw_response, prompt_debug = yield ("ai", data_for_ai, prompt, config_dict, ai_request_time_str, True, stock.symbol, None)
+                    else:
+                        analysis_json, raw_response = yield ("ai", data_for_ai, prompt, config_dict, ai_request_time_str, False, stock.symbol, on_signal)
             ai_duration_ms = int((time.time() - ai_start) * 1000)
             
             signal = analysis_json.get("signal", "WAIT")
@@ -975,8 +1185,7 @@ def process_stock(
             ai_analysis=analysis_json,
             is_alert=is_alert
         )
-        db.add(log_entry)
-        db.commit()
+        log_id = write_log(db, log_entry, sync=sync_log_write)
 
         # 4. Alert
         alert_attempted = False
@@ -993,8 +1202,8 @@ def process_stock(
         duration_text = analysis_json.get("duration", "-")
         stop_loss = analysis_json.get("stop_loss_price", "-")
         now_dt = datetime.datetime.now()
-        signal_cn, signal_color = _signal_display(canonical_signal)
-        duration_level, duration_color = _duration_severity(duration_text)
+        signal_cn, _ = _signal_display(canonical_signal)
+        duration_level, _ = _duration_severity(duration_text)
 
         # Filter 1: Allowed Signals
         allowed_signals = alert_config.get("allowed_signals", ["BUY", "SELL", "STRONG_BUY", "STRONG_SELL"])
@@ -1020,50 +1229,20 @@ def process_stock(
         
         _log_chain(run_id, f"Alert Decision: Signal={canonical_signal}, Changed={is_signal_changed}, AllowedSig={canonical_signal in allowed_signals}, Urgency={duration_level}, Send={should_send_email}")
 
-        if should_send_email and send_alerts:
+        if should_send_email and send_alerts and early_alert.get("signal") == canonical_signal:
+            # 流式阶段已按同一信号发过告警，不重复发送
+            alert_attempted = True
+            try:
+                # 此时 AI 流已关闭、名额已释放，等待后台发信结果不会占用上游
+                alert_result = early_alert["future"].result()
+            except Exception as e:
+                alert_result = {"ok": False, "mocked": False, "receiver_email": None, "error": str(e)}
+        elif should_send_email and send_alerts:
             alert_attempted = True
             
-            email_body = f"""
-<div style="font-family:-apple-system,BlinkMacSystemFont,Segoe UI,Roboto,Helvetica,Arial; font-size:14px; color:#111827; line-height:1.6;">
-  <div style="font-size:18px; font-weight:700; margin-bottom:12px;">AI 盯盘提醒</div>
-  <div style="margin-bottom:12px;">
-    <span style="color:#6B7280;">股票</span>：<span style="font-weight:700;">{_to_html(stock.symbol)}</span> {_to_html(stock.name)}
-  </div>
-  <table style="border-collapse:collapse; width:100%; max-width:720px;">
-    <tr>
-      <td style="padding:8px 10px; border:1px solid #E5E7EB; width:140px; color:#374151;">信号</td>
-      <td style="padding:8px 10px; border:1px solid #E5E7EB;">
-        <span style="color:{signal_color}; font-weight:800;">{_to_html(signal_cn)}</span>
-        <span style="color:#6B7280;">（{_to_html(canonical_signal)}）</span>
-      </td>
-    </tr>
-    <tr>
-      <td style="padding:8px 10px; border:1px solid #E5E7EB; color:#374151;">操作建议</td>
-      <td style="padding:8px 10px; border:1px solid #E5E7EB;">{_to_html(action_advice)}</td>
-    </tr>
-    <tr>
-      <td style="padding:8px 10px; border:1px solid #E5E7EB; color:#374151;">建议仓位</td>
-      <td style="padding:8px 10px; border:1px solid #E5E7EB;">{_to_html(suggested_position)}</td>
-    </tr>
-    <tr>
-      <td style="padding:8px 10px; border:1px solid #E5E7EB; color:#374151;">建议持仓时间</td>
-      <td style="padding:8px 10px; border:1px solid #E5E7EB;">
-        <span style="color:{duration_color}; font-weight:800;">{_to_html(duration_text)}</span>
-        <span style="color:{duration_color};">（{_to_html(duration_level)}）</span>
-      </td>
-    </tr>
-    <tr>
-      <td style="padding:8px 10px; border:1px solid #E5E7EB; color:#374151;">止损价</td>
-      <td style="padding:8px 10px; border:1px solid #E5E7EB;">{_to_html(stop_loss)}</td>
-    </tr>
-    <tr>
-      <td style="padding:8px 10px; border:1px solid #E5E7EB; color:#374151;">分析摘要</td>
-      <td style="padding:8px 10px; border:1px solid #E5E7EB;">{_to_html(msg)}</td>
-    </tr>
-  </table>
-  <div style="margin-top:12px; color:#6B7280;">触发时间：{_to_html(now_dt.strftime("%Y-%m-%d %H:%M:%S"))}</div>
-</div>
-""".strip()
+            email_body = _render_alert_email(
+                stock, canonical_signal, action_advice, suggested_position, duration_text, stop_loss, msg, now_dt
+            )
 
             max_per_hour_str = os.getenv("ALERT_MAX_PER_HOUR_PER_STOCK", "").strip() if not alert_config.get("enabled") else ""
             max_per_hour_cfg = alert_config.get("max_per_hour_per_stock", 0)
@@ -1104,28 +1283,19 @@ def process_stock(
                     )
                 else:
                     subject = f"【AI盯盘】{stock.symbol} {stock.name} - {signal_cn}"
-                    alert_result = alert_service.send_email(subject=subject, body=email_body, is_html=True)
+                    alert_result = yield ("email", subject, email_body)
                     history.append(now_ts)
                     _alert_history_by_stock_id[stock.id] = history
                     print(f"Alert sent for {stock.symbol}")
             else:
                 subject = f"【AI盯盘】{stock.symbol} {stock.name} - {signal_cn}"
-                alert_result = alert_service.send_email(subject=subject, body=email_body, is_html=True)
+                alert_result = yield ("email", subject, email_body)
                 history = _alert_history_by_stock_id.get(stock.id, [])
                 history.append(time.time())
                 _alert_history_by_stock_id[stock.id] = history
                 print(f"Alert sent for {stock.symbol}")
         
-        # 5. Cleanup Logs
-        if not is_test:
-            try:
-                cutoff_date = datetime.datetime.now() - datetime.timedelta(days=3)
-                deleted_count = db.query(Log).filter(Log.stock_id == stock.id, Log.timestamp < cutoff_date).delete()
-                if deleted_count > 0:
-                    print(f"Cleaned up {deleted_count} old logs for {stock.symbol}")
-                    db.commit()
-            except Exception as e:
-                print(f"Error cleaning up logs: {e}")
+        # 5. Old logs are cleaned up by the periodic log retention job (services/log_retention.py)
 
         duration = time.time() - start_time_perf
         print(f"Finished processing {stock.symbol} in {duration:.2f}s")
@@ -1139,8 +1309,11 @@ def process_stock(
                 "fetch_ok": fetch_ok,
                 "fetch_error": fetch_error,
                 "fetch_errors": fetch_errors,
+                "fetch_duration_ms": fetch_wall_ms,
                 "data_chars": len(full_data),
+                "data_tokens": context_stats.get("tokens"),
                 "data_truncated": data_truncated,
+                "data_dropped": context_stats.get("dropped"),
                 "ai_called": (monitoring_mode != "script_only") or (monitoring_mode == "hybrid" and script_triggered),
                 "ai_model": ai_model_name,
                 "ai_duration_ms": ai_duration_ms,
@@ -1168,8 +1341,10 @@ def process_stock(
                 "user_prompt": (prompt_debug or {}).get("user_prompt", "") if monitoring_mode != "script_only" else None,
                 "ai_reply": analysis_json,
                 "raw_response": raw_response,
+                "log_id": log_id,
                 "data_truncated": data_truncated,
-                "data_char_limit": (max_chars if data_truncated else None) if monitoring_mode != "script_only" else None,
+                "data_token_limit": (max_tokens if data_truncated else None) if monitoring_mode != "script_only" else None,
+                "data_dropped": context_stats.get("dropped") or None,
                 "fetch_ok": fetch_ok,
                 "fetch_error": fetch_error,
                 "fetch_errors": fetch_errors,
@@ -1204,9 +1379,290 @@ def process_stock(
         if owns_db:
             db.close()
 
+def _run_flow_step_sync(step):
+    kind = step[0]
+    if kind == "rule":
+        with upstream_slot("akshare"):
+            return _execute_rule_script(step[1], step[2])
+    if kind == "fetch":
+        return _fetch_indicators(step[1], step[2])
+    if kind == "ai":
+        _, data_for_ai, prompt, config_dict, time_str, debug, label, on_signal = step
+        with ai_deadline(AI_CALL_DEADLINE_SECONDS):
+            if AI_BATCH_ENABLED and not debug and on_signal is None:
+                # 批次在派发时占用名额
+                return ai_batcher.analyze(data_for_ai, prompt, config_dict, current_time_str=time_str, label=label)
+            with upstream_slot(ai_upstream_name(config_dict)):
+                if debug:
+                    return ai_service.analyze_debug(data_for_ai, prompt, config_dict, current_time_str=time_str)
+                if on_signal is not None:
+                    return ai_service.analyze_stream(data_for_ai, prompt, config_dict, current_time_str=time_str, on_signal=on_signal)
+                return ai_service.analyze(data_for_ai, prompt, config_dict, current_time_str=time_str)
+    if kind == "email":
+        return alert_service.send_email(subject=step[1], body=step[2], is_html=True)
+    raise ValueError(f"unknown flow step: {kind}")
+
+async def _run_flow_step_async(step):
+    loop = asyncio.get_running_loop()
+    kind = step[0]
+    if kind == "rule":
+        async with async_upstream_slot("akshare"):
+            return await loop.run_in_executor(_indicator_executor, _execute_rule_script, step[1], step[2])
+    if kind == "fetch":
+        context = step[2]
+        # 读 ORM 字段可能触发刷新查询，不放在事件循环线程里
+        specs = await asyncio.to_thread(lambda: [_indicator_spec(ind) for ind in step[1]])
+
+        async def _one(spec):
+            async with async_upstream_slot("akshare"):
+                return await loop.run_in_executor(_indicator_executor, _fetch_indicator_spec, spec, context)
+
+        return list(await asyncio.gather(*[_one(spec) for spec in specs]))
+    if kind == "ai":
+        _, data_for_ai, prompt, config_dict, time_str, debug, label, on_signal = step
+        if (AI_BATCH_ENABLED or on_signal is not None) and not debug:
+            # 批次在线程里攒齐，流式回调里会同步发信，都放到线程里并占用同步的上游名额
+            return await loop.run_in_executor(None, _run_flow_step_sync, step)
+        with ai_deadline(AI_CALL_DEADLINE_SECONDS):
+            async with async_upstream_slot(ai_upstream_name(config_dict)):
+                return await ai_service.analyze_async(data_for_ai, prompt, config_dict, current_time_str=time_str, debug=debug)
+    if kind == "email":
+        return await loop.run_in_executor(None, _run_flow_step_sync, step)
+    raise ValueError(f"unknown flow step: {kind}")
+
+def process_stock(
+    stock_id: int,
+    bypass_checks: bool = False,
+    send_alerts: bool = True,
+    is_test: bool = False,
+    return_result: bool = False,
+    db: Optional[Session] = None,
+    preloaded_stock: Optional[Stock] = None,
+):
+    """
+    同步执行一次监控：逐个完成 _process_stock_flow 产出的 I/O 步骤（规则脚本、指标拉取、AI、邮件）
+    """
+    flow = _process_stock_flow(stock_id, bypass_checks, send_alerts, is_test, return_result, db, preloaded_stock)
+    try:
+        step = next(flow)
+        while True:
+            try:
+                result = _run_flow_step_sync(step)
+            except Exception as e:
+                step = flow.throw(e)
+            else:
+                step = flow.send(result)
+    except StopIteration as stop:
+        return stop.value
+
+def _advance_flow(method, value):
+    """
+    推进生成器一步，返回 (是否结束, 下一步骤或返回值)。
+    StopIteration 不能穿过 Future 传回协程，所以在线程里就地转换
+    """
+    try:
+        return False, method(value)
+    except StopIteration as stop:
+        return True, stop.value
+
+async def process_stock_async(
+    stock_id: int,
+    bypass_checks: bool = False,
+    send_alerts: bool = True,
+    is_test: bool = False,
+    return_result: bool = False,
+    db: Optional[Session] = None,
+    preloaded_stock: Optional[Stock] = None,
+):
+    """
+    process_stock 的 asyncio 版本：生成器里的 DB 与判定逻辑通过 asyncio.to_thread 在线程池中推进
+    （SQLite 查询/提交会阻塞，不能占住事件循环），akshare/规则脚本放进有界线程池，
+    AI 走 AsyncOpenAI，各上游分别受信号量限制
+    """
+    flow = _process_stock_flow(stock_id, bypass_checks, send_alerts, is_test, return_result, db, preloaded_stock)
+    done, step = await asyncio.to_thread(_advance_flow, flow.send, None)
+    while not done:
+        try:
+            result = await _run_flow_step_async(step)
+        except Exception as e:
+            done, step = await asyncio.to_thread(_advance_flow, flow.throw, e)
+        else:
+            done, step = await asyncio.to_thread(_advance_flow, flow.send, result)
+    return step
+
+# 调度模式（默认关闭，需要显式开启）：
+# MONITOR_BATCH_MODE=1 时不再为每只股票注册一个 APScheduler 任务，改为每 MONITOR_TICK_SECONDS 秒
+# 跑一次 monitor_tick，挑出到期的股票交给 MONITOR_WORKERS 个线程执行；
+# MONITOR_ASYNC=1 仅在批量模式下生效，到期股票改为在常驻事件循环中用 process_stock_async 执行。
+# 默认 0：保持每只股票一个 interval 任务的原有行为
+MONITOR_BATCH_MODE = str(os.getenv("MONITOR_BATCH_MODE", "0")).strip() in ("1", "true", "True", "yes", "YES")
+MONITOR_TICK_SECONDS = max(1, int(os.getenv("MONITOR_TICK_SECONDS", "10")))
+MONITOR_WORKERS = max(1, int(os.getenv("MONITOR_WORKERS", "8")))
+MONITOR_TICK_JOB_ID = "monitor_tick"
+MONITOR_ASYNC = str(os.getenv("MONITOR_ASYNC", "0")).strip() in ("1", "true", "True", "yes", "YES")
+
+# 批量模式状态：每只股票上次派发时间（monotonic）与正在执行的股票
+_batch_lock = threading.Lock()
+_batch_last_dispatch = {}
+_batch_running = set()
+_monitor_executor: Optional[ThreadPoolExecutor] = None
+
+_async_loop: Optional[asyncio.AbstractEventLoop] = None
+_async_loop_lock = threading.Lock()
+
+def _get_async_loop() -> asyncio.AbstractEventLoop:
+    """批量 + asyncio 模式下的常驻事件循环（单独线程 run_forever）"""
+    global _async_loop
+    with _async_loop_lock:
+        if _async_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="monitor-asyncio", daemon=True).start()
+            _async_loop = loop
+        return _async_loop
+
+def _get_monitor_executor() -> ThreadPoolExecutor:
+    global _monitor_executor
+    if _monitor_executor is None:
+        _monitor_executor = ThreadPoolExecutor(max_workers=MONITOR_WORKERS, thread_name_prefix="monitor")
+    return _monitor_executor
+
+def _collect_due_stock_ids(rows, now: float) -> list:
+    due = []
+    with _batch_lock:
+        for stock_id, interval in rows:
+            last = _batch_last_dispatch.get(stock_id)
+            if last is None:
+                # 与 interval job 一致：加入后等待一个周期再首次执行
+                _batch_last_dispatch[stock_id] = now
+                continue
+            if stock_id in _batch_running:
+                continue
+            if now - last >= max(1, int(interval or 300)):
+                _batch_last_dispatch[stock_id] = now
+                _batch_running.add(stock_id)
+                due.append(stock_id)
+    return due
+
+def monitor_tick():
+    """
+    批量监控节拍：找出所有到期股票，一次查询载入股票及其指标，派发到固定大小的线程池。
+    全市场数据在 DataFetcher 的缓存/请求合并中跨股票共享。
+    """
+    tick_start = time.time()
+    tick_id = f"tick-{time.time_ns()}"
+    db: Session = SessionLocal()
+    try:
+        rows = db.query(Stock.id, Stock.interval_seconds).filter(Stock.is_monitoring == True).all()
+        due_ids = _collect_due_stock_ids(rows, time.monotonic())
+        if not due_ids:
+            return
+        try:
+            stocks = (
+                db.query(Stock)
+                .options(*_stock_hot_path_options())
+                .filter(Stock.id.in_(due_ids))
+                .all()
+            )
+            db.expunge_all()
+        except Exception:
+            with _batch_lock:
+                _batch_running.difference_update(due_ids)
+            raise
+    finally:
+        db.close()
+
+    load_ms = int((time.time() - tick_start) * 1000)
+    loaded_ids = {s.id for s in stocks}
+    missing = [i for i in due_ids if i not in loaded_ids]
+    if missing:
+        with _batch_lock:
+            _batch_running.difference_update(missing)
+    if not stocks:
+        return
+
+    if any(getattr(s, "only_trade_days", True) for s in stocks):
+        _check_is_trade_day()
+
+    remaining = [len(stocks)]
+    counter_lock = threading.Lock()
+
+    def _finish(stock):
+        with _batch_lock:
+            _batch_running.discard(stock.id)
+        with counter_lock:
+            remaining[0] -= 1
+            done = remaining[0] == 0
+        if done:
+            _emit(
+                "monitor_tick_finish",
+                {
+                    "tick_id": tick_id,
+                    "stocks": len(stocks),
+                    "async": MONITOR_ASYNC,
+                    "duration_ms": int((time.time() - tick_start) * 1000),
+                },
+            )
+
+    def _run(stock):
+        try:
+            process_stock(stock.id, preloaded_stock=stock)
+        finally:
+            _finish(stock)
+
+    async def _run_async(stock):
+        try:
+            await process_stock_async(stock.id, preloaded_stock=stock)
+        finally:
+            _finish(stock)
+
+    _emit(
+        "monitor_tick",
+        {
+            "tick_id": tick_id,
+            "monitoring": len(rows),
+            "due": len(stocks),
+            "workers": MONITOR_WORKERS,
+            "async": MONITOR_ASYNC,
+            "load_ms": load_ms,
+        },
+    )
+    if MONITOR_ASYNC:
+        loop = _get_async_loop()
+        for stock in stocks:
+            asyncio.run_coroutine_threadsafe(_run_async(stock), loop)
+        return
+    executor = _get_monitor_executor()
+    for stock in stocks:
+        executor.submit(_run, stock)
+
 def start_scheduler():
     scheduler.start()
     print("Scheduler started")
+
+    scheduler.add_job(
+        run_log_retention,
+        'interval',
+        minutes=LOG_RETENTION_INTERVAL_MINUTES,
+        id="log_retention",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+        next_run_time=datetime.datetime.now() + datetime.timedelta(minutes=1),
+    )
+
+    if MONITOR_BATCH_MODE:
+        scheduler.add_job(
+            monitor_tick,
+            'interval',
+            seconds=MONITOR_TICK_SECONDS,
+            id=MONITOR_TICK_JOB_ID,
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+            misfire_grace_time=MONITOR_TICK_SECONDS,
+        )
+        print(f"Batch monitoring tick started: every {MONITOR_TICK_SECONDS}s, workers={MONITOR_WORKERS}")
+        return
     
     db: Session = SessionLocal()
     try:
@@ -1220,6 +1676,16 @@ def start_scheduler():
         db.close()
 
 def update_stock_job(stock_id: int, interval: int, is_monitoring: bool):
+    if MONITOR_BATCH_MODE:
+        # 批量模式下由 monitor_tick 统一调度，这里只重置该股票的计时
+        with _batch_lock:
+            if is_monitoring:
+                _batch_last_dispatch[stock_id] = time.monotonic()
+            else:
+                _batch_last_dispatch.pop(stock_id, None)
+        print(f"Batch schedule {'updated' if is_monitoring else 'removed'} for stock {stock_id} (interval {interval}s)")
+        return
+
     job_id = f"stock_{stock_id}"
     
     if scheduler.get_job(job_id):
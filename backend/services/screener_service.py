@@ -12,6 +12,7 @@ from sqlalchemy.orm import Session
 from database import SessionLocal
 from models import StockScreener, ScreenerResult
 from services.monitor_service import scheduler
+from core.script_cache import compile_script
 
 from utils.tushare_client import ts, pro
 
@@ -35,7 +36,7 @@ def execute_screener_script(script_content: str):
     try:
         stdout_buffer = io.StringIO()
         with redirect_stdout(stdout_buffer), redirect_stderr(stdout_buffer):
-            exec(script_content, local_scope, local_scope)
+            exec(compile_script(script_content), local_scope, local_scope)
         stdout_value = stdout_buffer.getvalue()
         if stdout_value:
             log_buffer.append(stdout_value.rstrip("\n"))
@@ -0,0 +1,110 @@
+import json
+import threading
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Log
+
+
+def _extract_signal(ai_analysis: Any) -> Optional[str]:
+    analysis = ai_analysis
+    if isinstance(analysis, str):
+        try:
+            analysis = json.loads(analysis)
+        except Exception:
+            return None
+    if isinstance(analysis, dict):
+        return analysis.get("signal")
+    return None
+
+
+class LastSignalCache:
+    """
+    每只股票最近一条 Log 的原始 signal（未规范化）。
+    启动时用一次分组查询预热，之后在 Log 写入提交时同步更新，信号变化判断不再访问数据库。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._signals: Dict[int, Optional[str]] = {}
+        self._warmed = False
+
+    def warm(self, db: Optional[Session] = None) -> int:
+        owns_db = db is None
+        if db is None:
+            db = SessionLocal()
+        try:
+            latest = (
+                db.query(Log.stock_id, func.max(Log.timestamp).label("ts"))
+                .group_by(Log.stock_id)
+                .subquery()
+            )
+            rows = (
+                db.query(Log.stock_id, Log.id, Log.ai_analysis)
+                .join(latest, (Log.stock_id == latest.c.stock_id) & (Log.timestamp == latest.c.ts))
+                .all()
+            )
+        finally:
+            if owns_db:
+                db.close()
+
+        best: Dict[int, tuple] = {}
+        for stock_id, log_id, ai_analysis in rows:
+            if stock_id is None:
+                continue
+            if stock_id not in best or log_id > best[stock_id][0]:
+                best[stock_id] = (log_id, _extract_signal(ai_analysis))
+        with self._lock:
+            self._signals = {k: v[1] for k, v in best.items()}
+            self._warmed = True
+        return len(best)
+
+    def get(self, stock_id: int, db: Optional[Session] = None) -> Optional[str]:
+        if not self._warmed:
+            self.warm(db)
+        with self._lock:
+            return self._signals.get(stock_id)
+
+    def record(self, stock_id: int, ai_analysis: Any) -> None:
+        if stock_id is None:
+            return
+        with self._lock:
+            self._signals[stock_id] = _extract_signal(ai_analysis)
+
+    def forget(self, stock_id: int) -> None:
+        with self._lock:
+            self._signals.pop(stock_id, None)
+
+    def invalidate(self) -> None:
+        """日志被批量删除后调用：下次读取时重新预热"""
+        with self._lock:
+            self._signals = {}
+            self._warmed = False
+
+
+last_signal_cache = LastSignalCache()
+
+_PENDING_KEY = "last_signal_pending"
+
+
+@event.listens_for(Log, "after_insert")
+def _stage_last_signal(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is None:
+        return
+    session.info.setdefault(_PENDING_KEY, []).append((target.stock_id, target.ai_analysis))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_last_signal(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    for stock_id, ai_analysis in pending or []:
+        last_signal_cache.record(stock_id, ai_analysis)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_last_signal(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,59 @@
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import SystemConfig
+
+# 兜底过期时间：正常情况下由 /settings 写入时主动失效，这里只防止外部直接改库后长期不生效
+SYSTEM_CONFIG_CACHE_TTL_SECONDS = float(os.getenv("SYSTEM_CONFIG_CACHE_TTL_SECONDS", "300"))
+
+
+class SystemConfigCache:
+    """
+    SystemConfig 的进程内缓存：一次查询载入全部 key，监控热路径读配置不再访问 SQLite
+    """
+
+    def __init__(self, ttl_seconds: float = SYSTEM_CONFIG_CACHE_TTL_SECONDS):
+        self.ttl_seconds = float(ttl_seconds)
+        self._lock = threading.Lock()
+        self._values: Optional[Dict[str, Optional[str]]] = None
+        self._loaded_at = 0.0
+        self._generation = 0
+
+    def _load(self, db: Optional[Session]) -> Dict[str, Optional[str]]:
+        owns_db = db is None
+        if db is None:
+            db = SessionLocal()
+        try:
+            rows = db.query(SystemConfig.key, SystemConfig.value).all()
+            return {k: v for k, v in rows}
+        finally:
+            if owns_db:
+                db.close()
+
+    def get(self, key: str, db: Optional[Session] = None) -> Optional[str]:
+        with self._lock:
+            values = self._values
+            fresh = values is not None and (time.monotonic() - self._loaded_at) < self.ttl_seconds
+            generation = self._generation
+        if not fresh:
+            values = self._load(db)
+            with self._lock:
+                # 载入期间发生过失效则不回填，避免把旧值写回缓存
+                if generation == self._generation:
+                    self._values = values
+                    self._loaded_at = time.monotonic()
+        return values.get(key)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._values = None
+            self._loaded_at = 0.0
+
+
+system_config_cache = SystemConfigCache()
@@ -0,0 +1,47 @@
+import os
+import sys
+import types
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# 测试只用内存库：在导入 models 之前替换 database 模块，绝不连接/新建 backend/stock_watch.db
+if "database" not in sys.modules:
+    _engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    _database = types.ModuleType("database")
+    _database.engine = _engine
+    _database.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=_engine)
+    _database.Base = declarative_base()
+
+    def _get_db():
+        db = _database.SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    _database.get_db = _get_db
+    sys.modules["database"] = _database
+
+
+@pytest.fixture()
+def db():
+    """内存库上建表的 Session，用完删表"""
+    import database
+    import models  # noqa: F401  注册全部表
+
+    database.Base.metadata.create_all(bind=database.engine)
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        database.Base.metadata.drop_all(bind=database.engine)
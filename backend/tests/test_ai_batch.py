@@ -0,0 +1,104 @@
+import json
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from core.ai_retry import ai_deadline
+from services import ai_batcher as ai_batcher_module
+from services import ai_service as ai_service_module
+from services.ai_batcher import AIAnalysisBatcher
+from services.ai_service import AIService
+
+AI_CONFIG = {"api_key": "k", "base_url": "http://batch.test/v1", "model_name": "m", "temperature": 0.1}
+_STOCK_RE = re.compile(r"=== STOCK (\S+) ===")
+
+
+class _FakeOpenAI:
+    """按请求内容造返回：批量请求里股票数 >= fail_at 时返回无法解析的文本"""
+
+    calls = []
+    fail_at = None
+
+    def __init__(self, **kwargs):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def with_options(self, **kwargs):
+        return self
+
+    def _create(self, model, messages, **kwargs):
+        user = messages[-1]["content"]
+        keys = _STOCK_RE.findall(user)
+        type(self).calls.append(len(keys) or 1)
+        if not keys:
+            content = json.dumps({"type": "info", "signal": "WAIT", "message": "single"})
+        elif self.fail_at is not None and len(keys) >= self.fail_at:
+            content = "not json"
+        else:
+            content = json.dumps([{"stock_key": k, "type": "info", "signal": "BUY", "message": "batch"} for k in keys])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture()
+def fake_openai(monkeypatch):
+    _FakeOpenAI.calls = []
+    _FakeOpenAI.fail_at = None
+    monkeypatch.setattr(ai_service_module, "OpenAI", _FakeOpenAI)
+    return _FakeOpenAI
+
+
+def _items(n):
+    return [{"key": f"S{i}", "data_context": f"data {i}", "prompt_template": "p"} for i in range(n)]
+
+
+def test_batch_results_are_not_written_to_single_stock_cache(fake_openai):
+    service = AIService()
+    results = service.analyze_batch(_items(2), AI_CONFIG, current_time_str="2026-01-05 10:00:00")
+    assert {k: r[0]["message"] for k, r in results.items()} == {"S0": "batch", "S1": "batch"}
+    assert fake_openai.calls == [2]
+
+    # 同样输入的单股分析必须真实请求，而不是拿到批量指令下的结果
+    single, _ = service.analyze("data 0", "p", AI_CONFIG, current_time_str="2026-01-05 10:00:00")
+    assert single["message"] == "single"
+    assert fake_openai.calls == [2, 1]
+
+
+def test_unparseable_batch_is_split_until_every_stock_has_a_result(fake_openai):
+    fake_openai.fail_at = 3
+    service = AIService()
+    results = service.analyze_batch(_items(5), AI_CONFIG, current_time_str="2026-01-05 10:00:00")
+    assert sorted(results) == [f"S{i}" for i in range(5)]
+    # 5 只解析失败 -> 2 + 3；3 只仍失败 -> 1（退回单股 analyze）+ 2
+    assert fake_openai.calls == [5, 2, 3, 1, 2]
+    assert [results[f"S{i}"][0]["message"] for i in range(5)] == ["batch", "batch", "single", "batch", "batch"]
+
+
+def test_batcher_wait_is_capped_by_caller_deadline(monkeypatch):
+    def slow_batch(items, ai_config, current_time_str=None):
+        time.sleep(0.6)
+        return {i["key"]: ({"type": "info", "signal": "BUY"}, "{}") for i in items}
+
+    monkeypatch.setattr(ai_batcher_module.ai_service, "analyze_batch", slow_batch)
+    batcher = AIAnalysisBatcher(max_stocks=8, window_ms=50)
+    out = {}
+
+    def run(name, seconds):
+        with ai_deadline(seconds):
+            out[name] = (batcher.analyze("d", "p", AI_CONFIG, label=name), time.monotonic())
+
+    start = time.monotonic()
+    leader = threading.Thread(target=run, args=("A", 5.0))
+    follower = threading.Thread(target=run, args=("B", 0.2))
+    leader.start()
+    time.sleep(0.01)
+    follower.start()
+    follower.join()
+    leader.join()
+
+    (b_result, _), b_done = out["B"]
+    assert b_result["type"] == "error"
+    assert b_done - start < 0.5
+    assert out["A"][0][0]["signal"] == "BUY"
+    assert batcher.stats()["timeouts"] == 1
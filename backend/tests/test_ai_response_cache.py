@@ -0,0 +1,71 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from services import ai_service as ai_service_module
+from services.ai_service import AIService
+
+AI_CONFIG = {"api_key": "k", "base_url": "http://cache.test/v1", "model_name": "m", "temperature": 0.1}
+
+
+class _FakeOpenAI:
+    calls = 0
+    content = json.dumps({"type": "info", "signal": "BUY", "message": "ok"})
+
+    def __init__(self, **kwargs):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def with_options(self, **kwargs):
+        return self
+
+    def _create(self, **kwargs):
+        type(self).calls += 1
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=type(self).content))])
+
+
+@pytest.fixture()
+def fake_openai(monkeypatch):
+    _FakeOpenAI.calls = 0
+    _FakeOpenAI.content = json.dumps({"type": "info", "signal": "BUY", "message": "ok"})
+    monkeypatch.setattr(ai_service_module, "OpenAI", _FakeOpenAI)
+    return _FakeOpenAI
+
+
+def test_same_data_hits_cache_regardless_of_current_time(fake_openai):
+    service = AIService()
+    first, _ = service.analyze("close=10", "p", AI_CONFIG, current_time_str="2026-01-05 10:00:00")
+    first["message"] = "mutated by caller"
+    second, content = service.analyze("close=10", "p", AI_CONFIG, current_time_str="2026-01-05 10:05:00")
+    assert fake_openai.calls == 1
+    assert second["message"] == "ok"
+    assert json.loads(content)["signal"] == "BUY"
+
+    service.analyze("close=11", "p", AI_CONFIG, current_time_str="2026-01-05 10:05:00")
+    service.analyze("close=10", "p", {**AI_CONFIG, "model_name": "m2"}, current_time_str="2026-01-05 10:05:00")
+    assert fake_openai.calls == 3
+
+
+def test_parse_errors_are_not_cached(fake_openai):
+    service = AIService()
+    fake_openai.content = "not json"
+    result, _ = service.analyze("close=10", "p", AI_CONFIG)
+    assert result["type"] == "error"
+    service.analyze("close=10", "p", AI_CONFIG)
+    assert fake_openai.calls == 2
+
+
+def test_debug_always_calls_provider(fake_openai):
+    service = AIService()
+    service.analyze("close=10", "p", AI_CONFIG)
+    service.analyze_debug("close=10", "p", AI_CONFIG)
+    service.analyze_debug("close=10", "p", AI_CONFIG)
+    assert fake_openai.calls == 3
+
+
+def test_cache_disabled_by_zero_ttl(fake_openai, monkeypatch):
+    monkeypatch.setattr(ai_service_module, "AI_RESPONSE_CACHE_TTL_SECONDS", 0)
+    service = AIService()
+    service.analyze("close=10", "p", AI_CONFIG)
+    service.analyze("close=10", "p", AI_CONFIG)
+    assert fake_openai.calls == 2
@@ -0,0 +1,34 @@
+import time
+
+import pytest
+
+from core.ai_retry import AIDeadlineExceededError, RetryableAIService, ai_deadline, ai_retry
+
+
+def test_retry_backoff_stops_before_deadline():
+    calls = []
+
+    @ai_retry(max_attempts=5, min_wait=1.0, max_wait=10.0)
+    def flaky():
+        calls.append(time.monotonic())
+        raise ConnectionError("connection reset")
+
+    start = time.monotonic()
+    with ai_deadline(1.5):
+        with pytest.raises(ConnectionError):
+            flaky()
+    # 第一次退避 1s 仍在截止时间内；第二次退避 2s 会越过截止时间，直接停止
+    assert len(calls) == 2
+    assert time.monotonic() - start < 1.5
+
+
+def test_call_with_timeout_maps_expired_deadline():
+    service = RetryableAIService("test")
+
+    def slow():
+        time.sleep(0.2)
+        raise ConnectionError("timeout while reading")
+
+    with pytest.raises(AIDeadlineExceededError):
+        service.call_with_timeout(slow, 0.1)
+    assert service.call_with_timeout(lambda: "ok", 1.0) == "ok"
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import bar_store
+from utils.bar_store import DailyBarStore
+
+
+@pytest.fixture()
+def feed(monkeypatch):
+    """{code: [(date, close)]}；update 时按请求的根数从尾部返回"""
+    data = {}
+
+    def fake_get_bars_many(symbols, category=9, count=800, workers=None, errors=None):
+        rows = [
+            {"market": m, "code": c, "datetime": pd.Timestamp(d), "open": v, "high": v, "low": v,
+             "close": v, "vol": 1.0, "amount": v * 100}
+            for m, c in symbols
+            for d, v in data.get(c, [])[-count:]
+        ]
+        return pd.DataFrame(rows)
+
+    monkeypatch.setattr(bar_store, "get_bars_many", fake_get_bars_many)
+    return data
+
+
+def test_daily_update_appends_and_refreshes_last_bar(tmp_path, feed):
+    store = DailyBarStore(0, "day", root=str(tmp_path))
+    feed["000001"] = [("2026-10-14", 1.0), ("2026-10-15", 2.0)]
+    assert store.update(["000001"])["new_rows"] == 2
+
+    # 最后一根盘中入库后收盘价变了，同时来了新的一天
+    feed["000001"] = [("2026-10-14", 1.0), ("2026-10-15", 2.5), ("2026-10-16", 3.0)]
+    stats = store.update(["000001"])
+    assert (stats["new_rows"], stats["refreshed_rows"]) == (1, 1)
+    assert store.get("000001")["close"].tolist() == [1.0, 2.5, 3.0]
+
+    reopened = DailyBarStore(0, "day", root=str(tmp_path))
+    assert reopened.get("000001")["close"].tolist() == [1.0, 2.5, 3.0]
+    assert reopened.last_dates() == {"000001": 20261016}
+
+
+@pytest.mark.parametrize(
+    "period,first,moved",
+    [
+        ("week", [("2026-10-02", 1.0), ("2026-10-13", 2.0)], ("2026-10-15", 3.0)),
+        ("month", [("2026-09-30", 1.0), ("2026-10-13", 2.0)], ("2026-10-16", 3.0)),
+    ],
+)
+def test_last_week_or_month_bar_is_replaced_when_its_date_moves(tmp_path, feed, period, first, moved):
+    store = DailyBarStore(0, period, root=str(tmp_path))
+    feed["000001"] = list(first)
+    store.update(["000001"])
+
+    # 同一周/月的 K 线日期随周期推进而变化：旧那行被替换，不留下一根过期的周期 K 线
+    feed["000001"] = [first[0], moved]
+    stats = store.update(["000001"])
+    assert stats["refreshed_rows"] == 1
+    got = store.get("000001")
+    assert got["close"].tolist() == [1.0, 3.0]
+    assert got["date"].dt.strftime("%Y-%m-%d").tolist() == [first[0][0], moved[0]]
+    assert np.asarray(store.dates).tolist() == [int(first[0][0].replace("-", "")), int(moved[0].replace("-", ""))]
+
+
+def test_load_panel_aligns_markets_and_marks_suspension(tmp_path, feed, monkeypatch):
+    monkeypatch.setattr(bar_store, "BAR_STORE_DIR", str(tmp_path))
+    monkeypatch.setattr(bar_store, "_stores", {})
+    feed["000001"] = [("2026-10-12", 1.0), ("2026-10-14", 3.0)]
+    feed["600000"] = [("2026-10-12", 10.0), ("2026-10-13", 11.0), ("2026-10-14", 12.0)]
+    bar_store.get_bar_store(0).update(["000001"])
+    bar_store.get_bar_store(1).update(["600000"])
+
+    panel = bar_store.load_panel(markets=(0, 1))
+    assert panel.shape == (3, 2)
+    assert panel.codes == ["000001", "600000"]
+    assert panel.markets.tolist() == [0, 1]
+    col = panel.column("000001")
+    assert np.isnan(panel["close"][1, col])
+    assert panel.suspended[:, col].tolist() == [False, True, False]
+    assert bar_store.ffill_panel(panel["close"])[:, col].tolist() == [1.0, 1.0, 3.0]
+
+    window = bar_store.load_panel(markets=(0, 1), start_date="2026-10-13")
+    assert window.dates.tolist() == [20261013, 20261014]
+    # 截取时间窗后仍按全历史判断上市区间
+    assert window.suspended[:, window.column("000001")].tolist() == [True, False]
@@ -0,0 +1,51 @@
+import datetime
+
+from utils import pytdx_client
+from utils.pytdx_client import get_bars_many
+
+
+class _FakePool:
+    size = 4
+
+    def __init__(self, history):
+        self.history = history
+        self.requests = []
+
+    def call(self, method, category, market, code, start, count):
+        self.requests.append((code, start, count))
+        bars = self.history.get(code, [])
+        end = len(bars) - start
+        return bars[max(0, end - count):max(0, end)]
+
+
+def _bars(n):
+    base = datetime.datetime(2020, 1, 1)
+    out = []
+    for i in range(n):
+        dt = base + datetime.timedelta(days=i)
+        out.append({"datetime": dt.strftime("%Y-%m-%d 15:00"), "year": dt.year, "open": 1.0 + i,
+                    "close": 2.0 + i, "high": 3.0, "low": 0.5, "vol": 10.0, "amount": 100.0})
+    return out
+
+
+def test_pages_past_800_and_returns_long_frame(monkeypatch):
+    monkeypatch.setattr(pytdx_client, "BARS_PAGE_SIZE", 800)
+    pool = _FakePool({"000001": _bars(1000), "600000": _bars(5)})
+    errors = {}
+    df = get_bars_many([(0, "1"), (1, "600000"), (0, "000001"), (0, "000002")], count=900, pool=pool, errors=errors)
+
+    assert list(df.columns[:3]) == ["market", "code", "datetime"]
+    assert (df[df["code"] == "000001"]["datetime"].is_monotonic_increasing)
+    assert len(df[df["code"] == "000001"]) == 900
+    assert len(df[df["code"] == "600000"]) == 5
+    assert "year" not in df.columns
+    # 重复的股票只请求一次；超过单页上限时分两页
+    assert [r for r in pool.requests if r[0] == "000001"] == [("000001", 0, 800), ("000001", 800, 100)]
+    assert errors == {(0, "000002"): "bars_empty"}
+
+
+def test_as_dict_keeps_input_order():
+    pool = _FakePool({"000002": _bars(3), "000001": _bars(2)})
+    out = get_bars_many([(0, "000002"), (0, "000001")], count=10, as_dict=True, pool=pool)
+    assert list(out) == [(0, "000002"), (0, "000001")]
+    assert out[(0, "000001")]["close"].tolist() == [2.0, 3.0]
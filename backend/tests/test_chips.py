@@ -0,0 +1,172 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import chips
+
+
+def _daily_bars(n, seed=0, start="2025-01-02"):
+    rng = np.random.default_rng(seed)
+    close = 10 + np.cumsum(rng.normal(0, 0.1, n))
+    vol = 1e4 + rng.random(n) * 5e3
+    return pd.DataFrame(
+        {
+            "date": pd.bdate_range(start, periods=n),
+            "close": close,
+            "vol": vol,
+            # pytdx 的 vol 单位是手：成交额约等于 close * vol * 100
+            "amount": close * vol * 100 * (1 + rng.normal(0, 0.002, n)),
+        }
+    )
+
+
+def test_fold_replace_last_matches_full_recompute():
+    p = chips.ChipProxyParams()
+    df = _daily_bars(120)
+    partial = df.copy()
+    partial.loc[len(df) - 1, ["vol", "amount"]] *= 0.3
+
+    state, _ = chips.init_chip_proxy_state("000001", partial.iloc[:-1], p)
+    last_day = df["date"].iloc[-1].strftime("%Y-%m-%d")
+    bar = partial.iloc[-1]
+    chips.fold_chip_proxy_bar(state, last_day, bar["close"], bar["amount"], bar["vol"])
+    # 盘中折叠过的最后一根收盘后数据变了：替换而不是追加
+    bar = df.iloc[-1]
+    row = chips.fold_chip_proxy_bar(state, last_day, bar["close"], bar["amount"], bar["vol"], replace_last=True)
+
+    _, full = chips.init_chip_proxy_state("000001", df, p)
+    for key in ("proxy_avg_cost", "proxy_90_concentration", "proxy_70_concentration",
+                "proxy_90_concentration_smooth", "proxy_70_concentration_smooth"):
+        assert row[key] == pytest.approx(full[key].iloc[-1], rel=1e-12)
+    assert len(state.vwap) == p.window
+    assert len(state.proxy_90) == p.smooth
+
+
+def _fake_bars_many(df, counts):
+    def fake(symbols, category=9, count=800, as_dict=False, workers=None, errors=None):
+        counts.append(count)
+        out = df.tail(count).rename(columns={"date": "datetime"}).reset_index(drop=True)
+        return {(m, c): out.copy() for m, c in symbols}
+    return fake
+
+
+def test_update_refolds_last_date_bar(tmp_path, monkeypatch):
+    monkeypatch.setattr(chips, "CHIP_PROXY_STATE_DIR", str(tmp_path))
+    p = chips.ChipProxyParams()
+    df = _daily_bars(120, start=(datetime.date.today() - datetime.timedelta(days=200)).isoformat())
+    df = df[df["date"] <= pd.Timestamp(datetime.date.today())].reset_index(drop=True)
+    state, _ = chips.init_chip_proxy_state("000001", df, p)
+    chips.save_chip_proxy_state(state)
+
+    counts = []
+    monkeypatch.setattr(chips, "get_bars_many", _fake_bars_many(df, counts))
+    rows = chips.update_chip_proxy_states(["000001"], params=p)["000001"]
+    # 只有 last_date 这一根被重新折叠，结果与原值一致
+    assert [r["date"] for r in rows] == [state.last_date]
+    assert rows[0]["proxy_90_concentration"] == pytest.approx(state.proxy_90[-1], rel=1e-12)
+
+
+def test_update_reinitialises_state_older_than_incremental_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(chips, "CHIP_PROXY_STATE_DIR", str(tmp_path))
+    p = chips.ChipProxyParams()
+    stale_day = datetime.date.today() - datetime.timedelta(days=chips.CHIP_PROXY_MAX_INCREMENTAL_BARS + 30)
+    stale = chips.ChipProxyState(code="000001", window=p.window, smooth=p.smooth, last_date=stale_day.isoformat(),
+                                 vwap=[1.0] * p.window, shares=[1.0] * p.window,
+                                 proxy_90=[0.5] * p.smooth, proxy_70=[0.5] * p.smooth)
+    chips.save_chip_proxy_state(stale)
+
+    df = _daily_bars(400, start=(datetime.date.today() - datetime.timedelta(days=600)).isoformat())
+    counts = []
+    monkeypatch.setattr(chips, "get_bars_many", _fake_bars_many(df, counts))
+    rows = chips.update_chip_proxy_states(["000001"], params=p, history_days=365)["000001"]
+
+    assert counts == [365]
+    assert len(rows) == 365
+    reloaded = chips.load_chip_proxy_state("000001", p)
+    assert reloaded.last_date == df["date"].iloc[-1].strftime("%Y-%m-%d")
+    assert reloaded.vwap != [1.0] * p.window
+
+
+def _scalar_vwap_and_shares(amount, volume_raw, close_price):
+    # 原逐行实现，作为向量化版本的对照
+    vol = float(volume_raw)
+    if not np.isfinite(vol) or vol <= 0:
+        return None, 0.0
+    amt = float(amount)
+    if not np.isfinite(amt) or amt <= 0:
+        return None, vol
+    raw_vwap = amt / vol
+    cp = float(close_price) if np.isfinite(close_price) else None
+    if cp is not None and cp > 0:
+        ratio = raw_vwap / cp
+        if 80.0 < ratio < 120.0:
+            return raw_vwap / 100.0, vol * 100.0
+        if 0.8 < ratio < 1.2:
+            return raw_vwap, vol
+    if cp is not None and cp > 0 and raw_vwap > cp * 50:
+        return raw_vwap / 100.0, vol * 100.0
+    return raw_vwap, vol
+
+
+def _scalar_weighted_quantile(values, weights, q):
+    order = np.argsort(values)
+    v = values[order]
+    w = np.where(np.isfinite(weights[order]) & (weights[order] > 0), weights[order], 0.0)
+    cum = np.cumsum(w) / float(np.sum(w))
+    idx = min(max(int(np.searchsorted(cum, q, side="left")), 0), len(v) - 1)
+    return float(v[idx])
+
+
+def _scalar_proxy(close, amount, vol, window, smooth):
+    pairs = [_scalar_vwap_and_shares(a, v, c) for a, v, c in zip(amount, vol, close)]
+    vwap = np.array([np.nan if x is None else x for x, _ in pairs], dtype=float)
+    shares = np.array([w for _, w in pairs], dtype=float)
+    avg, p90, p70 = [], [], []
+    for i in range(len(close)):
+        j0 = max(0, i - window + 1)
+        vals, wts = vwap[j0:i + 1], shares[j0:i + 1]
+        mask = np.isfinite(vals) & np.isfinite(wts) & (wts > 0)
+        vals, wts = vals[mask], wts[mask]
+        if len(vals) < max(10, window // 3):
+            avg.append(np.nan), p90.append(np.nan), p70.append(np.nan)
+            continue
+        m = float(np.sum(vals * wts) / np.sum(wts))
+        q = {x: _scalar_weighted_quantile(vals, wts, x) for x in (0.05, 0.15, 0.85, 0.95)}
+        avg.append(m)
+        p90.append((q[0.95] - q[0.05]) / m)
+        p70.append((q[0.85] - q[0.15]) / m)
+    s90 = pd.Series(p90).rolling(smooth, min_periods=1).mean().to_numpy()
+    s70 = pd.Series(p70).rolling(smooth, min_periods=1).mean().to_numpy()
+    return {
+        "proxy_avg_cost": np.array(avg),
+        "proxy_90_concentration": np.array(p90),
+        "proxy_70_concentration": np.array(p70),
+        "proxy_90_concentration_smooth": s90,
+        "proxy_70_concentration_smooth": s70,
+    }
+
+
+def _panel_inputs(n_days, n_stocks, seed=1):
+    cols = [_daily_bars(n_days, seed=seed + k) for k in range(n_stocks)]
+    close = np.column_stack([c["close"].to_numpy() for c in cols])
+    vol = np.column_stack([c["vol"].to_numpy() for c in cols])
+    amount = np.column_stack([c["amount"].to_numpy() for c in cols])
+    # 停牌、零成交额、成交额与成交量同单位（比值约 1）的情况都要覆盖
+    vol[5:8, 0] = 0.0
+    amount[20, 1] = np.nan
+    amount[:, 2] = close[:, 2] * vol[:, 2]
+    return close, amount, vol
+
+
+def test_vectorised_proxy_matches_scalar_reference():
+    window, smooth = 20, 5
+    close, amount, vol = _panel_inputs(90, 3)
+    panel = chips.calc_proxy_concentration_arrays(close, amount, vol, window=window, smooth=smooth)
+    for k in range(close.shape[1]):
+        expected = _scalar_proxy(close[:, k], amount[:, k], vol[:, k], window, smooth)
+        single = chips.calc_proxy_concentration_arrays(close[:, k], amount[:, k], vol[:, k], window=window, smooth=smooth)
+        for key, ref in expected.items():
+            np.testing.assert_allclose(panel[key][:, k], ref, rtol=1e-9, equal_nan=True)
+            np.testing.assert_allclose(single[key], ref, rtol=1e-9, equal_nan=True)
@@ -0,0 +1,48 @@
+from sqlalchemy import text
+
+import models
+from core.compressed_text import compress_text, decompress_text
+
+
+def test_compress_round_trip_and_short_values_stay_plain():
+    payload = "指标数据 " * 400
+    packed = compress_text(payload, codec="zlib")
+    assert isinstance(packed, bytes) and len(packed) < len(payload.encode("utf-8"))
+    assert decompress_text(packed) == payload
+    assert compress_text("short", codec="zlib") == "short"
+    assert compress_text(payload, codec="none") == payload
+
+
+def test_log_blobs_stored_compressed_and_legacy_plaintext_still_reads(db):
+    stock = models.Stock(symbol="600000", name="浦发银行")
+    db.add(stock)
+    db.commit()
+    big = '{"close": [' + ", ".join(str(i) for i in range(2000)) + "]}"
+    log = models.Log(stock_id=stock.id, raw_data=big, ai_response="ok", ai_analysis={"signal": "BUY"})
+    db.add(log)
+    db.commit()
+    # 旧库里的明文行，不经 TypeDecorator 直接写入
+    db.execute(text("INSERT INTO logs (stock_id, raw_data, ai_response) VALUES (:s, :r, :a)"), {"s": stock.id, "r": "legacy raw", "a": "legacy resp"})
+    db.commit()
+
+    stored = db.execute(text("SELECT raw_data, ai_response FROM logs WHERE id = :id"), {"id": log.id}).one()
+    assert isinstance(stored[0], bytes) and len(stored[0]) < len(big)
+    assert stored[1] == "ok"
+
+    db.expunge_all()
+    rows = db.query(models.Log).order_by(models.Log.id).all()
+    assert rows[0].raw_data == big
+    assert rows[1].raw_data == "legacy raw" and rows[1].ai_response == "legacy resp"
+
+
+def test_log_blobs_are_deferred(db):
+    stock = models.Stock(symbol="600000", name="浦发银行")
+    db.add(stock)
+    db.commit()
+    db.add(models.Log(stock_id=stock.id, raw_data="x" * 5000, ai_analysis={"signal": "HOLD"}))
+    db.commit()
+    db.expunge_all()
+
+    row = db.query(models.Log).one()
+    assert "raw_data" not in row.__dict__ and "ai_response" not in row.__dict__
+    assert row.raw_data == "x" * 5000
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from services import context_builder
+from services.context_builder import build_ai_context, compact_indicator_data, count_tokens
+
+
+@pytest.fixture(autouse=True)
+def _estimate_tokens(monkeypatch):
+    # 用内置估算计数，结果不依赖是否安装 tiktoken
+    monkeypatch.setattr(context_builder, "_get_encoder", lambda model: None)
+    monkeypatch.setattr(context_builder, "AI_CONTEXT_MIN_INDICATOR_TOKENS", 100)
+
+
+def _text(n_tokens):
+    return "\n".join("abcdefghijklmnop" for _ in range(n_tokens // 4))
+
+
+def test_everything_fits_keeps_all_in_order():
+    items = [{"name": "a", "data": "x" * 40, "priority": 0}, {"name": "b", "data": "y" * 40, "priority": 5}]
+    text, stats = build_ai_context(items, 1000)
+    assert text.index("--- Indicator: a ---") < text.index("--- Indicator: b ---")
+    assert stats["dropped"] == [] and stats["truncated"] == []
+    assert stats["tokens"] <= 1000
+
+
+def test_drops_lowest_priority_first_within_budget():
+    items = [
+        {"name": "kline", "data": _text(400), "priority": 10},
+        {"name": "news", "data": _text(400), "priority": 0},
+        {"name": "fund_flow", "data": _text(400), "priority": 5},
+        {"name": "board", "data": _text(400), "priority": 0},
+    ]
+    text, stats = build_ai_context(items, 320)
+
+    # 同优先级时靠后的先丢
+    assert stats["dropped"] == ["board", "news"]
+    assert "--- Indicator: news ---" not in text and "--- Indicator: board ---" not in text
+    assert text.index("--- Indicator: kline ---") < text.index("--- Indicator: fund_flow ---")
+    assert set(stats["truncated"]) == {"kline", "fund_flow"}
+    assert stats["tokens"] <= 320
+    assert count_tokens(text) <= 320 + 4
+
+
+def test_small_indicators_kept_whole_while_large_ones_are_cut():
+    rows = [{"date": f"2026-{m:02d}-{d:02d}", "close": 10 + d / 3} for m in (1, 2) for d in range(1, 29)]
+    items = [
+        {"name": "quote", "data": "price=10.5", "priority": 0},
+        {"name": "kline", "data": json.dumps(rows), "priority": 1},
+    ]
+    text, stats = build_ai_context(items, 160)
+    assert stats["dropped"] == []
+    assert stats["truncated"] == ["kline"]
+    assert "price=10.5" in text
+    kline = text.split("--- Indicator: kline ---\n", 1)[1]
+    # 表格保留表头与最近的行
+    assert kline.startswith("date,close\n...(earlier rows omitted)")
+    assert "2026-02-28" in kline and "2026-01-01" not in kline
+    assert stats["tokens"] <= 160
+
+
+def test_compact_records_to_csv_with_rounding():
+    body, is_table = compact_indicator_data(json.dumps([{"a": 1.234567, "b": None}, {"a": 2.0, "c": {"x": 1}}]))
+    assert is_table
+    assert body == 'a,b,c\n1.2346,,\n2,,"{""x"":1}"'
+    assert compact_indicator_data("plain text") == ("plain text", False)
+    assert compact_indicator_data('{"v": 0.123456}') == ('{"v":0.1235}', False)
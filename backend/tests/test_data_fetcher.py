@@ -0,0 +1,57 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from services import data_fetcher as data_fetcher_module
+from services.data_fetcher import DataFetcher
+
+
+@pytest.fixture()
+def fake_ak(monkeypatch):
+    calls = []
+
+    def stock_zh_a_spot_em():
+        calls.append("spot")
+        time.sleep(0.05)
+        return pd.DataFrame({"代码": ["600000", "000001"], "最新价": [10.0, 12.0]})
+
+    monkeypatch.setattr(data_fetcher_module.ak, "stock_zh_a_spot_em", stock_zh_a_spot_em, raising=False)
+    return calls
+
+
+def test_script_ak_calls_share_cached_table_and_get_copies(fake_ak):
+    fetcher = DataFetcher()
+    script = (
+        "spot = ak.stock_zh_a_spot_em()\n"
+        "spot['最新价'] = 0\n"
+        "df = spot[spot['代码'] == context['symbol']]\n"
+    )
+    first = fetcher.execute_script(script, {"symbol": "600000"}, cache_ttl=60)
+    second = fetcher.execute_script(script, {"symbol": "000001"}, cache_ttl=60)
+    assert fake_ak == ["spot"]
+    assert '"600000"' in first and '"000001"' in second
+    # 脚本改动的是副本，缓存里的原表不受影响
+    assert fetcher.call_akshare("stock_zh_a_spot_em", _ttl=60)["最新价"].tolist() == [10.0, 12.0]
+
+    fetcher.execute_script(script, {"symbol": "600000"}, cache_ttl=0)
+    assert fake_ak == ["spot", "spot"]
+
+
+def test_concurrent_cache_misses_download_once(fake_ak):
+    fetcher = DataFetcher()
+    barrier = threading.Barrier(6)
+    frames = []
+
+    def worker():
+        barrier.wait()
+        frames.append(fetcher.call_akshare("stock_zh_a_spot_em", _ttl=60))
+
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert fake_ak == ["spot"]
+    assert len({id(f) for f in frames}) == 6
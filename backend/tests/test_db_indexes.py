@@ -0,0 +1,35 @@
+from sqlalchemy import inspect, text
+
+import database
+import models  # noqa: F401
+
+
+def _index_names(table):
+    return {ix["name"] for ix in inspect(database.engine).get_indexes(table)}
+
+
+def test_optimize_db_schema_backfills_indexes_on_legacy_tables():
+    import main
+
+    with database.engine.begin() as conn:
+        conn.execute(text("CREATE TABLE logs (id INTEGER PRIMARY KEY, stock_id INTEGER, timestamp DATETIME)"))
+        conn.execute(text("CREATE TABLE screener_results (id INTEGER PRIMARY KEY, screener_id INTEGER, run_at DATETIME)"))
+    try:
+        main.optimize_db_schema()
+        assert {"ix_logs_stock_id_timestamp", "ix_logs_timestamp"} <= _index_names("logs")
+        assert "ix_screener_results_screener_id_run_at" in _index_names("screener_results")
+        # 表不存在时跳过，不报错；重复执行幂等
+        main.optimize_db_schema()
+    finally:
+        with database.engine.begin() as conn:
+            conn.execute(text("DROP TABLE logs"))
+            conn.execute(text("DROP TABLE screener_results"))
+
+
+def test_latest_logs_per_stock_query_uses_composite_index(db):
+    plan = db.execute(text(
+        "EXPLAIN QUERY PLAN SELECT id FROM logs WHERE stock_id = 1 ORDER BY timestamp DESC LIMIT 20"
+    )).fetchall()
+    detail = " ".join(str(row[-1]) for row in plan)
+    assert "ix_logs_stock_id_timestamp" in detail
+    assert "TEMP B-TREE" not in detail
@@ -0,0 +1,64 @@
+import threading
+
+import models
+from services import monitor_service
+
+
+def _make_stock(db):
+    cfg = models.AIConfig(name="test", provider="openai", base_url="http://ai.local/v1", api_key="k", model_name="m")
+    db.add(cfg)
+    db.commit()
+    stock = models.Stock(symbol="600000", name="浦发银行", is_monitoring=True, monitoring_mode="ai_only", ai_provider_id=cfg.id)
+    db.add(stock)
+    db.commit()
+    return stock
+
+
+def test_early_alert_sent_once_off_stream_thread(db, monkeypatch):
+    stock = _make_stock(db)
+    sent = []
+    email_steps = []
+
+    def fake_send_email(subject, body, is_html=False):
+        sent.append((subject, threading.current_thread().name))
+        return {"ok": True, "mocked": True, "receiver_email": None, "error": None}
+
+    final = {
+        "type": "warning",
+        "signal": "STRONG_BUY",
+        "action_advice": "买入",
+        "suggested_position": "3成",
+        "duration": "短线",
+        "stop_loss_price": "9.5",
+        "message": "放量突破",
+    }
+
+    def fake_step(step):
+        kind = step[0]
+        if kind == "fetch":
+            return []
+        if kind == "ai":
+            on_signal = step[7]
+            assert on_signal is not None
+            # 流式解析可能不止一次给出信号，只应提前发一封
+            on_signal(dict(final))
+            on_signal(dict(final))
+            # 回调只提交发信任务，不在读流线程里同步发送
+            assert all(name != threading.current_thread().name for _, name in sent)
+            return dict(final), "{}"
+        if kind == "email":
+            email_steps.append(step)
+            return {"ok": True}
+        raise AssertionError(kind)
+
+    monkeypatch.setattr(monitor_service, "AI_STREAM_ENABLED", True)
+    monkeypatch.setattr(monitor_service, "AI_BATCH_ENABLED", False)
+    monkeypatch.setattr(monitor_service.alert_service, "send_email", fake_send_email)
+    monkeypatch.setattr(monitor_service, "_run_flow_step_sync", fake_step)
+    monkeypatch.setattr(monitor_service, "write_log", lambda db_, entry, sync=False: None)
+
+    monitor_service.process_stock(stock.id, bypass_checks=True, db=db)
+
+    assert len(sent) == 1
+    assert sent[0][1].startswith("early-alert")
+    assert email_steps == []
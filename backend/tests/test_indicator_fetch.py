@@ -0,0 +1,39 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from services import monitor_service
+
+
+def _indicator(name, delay):
+    return SimpleNamespace(
+        name=name, akshare_api=str(delay), params_json="{}", post_process_json=None,
+        python_code=None, cache_ttl_seconds=None,
+    )
+
+
+def test_fetch_indicators_runs_concurrently_and_keeps_order(monkeypatch):
+    active = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def fake_fetch(api, params_json, context, post_process_json, python_code, cache_ttl=None):
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        time.sleep(float(api))
+        with lock:
+            active["now"] -= 1
+        if api == "0.01":
+            raise RuntimeError("boom")
+        return f"{context['symbol']}:{api}"
+
+    monkeypatch.setattr(monitor_service.data_fetcher, "fetch", fake_fetch)
+    indicators = [_indicator("slow", 0.2), _indicator("bad", 0.01), _indicator("fast", 0.05)]
+
+    items = monitor_service._fetch_indicators(indicators, {"symbol": "600000"})
+
+    assert [item["name"] for item in items] == ["slow", "bad", "fast"]
+    assert items[0]["data"] == "600000:0.2"
+    assert items[1]["data"] == "Error fetching bad: boom"
+    assert items[2]["data"] == "600000:0.05"
+    assert active["peak"] > 1
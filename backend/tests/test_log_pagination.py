@@ -0,0 +1,51 @@
+from sqlalchemy import text
+
+import models
+from services.log_pagination import fetch_log_summaries
+
+
+def _insert_logs_same_second(db, stock_id, count):
+    # 一条 INSERT 写入多行：CURRENT_TIMESTAMP 相同，模拟写后队列同一批提交的日志
+    values = ", ".join(f"({stock_id}, '{{}}', 0)" for _ in range(count))
+    db.execute(text(f"INSERT INTO logs (stock_id, ai_analysis, is_alert) VALUES {values}"))
+    db.commit()
+
+
+def _collect_pages(db, page_size, stock_id=None):
+    seen = []
+    before_id = None
+    for _ in range(100):
+        page = fetch_log_summaries(db, stock_id=stock_id, limit=page_size, before_id=before_id)
+        if not page:
+            break
+        seen.extend(r["id"] for r in page)
+        before_id = page[-1]["id"]
+    return seen
+
+
+def test_pages_with_shared_timestamp_do_not_repeat(db):
+    stock = models.Stock(symbol="600000", name="浦发银行")
+    db.add(stock)
+    db.commit()
+    _insert_logs_same_second(db, stock.id, 7)
+
+    timestamps = {r[0] for r in db.execute(text("SELECT timestamp FROM logs")).all()}
+    assert len(timestamps) == 1
+
+    ids = _collect_pages(db, page_size=3)
+    assert ids == sorted(ids, reverse=True)
+    assert len(ids) == len(set(ids)) == 7
+
+
+def test_pages_filter_by_stock(db):
+    a = models.Stock(symbol="600000", name="A")
+    b = models.Stock(symbol="000001", name="B")
+    db.add_all([a, b])
+    db.commit()
+    _insert_logs_same_second(db, a.id, 5)
+    _insert_logs_same_second(db, b.id, 4)
+
+    page = fetch_log_summaries(db, stock_id=b.id, limit=10)
+    assert len(page) == 4
+    assert all(r["stock_id"] == b.id and r["stock"]["symbol"] == "000001" for r in page)
+    assert len(_collect_pages(db, page_size=2, stock_id=a.id)) == 5
@@ -0,0 +1,43 @@
+import datetime
+
+import models
+from services import log_retention
+
+
+def _seed(db, old_count, new_count):
+    stock = models.Stock(symbol="600000", name="浦发银行")
+    db.add(stock)
+    db.commit()
+    now = datetime.datetime.now()
+    old = (now - datetime.timedelta(days=10)).replace(hour=10, minute=0, second=0, microsecond=0)
+    for i in range(old_count):
+        db.add(models.Log(stock_id=stock.id, timestamp=old + datetime.timedelta(minutes=i), raw_data=f"raw {i}", ai_response="resp", ai_analysis={"signal": "BUY"}))
+    for i in range(new_count):
+        db.add(models.Log(stock_id=stock.id, timestamp=now - datetime.timedelta(minutes=i), raw_data="fresh", ai_analysis={"signal": "HOLD"}))
+    db.commit()
+    return stock, old
+
+
+def test_retention_deletes_expired_logs_in_batches(db):
+    _seed(db, old_count=7, new_count=3)
+
+    stats = log_retention.run_log_retention(retention_days=3, batch_size=3, archive=False)
+
+    assert stats["deleted"] == 7
+    assert stats["archived"] == 0
+    assert db.query(models.Log).count() == 3
+    assert log_retention.run_log_retention(retention_days=3, batch_size=3, archive=False)["deleted"] == 0
+
+
+def test_retention_archives_before_deleting(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(log_retention, "LOG_ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(log_retention, "LOG_ARCHIVE_FORMAT", "gz")
+    stock, old = _seed(db, old_count=4, new_count=1)
+
+    stats = log_retention.run_log_retention(retention_days=3, batch_size=3, archive=True)
+
+    assert stats["deleted"] == 4 and stats["archived"] == 4
+    records = list(log_retention.read_archived_logs(old.strftime("%Y-%m-%d"), stock_id=stock.id))
+    assert [r["raw_data"] for r in records] == [f"raw {i}" for i in range(4)]
+    assert records[0]["ai_analysis"] == {"signal": "BUY"}
+    assert list(log_retention.read_archived_logs(old.strftime("%Y-%m-%d"), stock_id=stock.id + 1)) == []
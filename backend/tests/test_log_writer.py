@@ -0,0 +1,23 @@
+import models
+from services.log_writer import LogWriter
+
+
+def test_failed_batch_keeps_good_rows_and_drops_bad_one(db):
+    stock = models.Stock(symbol="600000", name="浦发银行")
+    db.add(stock)
+    db.commit()
+
+    writer = LogWriter(flush_ms=10, batch_rows=10)
+    good = [models.Log(stock_id=stock.id, ai_analysis={"type": "info", "n": i}, ai_response="ok") for i in range(3)]
+    # JSON 列无法序列化：整批提交失败，逐条重试时只丢这一条
+    bad = models.Log(stock_id=stock.id, ai_analysis={"type": "info", "bad": object()})
+    for entry in (good[0], bad, good[1], good[2]):
+        writer.enqueue(entry)
+    writer.stop()
+
+    rows = db.query(models.Log).order_by(models.Log.id).all()
+    assert [r.ai_analysis["n"] for r in rows] == [0, 1, 2]
+    assert all(r.timestamp is not None for r in rows)
+    stats = writer.stats()
+    assert stats["written"] == 3
+    assert stats["failed"] == 1
@@ -0,0 +1,54 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import models
+from services import monitor_service
+
+
+@pytest.fixture(autouse=True)
+def _reset_batch_state():
+    monitor_service._batch_last_dispatch.clear()
+    monitor_service._batch_running.clear()
+    yield
+    monitor_service._batch_last_dispatch.clear()
+    monitor_service._batch_running.clear()
+
+
+def test_collect_due_waits_one_interval_and_skips_running():
+    rows = [(1, 60), (2, 120)]
+    assert monitor_service._collect_due_stock_ids(rows, 1000.0) == []
+    assert monitor_service._collect_due_stock_ids(rows, 1059.0) == []
+    assert monitor_service._collect_due_stock_ids(rows, 1060.0) == [1]
+    # 1 仍在执行，下一个周期到了也不重复派发
+    assert monitor_service._collect_due_stock_ids(rows, 1130.0) == [2]
+    monitor_service._batch_running.discard(1)
+    assert monitor_service._collect_due_stock_ids(rows, 1131.0) == [1]
+
+
+def test_monitor_tick_dispatches_due_stocks_with_preloaded_rows(db, monkeypatch):
+    due = models.Stock(symbol="600000", name="浦发银行", is_monitoring=True, interval_seconds=60, only_trade_days=False)
+    idle = models.Stock(symbol="000001", name="平安银行", is_monitoring=True, interval_seconds=600, only_trade_days=False)
+    off = models.Stock(symbol="600519", name="贵州茅台", is_monitoring=False, interval_seconds=60, only_trade_days=False)
+    db.add_all([due, idle, off])
+    db.commit()
+
+    now = [1000.0]
+    monkeypatch.setattr(monitor_service.time, "monotonic", lambda: now[0])
+    calls = []
+
+    def fake_process_stock(stock_id, preloaded_stock=None):
+        calls.append((stock_id, preloaded_stock.symbol))
+
+    executor = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(monitor_service, "process_stock", fake_process_stock)
+    monkeypatch.setattr(monitor_service, "_get_monitor_executor", lambda: executor)
+    monkeypatch.setattr(monitor_service, "MONITOR_ASYNC", False)
+
+    monitor_service.monitor_tick()
+    now[0] = 1061.0
+    monitor_service.monitor_tick()
+    executor.shutdown(wait=True)
+
+    assert calls == [(due.id, "600000")]
+    assert monitor_service._batch_running == set()
@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+from core.ai_retry import AIProviderUnavailableError, CircuitBreaker, ProviderGuard, TokenBucket
+
+
+def test_breaker_open_half_open_closed():
+    breaker = CircuitBreaker(failure_threshold=2, recovery_seconds=0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.12)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()          # 只放行一个探测请求
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats()["consecutive_failures"] == 0
+    assert breaker.stats()["trips"] == 1
+
+
+def test_failed_probe_reopens_and_released_probe_can_retry():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_seconds=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.stats()["trips"] == 2
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.release_probe()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+def test_guard_trips_on_provider_errors_and_recovers():
+    guard = ProviderGuard("test-guard", rate_per_minute=0, burst=1, max_in_flight=2, failure_threshold=2, recovery_seconds=0.1)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            with guard.slot(timeout=1):
+                raise ConnectionError("connection reset")
+    assert not guard.is_available()
+    with pytest.raises(AIProviderUnavailableError):
+        with guard.slot(timeout=1):
+            pass
+
+    time.sleep(0.12)
+    with guard.slot(timeout=1):
+        pass
+    stats = guard.stats()
+    assert stats["state"] == CircuitBreaker.CLOSED
+    assert stats["failures"] == 2 and stats["successes"] == 1 and stats["rejected_open"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_non_provider_error_does_not_count_towards_breaker():
+    guard = ProviderGuard("test-guard-2", rate_per_minute=0, burst=1, failure_threshold=1, recovery_seconds=60)
+    with pytest.raises(ValueError):
+        with guard.slot(timeout=1):
+            raise ValueError("bad prompt")
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_token_bucket_burst_then_refill():
+    bucket = TokenBucket(rate_per_sec=20, capacity=2)
+    assert bucket.acquire(timeout=0)
+    assert bucket.acquire(timeout=0)
+    assert not bucket.acquire(timeout=0)
+    start = time.monotonic()
+    assert bucket.acquire(timeout=1)
+    assert 0.02 <= time.monotonic() - start < 0.5
+
+    unlimited = TokenBucket(rate_per_sec=0, capacity=1)
+    assert all(unlimited.acquire(timeout=0) for _ in range(100))
+
+
+def test_guard_rejects_when_saturated():
+    guard = ProviderGuard("test-guard-3", rate_per_minute=0, burst=1, max_in_flight=1)
+    with guard.slot(timeout=1):
+        with pytest.raises(AIProviderUnavailableError):
+            with guard.slot(timeout=0.05):
+                pass
+    assert guard.stats()["rejected_busy"] == 1
@@ -0,0 +1,55 @@
+import pytest
+
+from utils import pytdx_client
+from utils.pytdx_client import TdxConnectionPool
+
+
+class _FakeApi:
+    opened = 0
+
+    def __init__(self):
+        type(self).opened += 1
+        self.id = type(self).opened
+        self.disconnected = False
+
+    def disconnect(self):
+        self.disconnected = True
+
+    def get_security_count(self, market):
+        return 100
+
+    def get_security_bars(self, category, market, code, start, count):
+        # 停牌/退市股票：服务器正常返回空
+        return []
+
+
+@pytest.fixture()
+def fake_connect(monkeypatch):
+    _FakeApi.opened = 0
+    monkeypatch.setattr(pytdx_client, "_try_connect_once", lambda ip, port: _FakeApi())
+    monkeypatch.setattr(pytdx_client, "best_endpoints_top_n", lambda *a, **k: [])
+    yield
+    pytdx_client.close_pool()
+
+
+def test_empty_first_page_keeps_connections_healthy(fake_connect):
+    pool = TdxConnectionPool(2)
+    for _ in range(5):
+        assert pool.call("get_security_bars", 9, 0, "000001", 0, 10) == []
+    stats = pool.stats()
+    # 两次尝试各用一个连接，之后一直复用，不断开重连
+    assert stats["broken"] == 0
+    assert stats["opened"] == 2
+    assert stats["idle"] == 2
+
+
+def test_get_pool_grows_shared_pool_without_closing_borrowed(fake_connect):
+    pool = pytdx_client.get_pool(1)
+    conn = pool.checkout()
+    assert pytdx_client.get_pool(3) is pool
+    assert pool.size == 3
+    other = pool.checkout(timeout=0.1)
+    assert other is not conn and not conn.api.disconnected
+    pool.checkin(other)
+    pool.checkin(conn)
+    assert pytdx_client.get_pool(2, ip="10.0.0.1") is not pool
@@ -0,0 +1,47 @@
+import pytest
+
+from core import script_cache
+
+
+@pytest.fixture(autouse=True)
+def _clean_cache():
+    script_cache.clear_script_cache()
+    yield
+    script_cache.clear_script_cache()
+
+
+def test_same_source_compiles_once():
+    before = script_cache.get_script_cache_stats()
+    first = script_cache.compile_script("x = 1 + 1")
+    second = script_cache.compile_script("x = 1 + 1")
+    after = script_cache.get_script_cache_stats()
+    assert first is second
+    assert after["compiles"] - before["compiles"] == 1
+    assert after["hits"] - before["hits"] == 1
+
+    scope = {}
+    exec(second, scope)
+    assert scope["x"] == 2
+
+
+def test_syntax_error_not_cached():
+    with pytest.raises(SyntaxError):
+        script_cache.compile_script("def broken(:")
+    assert script_cache.get_script_cache_stats()["entries"] == 0
+
+
+def test_invalidate_drops_entry():
+    old = script_cache.compile_script("y = 1")
+    script_cache.invalidate_script("y = 1")
+    assert script_cache.get_script_cache_stats()["entries"] == 0
+    assert script_cache.compile_script("y = 1") is not old
+
+
+def test_lru_bound(monkeypatch):
+    monkeypatch.setattr(script_cache, "SCRIPT_CACHE_MAX_ENTRIES", 2)
+    a = script_cache.compile_script("a = 1")
+    script_cache.compile_script("b = 1")
+    assert script_cache.compile_script("a = 1") is a  # a 变为最近使用
+    script_cache.compile_script("c = 1")
+    assert script_cache.get_script_cache_stats()["entries"] == 2
+    assert script_cache.compile_script("a = 1") is a
@@ -0,0 +1,56 @@
+import datetime
+
+import pytest
+
+import models
+from services.signal_cache import last_signal_cache
+
+
+@pytest.fixture()
+def stock(db):
+    row = models.Stock(symbol="600000", name="浦发银行")
+    db.add(row)
+    db.commit()
+    last_signal_cache.invalidate()
+    yield row
+    last_signal_cache.invalidate()
+
+
+def test_cache_updates_on_commit_not_on_flush_or_rollback(db, stock):
+    assert last_signal_cache.get(stock.id, db) is None
+
+    db.add(models.Log(stock_id=stock.id, ai_analysis={"signal": "BUY"}))
+    db.flush()
+    assert last_signal_cache.get(stock.id) is None
+    db.rollback()
+    assert last_signal_cache.get(stock.id) is None
+
+    db.add(models.Log(stock_id=stock.id, ai_analysis={"signal": "SELL"}))
+    db.commit()
+    assert last_signal_cache.get(stock.id) == "SELL"
+
+    # 回滚后再提交一条别的日志，不应把已回滚的 signal 带出来
+    db.add(models.Log(stock_id=stock.id, ai_analysis={"signal": "BUY"}))
+    db.flush()
+    db.rollback()
+    db.add(models.Log(stock_id=stock.id, ai_analysis={"type": "info"}))
+    db.commit()
+    assert last_signal_cache.get(stock.id) is None
+
+
+def test_warm_reads_latest_signal_per_stock(db, stock):
+    base = datetime.datetime(2026, 1, 5, 10, 0, 0)
+    other = models.Stock(symbol="000001", name="平安银行")
+    db.add(other)
+    db.commit()
+    db.add_all([
+        models.Log(stock_id=stock.id, timestamp=base, ai_analysis={"signal": "BUY"}),
+        models.Log(stock_id=stock.id, timestamp=base + datetime.timedelta(minutes=5), ai_analysis='{"signal": "HOLD"}'),
+        models.Log(stock_id=other.id, timestamp=base, ai_analysis={"signal": "SELL"}),
+    ])
+    db.commit()
+
+    last_signal_cache.invalidate()
+    assert last_signal_cache.warm(db) == 2
+    assert last_signal_cache.get(stock.id) == "HOLD"
+    assert last_signal_cache.get(other.id) == "SELL"
@@ -0,0 +1,63 @@
+import threading
+import time
+
+import pytest
+
+from core.single_flight import SingleFlight
+
+
+def _run_concurrently(n, target):
+    barrier = threading.Barrier(n)
+    results, errors = [], []
+
+    def worker():
+        barrier.wait()
+        try:
+            results.append(target())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+def test_concurrent_identical_calls_execute_once():
+    flight = SingleFlight()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.1)
+        return "df"
+
+    results, errors = _run_concurrently(8, lambda: flight.do(("stock_zh_a_spot_em", ()), fetch))
+    assert errors == []
+    assert results == ["df"] * 8
+    assert len(calls) == 1
+    stats = flight.stats()
+    assert stats["executed"] == 1 and stats["shared"] == 7 and stats["in_flight"] == 0
+
+    # 已完成的结果不缓存：之后的调用重新执行
+    assert flight.do(("stock_zh_a_spot_em", ()), fetch) == "df"
+    assert len(calls) == 2
+
+
+def test_errors_propagate_to_every_waiter_and_keys_are_independent():
+    flight = SingleFlight()
+
+    def boom():
+        time.sleep(0.1)
+        raise RuntimeError("upstream down")
+
+    results, errors = _run_concurrently(4, lambda: flight.do("k", boom))
+    assert results == [] and len(errors) == 4
+    assert all(str(e) == "upstream down" for e in errors)
+
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    with pytest.raises(ValueError):
+        flight.do("c", lambda: (_ for _ in ()).throw(ValueError("x")))
@@ -0,0 +1,61 @@
+from sqlalchemy import event
+
+import database
+import models
+from services.system_config_cache import SystemConfigCache
+
+
+def _count_selects(calls):
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "system_configs" in statement:
+            calls.append(statement)
+    return before_execute
+
+
+def test_reads_hit_memory_until_invalidated(db):
+    db.add_all([models.SystemConfig(key="global_prompt", value="v1"), models.SystemConfig(key="email_config", value="{}")])
+    db.commit()
+    cache = SystemConfigCache(ttl_seconds=300)
+    calls = []
+    listener = _count_selects(calls)
+    event.listen(database.engine, "before_cursor_execute", listener)
+    try:
+        assert cache.get("global_prompt") == "v1"
+        assert cache.get("email_config") == "{}"
+        assert cache.get("missing") is None
+        assert len(calls) == 1
+
+        db.query(models.SystemConfig).filter(models.SystemConfig.key == "global_prompt").update({"value": "v2"})
+        db.commit()
+        assert cache.get("global_prompt") == "v1"
+        cache.invalidate()
+        assert cache.get("global_prompt") == "v2"
+        assert len(calls) == 2
+    finally:
+        event.remove(database.engine, "before_cursor_execute", listener)
+
+
+def test_ttl_expiry_reloads(db):
+    db.add(models.SystemConfig(key="k", value="old"))
+    db.commit()
+    cache = SystemConfigCache(ttl_seconds=0)
+    assert cache.get("k") == "old"
+    db.query(models.SystemConfig).update({"value": "new"})
+    db.commit()
+    assert cache.get("k") == "new"
+
+
+def test_invalidate_during_load_does_not_backfill_stale_values(db):
+    db.add(models.SystemConfig(key="k", value="old"))
+    db.commit()
+    cache = SystemConfigCache(ttl_seconds=300)
+    original_load = cache._load
+
+    def racing_load(session):
+        values = original_load(session)
+        cache.invalidate()  # 载入完成前 /settings 写入了新值
+        return values
+
+    cache._load = racing_load
+    assert cache.get("k") == "old"
+    assert cache._values is None
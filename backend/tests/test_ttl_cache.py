@@ -0,0 +1,43 @@
+import time
+
+import pandas as pd
+
+from core.ttl_cache import TTLCache, estimate_size
+
+
+def test_entries_expire_after_ttl():
+    cache = TTLCache(max_entries=4, default_ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=10)
+    assert cache.get("a") == 1
+    time.sleep(0.08)
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    cache.set("c", 3, ttl=0)
+    assert cache.get("c", "missing") == "missing"
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    cache = TTLCache(max_entries=2, default_ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    # b 最久未使用，被淘汰
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+    sized = TTLCache(max_entries=10, max_bytes=10, default_ttl=60)
+    sized.set("x", "12345")
+    sized.set("y", "123456")
+    assert sized.get("x") is None and sized.get("y") == "123456"
+    sized.set("big", "x" * 11)
+    assert sized.get("big") is None
+    stats = sized.stats()
+    assert stats["bytes"] == 6 and stats["evictions"] == 1
+
+
+def test_estimate_size_uses_dataframe_memory():
+    df = pd.DataFrame({"a": range(1000)})
+    assert estimate_size(df) >= 8000
+    assert estimate_size("中文") == 6
@@ -0,0 +1,84 @@
+import asyncio
+import gc
+import threading
+import time
+
+from core import upstream_limits
+from services import monitor_service
+
+
+def test_sync_slot_caps_concurrency_and_reports_stats(monkeypatch):
+    monkeypatch.setenv("UPSTREAM_LIMIT_SYNCCAP", "2")
+    active = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+    seen = []
+
+    def worker():
+        with upstream_limits.upstream_slot("synccap"):
+            with lock:
+                active["now"] += 1
+                active["peak"] = max(active["peak"], active["now"])
+                seen.append(upstream_limits.get_upstream_stats()["synccap"]["sync_in_use"])
+            time.sleep(0.05)
+            with lock:
+                active["now"] -= 1
+
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert active["peak"] == 2
+    assert max(seen) <= 2
+    stats = upstream_limits.get_upstream_stats()["synccap"]
+    assert stats == {"limit": 2, "sync_in_use": 0, "sync_available": 2}
+
+
+def test_async_semaphores_are_per_loop_and_released_with_the_loop(monkeypatch):
+    monkeypatch.setenv("UPSTREAM_LIMIT_ASYNCCAP", "1")
+
+    async def run():
+        async with upstream_limits.async_upstream_slot("asynccap"):
+            assert upstream_limits.get_upstream_stats()["asynccap"]["async_in_use"] == 1
+        return upstream_limits._async_semaphore("asynccap")
+
+    first = asyncio.run(run())
+    second = asyncio.run(run())
+    assert first is not second
+    assert upstream_limits.get_upstream_stats()["asynccap"]["async_available"] == 1
+
+    gc.collect()
+    assert all("asynccap" not in per_loop for per_loop in upstream_limits._async_semaphores.values())
+
+
+def test_process_stock_async_advances_flow_off_the_event_loop(monkeypatch):
+    flow_threads = []
+
+    def fake_flow(*args):
+        flow_threads.append(threading.get_ident())
+        fetched = yield ("fetch", [], {})
+        flow_threads.append(threading.get_ident())
+        try:
+            yield ("ai",)
+        except RuntimeError as e:
+            flow_threads.append(threading.get_ident())
+            return {"fetched": fetched, "error": str(e)}
+
+    async def fake_step(step):
+        if step[0] == "ai":
+            raise RuntimeError("ai down")
+        return ["data"]
+
+    monkeypatch.setattr(monitor_service, "_process_stock_flow", fake_flow)
+    monkeypatch.setattr(monitor_service, "_run_flow_step_async", fake_step)
+
+    async def run():
+        loop_thread = threading.get_ident()
+        result = await monitor_service.process_stock_async(1)
+        return loop_thread, result
+
+    loop_thread, result = asyncio.run(run())
+    assert result == {"fetched": ["data"], "error": "ai down"}
+    assert len(flow_threads) == 3
+    assert loop_thread not in flow_threads
@@ -0,0 +1,418 @@
+"""
+本地列式 K 线仓库：每个 market/period 一个目录，字段按列各存一个 float32 .npy 矩阵
+(行 = 交易日，列 = 股票)，外加 meta.json 保存股票索引与日期索引。
+
+读取走 np.load(mmap_mode="r")，全市场数年历史也可以亚秒级打开；
+update() 从每只股票最后入库的那根 K 线开始重新拉取：最后一根可能是盘中/未收完的周线、月线，
+会被新数据覆盖而不是冻结在入库时的值。
+"""
+
+from __future__ import annotations
+
+import datetime
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any, Iterable, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.pytdx_client import get_bars_many
+
+BAR_STORE_DIR = os.getenv(
+    "BAR_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "bar_store"),
+)
+BAR_FIELDS = ("open", "high", "low", "close", "vol", "amount")
+
+# period -> (pytdx category, 每根 K 线大约覆盖的自然日数)
+_PERIODS: Dict[str, Tuple[int, float]] = {
+    "day": (9, 1.0),
+    "week": (5, 7.0),
+    "month": (6, 30.0),
+}
+
+
+def _to_date_int(values) -> np.ndarray:
+    dt = pd.to_datetime(pd.Series(values), errors="coerce")
+    out = dt.dt.strftime("%Y%m%d")
+    return pd.to_numeric(out, errors="coerce").fillna(0).astype(np.int64).to_numpy()
+
+
+def _date_int_to_date(value: int) -> datetime.date:
+    v = int(value)
+    return datetime.date(v // 10000, (v // 100) % 100, v % 100)
+
+
+def _period_bucket(period: str, values) -> np.ndarray:
+    """K 线所属周期：日线为日期本身，周线为当周周一，月线为 YYYYMM。同一周期内的 K 线互相覆盖"""
+    d = np.asarray(values, dtype=np.int64)
+    if period == "month":
+        return d // 100
+    if period == "week":
+        dt = pd.to_datetime(pd.Series(d).astype(str), format="%Y%m%d", errors="coerce")
+        monday = dt - pd.to_timedelta(dt.dt.weekday, unit="D")
+        return pd.to_numeric(monday.dt.strftime("%Y%m%d"), errors="coerce").fillna(0).astype(np.int64).to_numpy()
+    return d
+
+
+class DailyBarStore:
+    def __init__(self, market: int, period: str = "day", root: Optional[str] = None):
+        if period not in _PERIODS:
+            raise ValueError(f"不支持的 period: {period}, 可选: {list(_PERIODS)}")
+        self.market = int(market)
+        self.period = str(period)
+        self.path = os.path.join(root or BAR_STORE_DIR, f"{self.period}_{self.market}")
+        self._lock = threading.Lock()
+        self._symbols: List[str] = []
+        self._symbol_index: Dict[str, int] = {}
+        self._dates = np.zeros(0, dtype=np.int64)
+        self._arrays: Dict[str, np.ndarray] = {f: np.zeros((0, 0), dtype=np.float32) for f in BAR_FIELDS}
+        self._loaded = False
+
+    @property
+    def symbols(self) -> List[str]:
+        self._ensure_loaded()
+        return list(self._symbols)
+
+    @property
+    def dates(self) -> np.ndarray:
+        self._ensure_loaded()
+        return self._dates
+
+    def array(self, field: str) -> np.ndarray:
+        """(dates × symbols) float32 矩阵，缺失为 NaN；只读 mmap。"""
+        self._ensure_loaded()
+        return self._arrays[field]
+
+    def symbol_index(self, code: str) -> Optional[int]:
+        self._ensure_loaded()
+        return self._symbol_index.get(str(code).zfill(6))
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    def load(self) -> bool:
+        meta_path = os.path.join(self.path, "meta.json")
+        with self._lock:
+            self._loaded = True
+            if not os.path.exists(meta_path):
+                return False
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self._symbols = [str(s) for s in meta.get("symbols") or []]
+            self._symbol_index = {s: i for i, s in enumerate(self._symbols)}
+            self._dates = np.load(os.path.join(self.path, "dates.npy"))
+            for field in BAR_FIELDS:
+                self._arrays[field] = np.load(os.path.join(self.path, f"{field}.npy"), mmap_mode="r")
+            return True
+
+    def last_dates(self) -> Dict[str, int]:
+        """每只股票最后一根有效 K 线的日期 (YYYYMMDD)。"""
+        self._ensure_loaded()
+        close = self._arrays["close"]
+        if close.size == 0:
+            return {}
+        valid = np.isfinite(close)
+        has_any = valid.any(axis=0)
+        last_idx = close.shape[0] - 1 - np.argmax(valid[::-1], axis=0)
+        return {s: int(self._dates[last_idx[i]]) for i, s in enumerate(self._symbols) if has_any[i]}
+
+    def _bars_needed(self, last_date: Optional[int], history: int, today: datetime.date) -> int:
+        if last_date is None:
+            return int(history)
+        # 至少重拉最后入库的那一根，刷新盘中/未走完的 K 线
+        days = max(0, (today - _date_int_to_date(last_date)).days)
+        per_bar = _PERIODS[self.period][1]
+        return min(int(history), int(days / per_bar) + 2)
+
+    def update(self, codes: Iterable[str], history: int = 800, workers: Optional[int] = None) -> Dict[str, Any]:
+        """
+        增量更新：已入库的股票从最后一根 K 线起重新拉取，与最后一根同周期的新数据覆盖它，
+        更晚的追加；新股票拉取 history 根。返回更新统计。
+        """
+        t0 = time.perf_counter()
+        self._ensure_loaded()
+        category = _PERIODS[self.period][0]
+        today = datetime.date.today()
+        last = self.last_dates()
+
+        groups: Dict[int, List[Tuple[int, str]]] = {}
+        for code in codes:
+            code = str(code).zfill(6)
+            n = self._bars_needed(last.get(code), history, today)
+            if n > 0:
+                groups.setdefault(n, []).append((self.market, code))
+
+        errors: Dict[Tuple[int, str], str] = {}
+        frames: List[pd.DataFrame] = []
+        for n, symbols in sorted(groups.items()):
+            df = get_bars_many(symbols, category=category, count=n, workers=workers, errors=errors)
+            if df is not None and not df.empty:
+                frames.append(df)
+
+        new_rows = 0
+        refreshed_rows = 0
+        if frames:
+            fetched = pd.concat(frames, axis=0, ignore_index=True)
+            fetched["date"] = _to_date_int(fetched["datetime"])
+            fetched = fetched[fetched["date"] > 0]
+            last_s = fetched["code"].map(last).fillna(0).astype(np.int64).to_numpy()
+            bucket = _period_bucket(self.period, fetched["date"].to_numpy())
+            last_bucket = np.where(last_s > 0, _period_bucket(self.period, np.where(last_s > 0, last_s, 19700105)), 0)
+            keep = bucket >= last_bucket
+            same = keep & (bucket == last_bucket)
+            # 周线/月线的最后一根日期会随周期推进而变化：同周期但日期不同时要清掉旧那行
+            moved = same & (fetched["date"].to_numpy() != last_s)
+            stale = {(int(d), str(c)) for d, c in zip(last_s[moved], fetched["code"].to_numpy()[moved])}
+            refreshed_rows = int(same.sum())
+            fetched = fetched[keep]
+            new_rows = int(len(fetched)) - refreshed_rows
+            if len(fetched) > 0:
+                self._merge(fetched, stale=stale)
+
+        return {
+            "market": self.market,
+            "period": self.period,
+            "requested": int(sum(len(v) for v in groups.values())),
+            "new_rows": new_rows,
+            "refreshed_rows": refreshed_rows,
+            "errors": len(errors),
+            "symbols": len(self._symbols),
+            "dates": int(len(self._dates)),
+            "elapsed_s": round(time.perf_counter() - t0, 3),
+        }
+
+    def _merge(self, fetched: pd.DataFrame, stale: Optional[set] = None) -> None:
+        with self._lock:
+            old_symbols = list(self._symbols)
+            old_dates = np.asarray(self._dates, dtype=np.int64)
+
+            add_symbols = sorted(set(fetched["code"].astype(str)) - set(self._symbol_index))
+            symbols = old_symbols + add_symbols
+            sym_index = {s: i for i, s in enumerate(symbols)}
+            dates = np.union1d(old_dates, fetched["date"].to_numpy(dtype=np.int64))
+
+            row_old = np.searchsorted(dates, old_dates)
+            row_new = np.searchsorted(dates, fetched["date"].to_numpy(dtype=np.int64))
+            col_new = fetched["code"].astype(str).map(sym_index).to_numpy(dtype=np.int64)
+
+            arrays: Dict[str, np.ndarray] = {}
+            for field in BAR_FIELDS:
+                arr = np.full((len(dates), len(symbols)), np.nan, dtype=np.float32)
+                old = self._arrays[field]
+                if old.size:
+                    arr[row_old[:, None], np.arange(len(old_symbols))[None, :]] = old
+                for d, c in stale or ():
+                    arr[int(np.searchsorted(dates, d)), sym_index[c]] = np.nan
+                if field in fetched.columns:
+                    arr[row_new, col_new] = pd.to_numeric(fetched[field], errors="coerce").to_numpy(dtype=np.float32)
+                arrays[field] = arr
+
+            if stale:
+                # 被整行替换掉的旧周期日期不再有任何 K 线时一并去掉
+                alive = np.isfinite(arrays["close"]).any(axis=1)
+                if not alive.all():
+                    dates = dates[alive]
+                    arrays = {f: np.ascontiguousarray(a[alive]) for f, a in arrays.items()}
+
+            self._write(symbols, dates, arrays)
+            self._symbols = symbols
+            self._symbol_index = sym_index
+            self._dates = dates
+            self._arrays = arrays
+
+    def _write(self, symbols: List[str], dates: np.ndarray, arrays: Dict[str, np.ndarray]) -> None:
+        os.makedirs(self.path, exist_ok=True)
+
+        def _save_npy(name: str, arr: np.ndarray) -> None:
+            final = os.path.join(self.path, f"{name}.npy")
+            tmp = final + ".tmp.npy"
+            np.save(tmp, arr)
+            os.replace(tmp, final)
+
+        _save_npy("dates", dates.astype(np.int64))
+        for field in BAR_FIELDS:
+            _save_npy(field, arrays[field])
+
+        meta = {
+            "market": self.market,
+            "period": self.period,
+            "symbols": symbols,
+            "fields": list(BAR_FIELDS),
+            "updated_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        meta_path = os.path.join(self.path, "meta.json")
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def get(self, code: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> pd.DataFrame:
+        """单只股票的 K 线 DataFrame (date, open, high, low, close, vol, amount)。"""
+        idx = self.symbol_index(code)
+        if idx is None:
+            return pd.DataFrame(columns=["date", *BAR_FIELDS])
+        df = pd.DataFrame({field: np.asarray(self._arrays[field][:, idx], dtype=np.float64) for field in BAR_FIELDS})
+        df.insert(0, "date", pd.to_datetime(self._dates.astype(str), format="%Y%m%d"))
+        df = df[np.isfinite(df["close"].to_numpy())]
+        if start_date:
+            df = df[df["date"] >= pd.to_datetime(start_date)]
+        if end_date:
+            df = df[df["date"] <= pd.to_datetime(end_date)]
+        return df.reset_index(drop=True)
+
+
+@dataclass(frozen=True)
+class BarPanel:
+    """
+    全市场对齐面板：所有矩阵形状均为 (dates × symbols)。
+    valid: 当日有 K 线；listed: 位于首根与末根 K 线之间；suspended: listed 但当日无 K 线。
+    """
+
+    dates: np.ndarray
+    markets: np.ndarray
+    codes: List[str]
+    fields: Dict[str, np.ndarray]
+    valid: np.ndarray
+    listed: np.ndarray
+    suspended: np.ndarray
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.fields[field]
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return (len(self.dates), len(self.codes))
+
+    def column(self, code: str, market: Optional[int] = None) -> int:
+        code = str(code).zfill(6)
+        for i, c in enumerate(self.codes):
+            if c == code and (market is None or int(self.markets[i]) == int(market)):
+                return i
+        raise KeyError(code)
+
+
+def ffill_panel(arr: np.ndarray) -> np.ndarray:
+    """沿日期轴向前填充 NaN（停牌日沿用上一交易日值），纯向量化。"""
+    if arr.size == 0:
+        return arr.copy()
+    valid = np.isfinite(arr)
+    idx = np.where(valid, np.arange(arr.shape[0])[:, None], 0)
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    out = arr[idx, np.arange(arr.shape[1])[None, :]]
+    out[~np.isfinite(out)] = np.nan
+    return out
+
+
+def load_panel(
+    markets: Iterable[int] = (0, 1),
+    period: str = "day",
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    codes: Optional[Iterable[str]] = None,
+    fields: Iterable[str] = BAR_FIELDS,
+    dtype=np.float32,
+) -> BarPanel:
+    """
+    从本地 K 线仓库构建跨市场对齐的面板，供全市场向量化筛选使用。
+    不触发网络请求；需要最新数据时先调用 update_bar_store。
+    """
+    fields = [f for f in fields if f in BAR_FIELDS]
+    wanted = {str(c).zfill(6) for c in codes} if codes is not None else None
+    lo = int(pd.to_datetime(start_date).strftime("%Y%m%d")) if start_date else None
+    hi = int(pd.to_datetime(end_date).strftime("%Y%m%d")) if end_date else None
+
+    parts: List[Tuple[int, DailyBarStore, np.ndarray]] = []
+    all_dates = np.zeros(0, dtype=np.int64)
+    for m in markets:
+        store = get_bar_store(int(m), period)
+        if len(store.dates) == 0:
+            continue
+        cols = np.arange(len(store.symbols))
+        if wanted is not None:
+            cols = np.array([i for i, s in enumerate(store.symbols) if s in wanted], dtype=np.int64)
+        if cols.size == 0:
+            continue
+        parts.append((int(m), store, cols))
+        all_dates = np.union1d(all_dates, np.asarray(store.dates, dtype=np.int64))
+
+    if lo is not None:
+        all_dates = all_dates[all_dates >= lo]
+    if hi is not None:
+        all_dates = all_dates[all_dates <= hi]
+
+    n_cols = int(sum(len(cols) for _, _, cols in parts))
+    out = {f: np.full((len(all_dates), n_cols), np.nan, dtype=dtype) for f in fields}
+    close_full = np.full((len(all_dates), n_cols), np.nan, dtype=np.float32)
+    markets_arr = np.zeros(n_cols, dtype=np.int64)
+    code_list: List[str] = []
+
+    # 在全历史上判断上市区间，避免截取时间窗后把窗口外上市的股票误判
+    first_valid = np.zeros(n_cols, dtype=np.int64)
+    last_valid = np.zeros(n_cols, dtype=np.int64)
+
+    offset = 0
+    for m, store, cols in parts:
+        sdates = np.asarray(store.dates, dtype=np.int64)
+        keep = np.isin(sdates, all_dates)
+        rows = np.searchsorted(all_dates, sdates[keep])
+        span = slice(offset, offset + len(cols))
+        for f in fields:
+            out[f][rows, span] = store.array(f)[keep][:, cols]
+        close_all = np.asarray(store.array("close")[:, cols])
+        close_full[rows, span] = close_all[keep]
+        has = np.isfinite(close_all)
+        any_ = has.any(axis=0)
+        first_valid[span] = np.where(any_, sdates[np.argmax(has, axis=0)], 0)
+        last_valid[span] = np.where(any_, sdates[len(sdates) - 1 - np.argmax(has[::-1], axis=0)], 0)
+        markets_arr[span] = m
+        code_list.extend(store.symbols[i] for i in cols)
+        offset += len(cols)
+
+    valid = np.isfinite(close_full)
+    d = all_dates[:, None]
+    listed = (d >= first_valid[None, :]) & (d <= last_valid[None, :]) & (first_valid[None, :] > 0)
+    return BarPanel(
+        dates=all_dates,
+        markets=markets_arr,
+        codes=code_list,
+        fields=out,
+        valid=valid,
+        listed=listed,
+        suspended=listed & ~valid,
+    )
+
+
+_stores: Dict[Tuple[int, str], DailyBarStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_bar_store(market: int, period: str = "day") -> DailyBarStore:
+    key = (int(market), str(period))
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = DailyBarStore(market, period)
+            _stores[key] = store
+        return store
+
+
+def update_bar_store(codes_by_market: Dict[int, Iterable[str]], period: str = "day", history: int = 800) -> List[Dict[str, Any]]:
+    return [get_bar_store(m, period).update(codes, history=history) for m, codes in codes_by_market.items()]
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 3:
+        raise SystemExit("用法: python -m utils.bar_store <market> <code>[,<code>...] [history]")
+    market_ = int(sys.argv[1])
+    codes_ = [c for c in sys.argv[2].split(",") if c]
+    history_ = int(sys.argv[3]) if len(sys.argv) >= 4 else 800
+    store_ = get_bar_store(market_)
+    print(store_.update(codes_, history=history_))
+    print(store_.get(codes_[0]).tail(5).to_string(index=False))
@@ -1,17 +1,15 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import datetime
+import json
+import os
+from dataclasses import dataclass, field
 from typing import Optional, Iterable
 
 import numpy as np
 import pandas as pd
-import threading
 
-from utils.pytdx_client import tdx
-
-_best_endpoint_cache: Optional[tuple[str, int]] = None
-_best_endpoint_cached_at: float = 0.0
-_tdx_request_lock = threading.Lock()
+from utils.pytdx_client import get_bars_many, get_pool
 
 
 def _infer_market(code: str) -> int:
@@ -21,83 +19,102 @@ def _infer_market(code: str) -> int:
     return 0
 
 
-def _iter_stock_endpoints(limit: int = 15) -> list[tuple[str, int]]:
-    out: list[tuple[str, int]] = []
-    seen: set[tuple[str, int]] = set()
-
-    for ep in [("180.153.18.170", 7709), ("101.227.73.20", 7709)]:
-        if ep in seen:
-            continue
-        seen.add(ep)
-        out.append(ep)
-    try:
-        from pytdx.util import best_ip as _best_ip
-    except Exception:
-        _best_ip = None
-    items = getattr(_best_ip, "stock_ip", None) if _best_ip is not None else None
-    if isinstance(items, list):
-        for item in items:
-            if not isinstance(item, dict):
-                continue
-            ip = item.get("ip")
-            port = item.get("port")
-            if not isinstance(ip, str) or not isinstance(port, int):
-                continue
-            ep = (ip, port)
-            if ep in seen:
-                continue
-            seen.add(ep)
-            out.append(ep)
-            if len(out) >= max(1, int(limit)):
-                break
-    return out[: max(1, int(limit))]
-
-
-def _safe_vwap_and_volume_shares(amount: float, volume_raw: float, close_price: float) -> tuple[Optional[float], float]:
-    try:
-        vol = float(volume_raw)
-    except Exception:
-        return None, 0.0
-    if not np.isfinite(vol) or vol <= 0:
-        return None, 0.0
-
-    try:
-        amt = float(amount)
-    except Exception:
-        amt = np.nan
-    if not np.isfinite(amt) or amt <= 0:
-        return None, vol
-
-    raw_vwap = amt / vol
-
-    cp = float(close_price) if close_price is not None and np.isfinite(close_price) else None
-    if cp is not None and cp > 0:
-        ratio = raw_vwap / cp
-        if 80.0 < ratio < 120.0:
-            return raw_vwap / 100.0, vol * 100.0
-        if 0.8 < ratio < 1.2:
-            return raw_vwap, vol
-
-    if cp is not None and cp > 0 and raw_vwap > cp * 50:
-        return raw_vwap / 100.0, vol * 100.0
-    return raw_vwap, vol
-
-
-def _weighted_quantile(values: np.ndarray, weights: np.ndarray, q: float) -> float:
-    order = np.argsort(values)
-    v = values[order]
-    w = weights[order]
-    w = np.where(np.isfinite(w) & (w > 0), w, 0.0)
-    total = float(np.sum(w))
-    if total <= 0:
-        return float(v[-1])
-    cum = np.cumsum(w) / total
-    idx = int(np.searchsorted(cum, q, side="left"))
-    if idx < 0:
-        idx = 0
-    if idx >= len(v):
-        idx = len(v) - 1
-    return float(v[idx])
+def _vwap_and_volume_shares(amount: np.ndarray, volume_raw: np.ndarray, close_price: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    向量化的 VWAP 与成交量（股）计算，带“手/股”单位自适应：
+    Raw_VWAP / 收盘价 约 100 倍时视为“手”，约 1 倍时视为“股”。
+    """
+    amt = np.asarray(amount, dtype=float)
+    vol = np.asarray(volume_raw, dtype=float)
+    cp = np.asarray(close_price, dtype=float)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        vol_ok = np.isfinite(vol) & (vol > 0)
+        amt_ok = vol_ok & np.isfinite(amt) & (amt > 0)
+        raw_vwap = np.where(amt_ok, amt / np.where(vol_ok, vol, 1.0), np.nan)
+
+        cp_ok = np.isfinite(cp) & (cp > 0)
+        ratio = np.where(cp_ok, raw_vwap / np.where(cp_ok, cp, 1.0), np.nan)
+        is_hand = ratio > 80.0
+        is_hand &= ratio < 120.0
+        is_share = (ratio > 0.8) & (ratio < 1.2)
+        is_hand |= (~is_share) & cp_ok & (raw_vwap > cp * 50)
+
+    vwap = np.where(is_hand, raw_vwap / 100.0, raw_vwap)
+    shares = np.where(vol_ok, np.where(is_hand, vol * 100.0, vol), 0.0)
+    return vwap, shares
+
+
+def rolling_weighted_quantiles(
+    values: np.ndarray,
+    weights: np.ndarray,
+    window: int,
+    qs: Iterable[float],
+    min_count: int = 1,
+    chunk_cols: int = 64,
+) -> tuple[dict[float, np.ndarray], np.ndarray]:
+    """
+    滚动加权分位数，一次计算所有窗口的多个分位点。
+
+    values/weights 为 1-D (n,) 或 2-D (n, k)（日期 × 股票）。窗口 i 覆盖 [i-window+1, i]，
+    值非有限或权重 <= 0 的样本不参与计算；有效样本数 < min_count 的位置输出 NaN。
+    返回 ({q: 分位数组}, 加权均值数组)，形状与输入一致。
+    """
+    vals = np.asarray(values, dtype=float)
+    wts = np.asarray(weights, dtype=float)
+    one_d = vals.ndim == 1
+    if one_d:
+        vals = vals[:, None]
+        wts = wts[:, None]
+    n, k = vals.shape
+    w = max(1, int(window))
+    qs = [float(q) for q in qs]
+
+    out_q = {q: np.full((n, k), np.nan) for q in qs}
+    out_mean = np.full((n, k), np.nan)
+    if n == 0 or k == 0:
+        return ({q: a[:, 0] for q, a in out_q.items()}, out_mean[:, 0]) if one_d else (out_q, out_mean)
+
+    ok = np.isfinite(vals) & np.isfinite(wts) & (wts > 0)
+    v_all = np.where(ok, vals, np.inf)
+    w_all = np.where(ok, wts, 0.0)
+    pad_v = np.full((w - 1, k), np.inf)
+    pad_w = np.zeros((w - 1, k))
+
+    for c0 in range(0, k, max(1, int(chunk_cols))):
+        c1 = min(k, c0 + max(1, int(chunk_cols)))
+        v = np.concatenate([pad_v[:, c0:c1], v_all[:, c0:c1]], axis=0)
+        ww = np.concatenate([pad_w[:, c0:c1], w_all[:, c0:c1]], axis=0)
+        # (n, cols, w) 窗口视图；无效样本值为 +inf、权重为 0，排序后全部落在末尾
+        v_win = np.lib.stride_tricks.sliding_window_view(v, w, axis=0)
+        w_win = np.lib.stride_tricks.sliding_window_view(ww, w, axis=0)
+        order = np.argsort(v_win, axis=-1, kind="stable")
+        v_sorted = np.take_along_axis(v_win, order, axis=-1)
+        w_sorted = np.take_along_axis(w_win, order, axis=-1)
+
+        count = (w_sorted > 0).sum(axis=-1)
+        cum = np.cumsum(w_sorted, axis=-1)
+        total = cum[..., -1]
+        enough = (count >= max(1, int(min_count))) & (total > 0)
+        safe_total = np.where(total > 0, total, 1.0)
+        cum_norm = cum / safe_total[..., None]
+        last_valid = np.maximum(count - 1, 0)
+
+        with np.errstate(invalid="ignore"):
+            v_finite = np.where(np.isfinite(v_sorted), v_sorted, 0.0)
+            mean = (v_finite * w_sorted).sum(axis=-1) / safe_total
+        out_mean[:, c0:c1] = np.where(enough, mean, np.nan)
+
+        for q in qs:
+            hit = cum_norm >= q
+            idx = np.where(hit.any(axis=-1), np.argmax(hit, axis=-1), last_valid)
+            idx = np.minimum(idx, last_valid)
+            picked = np.take_along_axis(v_sorted, idx[..., None], axis=-1)[..., 0]
+            out_q[q][:, c0:c1] = np.where(enough, picked, np.nan)
+
+    if one_d:
+        return {q: a[:, 0] for q, a in out_q.items()}, out_mean[:, 0]
+    return out_q, out_mean
 
 
 def _fetch_daily_bars(code: str, start_date: str, end_date: str) -> pd.DataFrame:
@@ -111,46 +128,32 @@ def _fetch_daily_bars(code: str, start_date: str, end_date: str) -> pd.DataFrame
         start_dt, end_dt = end_dt, start_dt
 
     step = 700
-    endpoints_tried: list[tuple[str, int]] = []
-    endpoints = _iter_stock_endpoints()
+    pool = get_pool()
     frames: list[pd.DataFrame] = []
-    last_err: Optional[Exception] = None
-    for ip, port in endpoints:
-        endpoints_tried.append((ip, port))
-        local_frames: list[pd.DataFrame] = []
-        start_offset = 0
-        try:
-            while True:
-                with _tdx_request_lock:
-                    tdx.configure(ip, port)
-                    bars = tdx.get_security_bars(9, market, code, int(start_offset), int(step))
-                if not bars:
-                    break
-                df = pd.DataFrame(bars)
-                if df is None or df.empty:
-                    break
-                if "datetime" in df.columns:
-                    df = df.sort_values("datetime")
-                local_frames.append(df)
-
-                dt_col = pd.to_datetime(df["datetime"].astype(str).str.slice(0, 10), errors="coerce")
-                min_dt = dt_col.min()
-                if pd.isna(min_dt) or min_dt <= start_dt:
-                    break
-                start_offset += step
-                if start_offset > 20000:
-                    break
-
-            frames = local_frames
-            last_err = None
-            break
-        except Exception as e:
-            last_err = e
-            frames = []
+    start_offset = 0
+    try:
+        while True:
+            bars = pool.call("get_security_bars", 9, market, code, int(start_offset), int(step))
+            if not bars:
+                break
+            df = pd.DataFrame(bars)
+            if df is None or df.empty:
+                break
+            if "datetime" in df.columns:
+                df = df.sort_values("datetime")
+            frames.append(df)
+
+            dt_col = pd.to_datetime(df["datetime"].astype(str).str.slice(0, 10), errors="coerce")
+            min_dt = dt_col.min()
+            if pd.isna(min_dt) or min_dt <= start_dt:
+                break
+            start_offset += step
+            if start_offset > 20000:
+                break
+    except Exception as e:
+        raise RuntimeError(f"pytdx 拉取失败: code={code}, pool={pool.stats().get('endpoints')}") from e
 
     if not frames:
-        if last_err is not None:
-            raise RuntimeError(f"pytdx 拉取失败: code={code}, tried_endpoints={endpoints_tried[:10]}") from last_err
         return pd.DataFrame()
 
     out = pd.concat(frames, axis=0, ignore_index=True)
@@ -161,68 +164,61 @@ def _fetch_daily_bars(code: str, start_date: str, end_date: str) -> pd.DataFrame
     return out
 
 
-def _calc_proxy_concentration(df_daily: pd.DataFrame, window: int, smooth: int) -> pd.DataFrame:
-    df = df_daily.copy()
-    close = pd.to_numeric(df.get("close", np.nan), errors="coerce")
-    amount = pd.to_numeric(df.get("amount", np.nan), errors="coerce")
-    vol = pd.to_numeric(df.get("vol", np.nan), errors="coerce")
-
-    vwap_list: list[Optional[float]] = []
-    w_list: list[float] = []
-    for a, v, c in zip(amount.tolist(), vol.tolist(), close.tolist()):
-        vwap, w = _safe_vwap_and_volume_shares(a, v, c)
-        vwap_list.append(vwap)
-        w_list.append(w)
-    df["vwap"] = pd.to_numeric(pd.Series(vwap_list), errors="coerce")
-    df["vol_shares"] = pd.to_numeric(pd.Series(w_list), errors="coerce").fillna(0.0)
-
-    proxy_90: list[Optional[float]] = []
-    proxy_70: list[Optional[float]] = []
-    avg_cost: list[Optional[float]] = []
-    for i in range(len(df)):
-        j0 = max(0, i - window + 1)
-        sub = df.iloc[j0 : i + 1]
-        vals = sub["vwap"].to_numpy(dtype=float)
-        wts = sub["vol_shares"].to_numpy(dtype=float)
-        mask = np.isfinite(vals) & np.isfinite(wts) & (wts > 0)
-        vals = vals[mask]
-        wts = wts[mask]
-        if len(vals) < max(10, window // 3):
-            proxy_90.append(None)
-            proxy_70.append(None)
-            avg_cost.append(None)
-            continue
-
-        w_mean = float(np.sum(vals * wts) / np.sum(wts))
-        q05 = _weighted_quantile(vals, wts, 0.05)
-        q95 = _weighted_quantile(vals, wts, 0.95)
-        q15 = _weighted_quantile(vals, wts, 0.15)
-        q85 = _weighted_quantile(vals, wts, 0.85)
-        avg_cost.append(w_mean)
-        proxy_90.append((q95 - q05) / w_mean if w_mean > 0 else None)
-        proxy_70.append((q85 - q15) / w_mean if w_mean > 0 else None)
-
-    df["proxy_avg_cost"] = avg_cost
-    df["proxy_90_concentration"] = proxy_90
-    df["proxy_70_concentration"] = proxy_70
+def calc_proxy_concentration_arrays(
+    close: np.ndarray,
+    amount: np.ndarray,
+    vol: np.ndarray,
+    window: int,
+    smooth: int,
+) -> dict[str, np.ndarray]:
+    """
+    筹码集中度代理的数组版本，输入为 1-D（单只股票）或 2-D（日期 × 股票）的收盘价/成交额/成交量，
+    可直接喂入 utils.bar_store.load_panel 的面板以一次算完全市场。
+    """
+    vwap, shares = _vwap_and_volume_shares(amount, vol, close)
+    qs, w_mean = rolling_weighted_quantiles(
+        vwap,
+        shares,
+        window=int(window),
+        qs=(0.05, 0.15, 0.85, 0.95),
+        min_count=max(10, int(window) // 3),
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pos = w_mean > 0
+        proxy_90 = np.where(pos, (qs[0.95] - qs[0.05]) / np.where(pos, w_mean, 1.0), np.nan)
+        proxy_70 = np.where(pos, (qs[0.85] - qs[0.15]) / np.where(pos, w_mean, 1.0), np.nan)
 
     smooth_n = max(1, int(smooth))
-    df["proxy_90_concentration_smooth"] = (
-        pd.to_numeric(df["proxy_90_concentration"], errors="coerce").rolling(smooth_n, min_periods=1).mean()
-    )
-    df["proxy_70_concentration_smooth"] = (
-        pd.to_numeric(df["proxy_70_concentration"], errors="coerce").rolling(smooth_n, min_periods=1).mean()
+
+    def _smooth(a: np.ndarray) -> np.ndarray:
+        return pd.DataFrame(a).rolling(smooth_n, min_periods=1).mean().to_numpy().reshape(a.shape)
+
+    return {
+        "proxy_avg_cost": w_mean,
+        "proxy_90_concentration": proxy_90,
+        "proxy_70_concentration": proxy_70,
+        "proxy_90_concentration_smooth": _smooth(proxy_90),
+        "proxy_70_concentration_smooth": _smooth(proxy_70),
+    }
+
+
+def _calc_proxy_concentration(df_daily: pd.DataFrame, window: int, smooth: int) -> pd.DataFrame:
+    close = pd.to_numeric(df_daily.get("close", np.nan), errors="coerce")
+    amount = pd.to_numeric(df_daily.get("amount", np.nan), errors="coerce")
+    vol = pd.to_numeric(df_daily.get("vol", np.nan), errors="coerce")
+    n = len(df_daily)
+
+    res = calc_proxy_concentration_arrays(
+        np.broadcast_to(np.asarray(close, dtype=float), (n,)),
+        np.broadcast_to(np.asarray(amount, dtype=float), (n,)),
+        np.broadcast_to(np.asarray(vol, dtype=float), (n,)),
+        window=window,
+        smooth=smooth,
     )
-    return df[
-        [
-            "date",
-            "proxy_avg_cost",
-            "proxy_90_concentration",
-            "proxy_70_concentration",
-            "proxy_90_concentration_smooth",
-            "proxy_70_concentration_smooth",
-        ]
-    ].copy()
+    out = pd.DataFrame({"date": df_daily["date"].to_numpy()})
+    for k, v in res.items():
+        out[k] = v
+    return out
 
 
 @dataclass(frozen=True)
@@ -238,6 +234,10 @@ def get_chip_concentration_proxy(
     params: ChipProxyParams | None = None,
     as_df: bool = False,
 ) -> list[dict] | pd.DataFrame:
+    """
+    任意日期区间的集中度，每次按区间拉日线完整重算；不读写持久化的 ChipProxyState
+    （滚动状态只覆盖最近一个窗口，供 update_chip_proxy_states 夜间增量任务使用）
+    """
     p = params or ChipProxyParams()
     df_daily = _fetch_daily_bars(code=code, start_date=start_date, end_date=end_date)
     if df_daily.empty:
@@ -261,6 +261,216 @@ def get_chip_concentration_proxy(
     return out_df.to_dict(orient="records")
 
 
+# 增量拉取的上限（根）；状态落后更多时放弃折叠，按 history_days 重新初始化
+CHIP_PROXY_MAX_INCREMENTAL_BARS = 800
+
+CHIP_PROXY_STATE_DIR = os.getenv(
+    "CHIP_PROXY_STATE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "chip_proxy_state"),
+)
+
+
+@dataclass
+class ChipProxyState:
+    """
+    单只股票的滚动状态：最近 window 个 (VWAP, 成交股数) 以及最近 smooth 个未平滑的集中度，
+    足以在不回看历史的情况下折叠进新的一根日线。
+    """
+
+    code: str
+    window: int
+    smooth: int
+    last_date: str = ""
+    vwap: list[float] = field(default_factory=list)
+    shares: list[float] = field(default_factory=list)
+    proxy_90: list[float] = field(default_factory=list)
+    proxy_70: list[float] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        def _f(xs: list[float]) -> list[Optional[float]]:
+            return [None if not np.isfinite(x) else float(x) for x in xs]
+
+        return {
+            "code": self.code,
+            "window": self.window,
+            "smooth": self.smooth,
+            "last_date": self.last_date,
+            "vwap": _f(self.vwap),
+            "shares": _f(self.shares),
+            "proxy_90": _f(self.proxy_90),
+            "proxy_70": _f(self.proxy_70),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ChipProxyState":
+        def _f(xs) -> list[float]:
+            return [np.nan if x is None else float(x) for x in (xs or [])]
+
+        return cls(
+            code=str(data.get("code") or ""),
+            window=int(data.get("window") or 60),
+            smooth=int(data.get("smooth") or 5),
+            last_date=str(data.get("last_date") or ""),
+            vwap=_f(data.get("vwap")),
+            shares=_f(data.get("shares")),
+            proxy_90=_f(data.get("proxy_90")),
+            proxy_70=_f(data.get("proxy_70")),
+        )
+
+
+def _state_path(code: str, params: ChipProxyParams) -> str:
+    return os.path.join(CHIP_PROXY_STATE_DIR, f"w{int(params.window)}_s{int(params.smooth)}", f"{str(code).zfill(6)}.json")
+
+
+def load_chip_proxy_state(code: str, params: ChipProxyParams | None = None) -> Optional[ChipProxyState]:
+    p = params or ChipProxyParams()
+    path = _state_path(code, p)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return ChipProxyState.from_dict(json.load(f))
+    except Exception:
+        return None
+
+
+def save_chip_proxy_state(state: ChipProxyState) -> None:
+    path = _state_path(state.code, ChipProxyParams(window=state.window, smooth=state.smooth))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state.to_dict(), f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def init_chip_proxy_state(code: str, df_daily: pd.DataFrame, params: ChipProxyParams | None = None) -> tuple[ChipProxyState, pd.DataFrame]:
+    """用完整历史计算一次集中度，并从末尾截取滚动状态。"""
+    p = params or ChipProxyParams()
+    out_df = _calc_proxy_concentration(df_daily, window=int(p.window), smooth=int(p.smooth))
+    vwap, shares = _vwap_and_volume_shares(
+        pd.to_numeric(df_daily["amount"], errors="coerce").to_numpy(dtype=float),
+        pd.to_numeric(df_daily["vol"], errors="coerce").to_numpy(dtype=float),
+        pd.to_numeric(df_daily["close"], errors="coerce").to_numpy(dtype=float),
+    )
+    w = int(p.window)
+    sm = max(1, int(p.smooth))
+    last_date = pd.to_datetime(df_daily["date"].iloc[-1]).strftime("%Y-%m-%d") if len(df_daily) else ""
+    state = ChipProxyState(
+        code=str(code).zfill(6),
+        window=w,
+        smooth=sm,
+        last_date=last_date,
+        vwap=[float(x) for x in vwap[-w:]],
+        shares=[float(x) for x in shares[-w:]],
+        proxy_90=[float(x) for x in out_df["proxy_90_concentration"].to_numpy(dtype=float)[-sm:]],
+        proxy_70=[float(x) for x in out_df["proxy_70_concentration"].to_numpy(dtype=float)[-sm:]],
+    )
+    return state, out_df
+
+
+def fold_chip_proxy_bar(
+    state: ChipProxyState, date: str, close: float, amount: float, vol: float, replace_last: bool = False
+) -> dict:
+    """
+    把一根新日线折叠进状态，返回当日的集中度记录；只处理 window 个样本，与历史长度无关。
+    replace_last=True 时用这根 K 线替换上次折叠的最后一根（盘中折叠过、收盘后数据变了）：
+    以该日为终点的窗口正好是状态里除最后一个外的样本加上新样本，所以先弹出最后一个再折叠即可。
+    """
+    if replace_last:
+        for xs in (state.vwap, state.shares, state.proxy_90, state.proxy_70):
+            if xs:
+                xs.pop()
+    vwap, shares = _vwap_and_volume_shares(np.array([amount], dtype=float), np.array([vol], dtype=float), np.array([close], dtype=float))
+    state.vwap = (state.vwap + [float(vwap[0])])[-state.window :]
+    state.shares = (state.shares + [float(shares[0])])[-state.window :]
+
+    qs, w_mean = rolling_weighted_quantiles(
+        np.asarray(state.vwap, dtype=float),
+        np.asarray(state.shares, dtype=float),
+        window=state.window,
+        qs=(0.05, 0.15, 0.85, 0.95),
+        min_count=max(10, state.window // 3),
+    )
+    avg_cost = float(w_mean[-1])
+    if np.isfinite(avg_cost) and avg_cost > 0:
+        p90 = float((qs[0.95][-1] - qs[0.05][-1]) / avg_cost)
+        p70 = float((qs[0.85][-1] - qs[0.15][-1]) / avg_cost)
+    else:
+        p90 = np.nan
+        p70 = np.nan
+
+    state.proxy_90 = (state.proxy_90 + [p90])[-state.smooth :]
+    state.proxy_70 = (state.proxy_70 + [p70])[-state.smooth :]
+    state.last_date = str(date)
+
+    def _nanmean(xs: list[float]) -> float:
+        a = np.asarray(xs, dtype=float)
+        a = a[np.isfinite(a)]
+        return float(a.mean()) if a.size else np.nan
+
+    return {
+        "date": str(date),
+        "proxy_avg_cost": avg_cost,
+        "proxy_90_concentration": p90,
+        "proxy_70_concentration": p70,
+        "proxy_90_concentration_smooth": _nanmean(state.proxy_90),
+        "proxy_70_concentration_smooth": _nanmean(state.proxy_70),
+    }
+
+
+def update_chip_proxy_states(
+    codes: Iterable[str],
+    params: ChipProxyParams | None = None,
+    history_days: int = 365,
+    workers: Optional[int] = None,
+) -> dict[str, list[dict]]:
+    """
+    晚间增量任务：已有状态的股票从 last_date 当天起拉取日线并逐根折叠，last_date 那根重新折叠覆盖；
+    没有状态或状态落后超过 CHIP_PROXY_MAX_INCREMENTAL_BARS 的股票拉取 history_days 的历史重新初始化。
+    返回 {code: 新增记录列表}。
+    """
+    p = params or ChipProxyParams()
+    today = datetime.date.today()
+    states: dict[str, Optional[ChipProxyState]] = {}
+    groups: dict[int, list[tuple[int, str]]] = {}
+    for code in codes:
+        code = str(code).zfill(6)
+        st = load_chip_proxy_state(code, p)
+        count = 0
+        if st is not None and st.last_date:
+            days = max(0, (today - datetime.date.fromisoformat(st.last_date)).days)
+            count = days + 2
+            if count > CHIP_PROXY_MAX_INCREMENTAL_BARS:
+                # 拉回的 K 线到不了 last_date，逐根折叠会在断档上续算，只能重建
+                st = None
+        states[code] = st
+        if st is None or not st.last_date:
+            count = min(CHIP_PROXY_MAX_INCREMENTAL_BARS, max(int(p.window) + int(p.smooth), int(history_days)))
+        groups.setdefault(count, []).append((_infer_market(code), code))
+
+    out: dict[str, list[dict]] = {}
+    for count, symbols in sorted(groups.items()):
+        frames = get_bars_many(symbols, category=9, count=count, as_dict=True, workers=workers)
+        for (_, code), df in frames.items():
+            df = df.copy()
+            df["date"] = pd.to_datetime(df["datetime"].dt.strftime("%Y-%m-%d"))
+            df = df.drop_duplicates(subset=["date"], keep="last").reset_index(drop=True)
+            st = states.get(code)
+            if st is None or not st.last_date:
+                st, out_df = init_chip_proxy_state(code, df, p)
+                rows = out_df.assign(date=out_df["date"].dt.strftime("%Y-%m-%d")).to_dict(orient="records")
+            else:
+                new_bars = df[df["date"] >= pd.to_datetime(st.last_date)]
+                rows = []
+                for d, c, a, v in zip(new_bars["date"], new_bars["close"], new_bars["amount"], new_bars["vol"]):
+                    day = d.strftime("%Y-%m-%d")
+                    rows.append(fold_chip_proxy_bar(st, day, c, a, v, replace_last=(day == st.last_date)))
+            if rows:
+                save_chip_proxy_state(st)
+                out[code] = rows
+    return out
+
+
 def _parse_args(argv: Iterable[str]) -> dict:
     args = list(argv)
     if len(args) < 4:
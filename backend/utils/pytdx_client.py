@@ -5,10 +5,14 @@ import os
 import socket
 import threading
 import time
+from contextlib import contextmanager
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Optional, Tuple, List, Dict, Any
 
 from pytdx.hq import TdxHq_API
+
+from core.upstream_limits import upstream_slot
+
 # [{'rank': 1, 'ip': '180.153.18.170', 'port': 7709, 'tcp_elapsed_s': 0.027932791000000012, 'confirm_ok': True, 'confirm_elapsed_s': 0.16914895799999985}, {'rank': 2, 'ip': '115.238.56.198', 'port': 7709, 'tcp_elapsed_s': 0.028577917000000064, 'confirm_ok': True, 'confirm_elapsed_s': 0.16183091699999985}, {'rank': 3, 'ip': '115.238.90.165', 'port': 7709, 'tcp_elapsed_s': 0.029971000000000025, 'confirm_ok': True, 'confirm_elapsed_s': 0.191138708}]
 DEFAULT_IP = "115.238.90.165"
 DEFAULT_PORT = 7709
@@ -20,6 +24,10 @@ AUTO_SELECT_MAX_CANDIDATES = int(os.getenv("PYTDX_AUTO_SELECT_MAX_CANDIDATES", "
 AUTO_SELECT_WORKERS = int(os.getenv("PYTDX_AUTO_SELECT_WORKERS", "20"))
 AUTO_SELECT_CONFIRM_TOP_N = int(os.getenv("PYTDX_AUTO_SELECT_CONFIRM_TOP_N", "3"))
 
+POOL_SIZE = int(os.getenv("PYTDX_POOL_SIZE", "0"))
+POOL_CHECKOUT_TIMEOUT_SECONDS = float(os.getenv("PYTDX_POOL_CHECKOUT_TIMEOUT_SECONDS", "30"))
+POOL_HEALTHCHECK_INTERVAL_SECONDS = float(os.getenv("PYTDX_POOL_HEALTHCHECK_INTERVAL_SECONDS", "60"))
+
 _lock = threading.Lock()
 _api_instance: Optional[TdxHq_API] = None
 _connected_endpoint: Optional[Tuple[str, int]] = None
@@ -425,7 +433,341 @@ def reset_api() -> None:
         _api_instance = None
 
 
+class _PooledConn:
+    __slots__ = ("api", "endpoint", "checked_at")
+
+    def __init__(self, api: TdxHq_API, endpoint: Tuple[str, int]):
+        self.api = api
+        self.endpoint = endpoint
+        self.checked_at = _now_ts()
+
+
+class TdxConnectionPool:
+    """
+    固定上限的 TdxHq_API 连接池，连接按轮询分散在 best_endpoints_top_n 排名靠前的端点上。
+    每个连接同一时刻只被一个线程持有（checkout/checkin），因此可以在线程池中并发调用。
+    """
+
+    def __init__(self, size: int, ip: str = DEFAULT_IP, port: int = DEFAULT_PORT, endpoints: Optional[List[Tuple[str, int]]] = None):
+        self._size = max(1, int(size))
+        self._primary = (str(ip), int(port))
+        self._endpoints: List[Tuple[str, int]] = [(str(e[0]), int(e[1])) for e in (endpoints or [])]
+        self._next_ep = 0
+        self._idle: List[_PooledConn] = []
+        self._created = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats = {"opened": 0, "reopened": 0, "broken": 0, "health_failed": 0, "wait_timeouts": 0}
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def grow(self, size: int) -> None:
+        """把连接上限扩大到 size；只增不减，正在借出的连接不受影响"""
+        with self._cond:
+            if int(size) > self._size:
+                self._size = int(size)
+                self._cond.notify_all()
+
+    def _resolve_endpoints(self) -> List[Tuple[str, int]]:
+        with self._cond:
+            if self._endpoints:
+                return list(self._endpoints)
+        eps: List[Tuple[str, int]] = []
+        try:
+            ranked = best_endpoints_top_n(self._primary[0], self._primary[1], top_n=self._size, confirm=False)
+            eps = [(str(r["ip"]), int(r["port"])) for r in ranked]
+        except Exception:
+            eps = []
+        if self._primary not in eps:
+            eps.append(self._primary)
+        with self._cond:
+            if not self._endpoints:
+                self._endpoints = eps
+            return list(self._endpoints)
+
+    def _open(self) -> _PooledConn:
+        eps = self._resolve_endpoints()
+        tried: List[Tuple[str, int]] = []
+        for _ in range(len(eps)):
+            with self._cond:
+                ep = eps[self._next_ep % len(eps)]
+                self._next_ep += 1
+            tried.append(ep)
+            api_ = _try_connect_once(ep[0], ep[1])
+            if api_ is not None:
+                with self._cond:
+                    self._stats["opened"] += 1
+                return _PooledConn(api_, ep)
+        raise RuntimeError(f"TdxConnectionPool 无可用端点: tried={tried}")
+
+    @staticmethod
+    def _drop(conn: _PooledConn) -> None:
+        try:
+            conn.api.disconnect()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn: _PooledConn) -> bool:
+        if (_now_ts() - conn.checked_at) < POOL_HEALTHCHECK_INTERVAL_SECONDS:
+            return True
+        try:
+            ok = int(conn.api.get_security_count(0) or 0) > 0
+        except Exception:
+            ok = False
+        if ok:
+            conn.checked_at = _now_ts()
+        return ok
+
+    def checkout(self, timeout: Optional[float] = None, avoid: Optional[_PooledConn] = None) -> _PooledConn:
+        """借出一个连接；avoid 指定时优先用别的空闲连接或新开一个，实在没有才复用它"""
+        wait_s = POOL_CHECKOUT_TIMEOUT_SECONDS if timeout is None else float(timeout)
+        deadline = _now_ts() + max(0.0, wait_s)
+        conn: Optional[_PooledConn] = None
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("TdxConnectionPool 已关闭")
+                others = [i for i, c in enumerate(self._idle) if c is not avoid]
+                if others:
+                    conn = self._idle.pop(others[-1])
+                    break
+                if self._created < self._size:
+                    self._created += 1
+                    break
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                remaining = deadline - _now_ts()
+                if remaining <= 0:
+                    self._stats["wait_timeouts"] += 1
+                    raise TimeoutError(f"TdxConnectionPool checkout 超时: size={self._size}, timeout={wait_s}s")
+                self._cond.wait(remaining)
+
+        if conn is not None and self._is_healthy(conn):
+            return conn
+        if conn is not None:
+            self._drop(conn)
+            with self._cond:
+                self._stats["health_failed"] += 1
+                self._stats["reopened"] += 1
+        try:
+            return self._open()
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def checkin(self, conn: _PooledConn, broken: bool = False) -> None:
+        with self._cond:
+            keep = (not broken) and (not self._closed)
+            if keep:
+                self._idle.append(conn)
+            else:
+                self._created -= 1
+                if broken:
+                    self._stats["broken"] += 1
+            self._cond.notify()
+        if not keep:
+            self._drop(conn)
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        conn = self.checkout(timeout=timeout)
+        broken = False
+        try:
+            yield conn.api
+        except Exception:
+            broken = True
+            raise
+        finally:
+            self.checkin(conn, broken=broken)
+
+    def call(self, method_name: str, *args, **kwargs):
+        with upstream_slot("pytdx"):
+            return self._call(method_name, *args, **kwargs)
+
+    def _call(self, method_name: str, *args, **kwargs):
+        last_exc: Optional[BaseException] = None
+        last_result: Any = None
+        prev: Optional[_PooledConn] = None
+        for attempt in range(2):
+            conn = self.checkout(avoid=prev)
+            try:
+                res = getattr(conn.api, method_name)(*args, **kwargs)
+            except Exception as e:
+                self.checkin(conn, broken=True)
+                last_exc = e
+                continue
+            if attempt == 0 and _should_failover_empty(str(method_name), args, res):
+                # 空结果多半是停牌/退市/越界，连接本身没问题：正常归还，换一个连接（可能是另一个端点）再试一次
+                self.checkin(conn)
+                last_result = res
+                prev = conn
+                continue
+            conn.checked_at = _now_ts()
+            self.checkin(conn)
+            return res
+        if last_exc is not None:
+            raise last_exc
+        return last_result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "size": self._size,
+                "created": self._created,
+                "idle": len(self._idle),
+                "endpoints": list(self._endpoints),
+                **self._stats,
+            }
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._created -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._drop(conn)
+
+
+_pool_lock = threading.Lock()
+_pools: Dict[Tuple[str, int], TdxConnectionPool] = {}
+
+
+def get_pool(size: Optional[int] = None, ip: str = DEFAULT_IP, port: int = DEFAULT_PORT) -> TdxConnectionPool:
+    """
+    按 (ip, port) 取共享连接池。已存在时不替换：传入更大的 size 只会扩容，
+    其它线程手里借出的连接不会被关闭
+    """
+    want = int(size) if size is not None else (POOL_SIZE if POOL_SIZE > 0 else 4)
+    key = (str(ip), int(port))
+    with _pool_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = TdxConnectionPool(want, ip=key[0], port=key[1])
+            _pools[key] = pool
+            return pool
+    if size is not None:
+        pool.grow(want)
+    return pool
+
+
+def close_pool() -> None:
+    """关闭所有连接池：空闲连接立即断开，借出中的连接在归还时断开"""
+    with _pool_lock:
+        old = list(_pools.values())
+        _pools.clear()
+    for pool in old:
+        pool.close()
+
+
+BARS_PAGE_SIZE = 800
+_BAR_NUMERIC_COLUMNS = ("open", "close", "high", "low", "vol", "amount")
+
+
+def _fetch_bars_paged(pool: TdxConnectionPool, category: int, market: int, code: str, count: int) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    start = 0
+    remaining = max(0, int(count))
+    while remaining > 0:
+        n = min(BARS_PAGE_SIZE, remaining)
+        bars = pool.call("get_security_bars", int(category), int(market), str(code), int(start), int(n))
+        if not bars:
+            break
+        out = list(bars) + out
+        if len(bars) < n:
+            break
+        start += n
+        remaining -= n
+    return out
+
+
+def _bars_to_frame(bars: List[Dict[str, Any]], market: int, code: str):
+    import pandas as pd
+
+    df = pd.DataFrame(bars)
+    if df.empty:
+        return df
+    df = df.drop(columns=[c for c in ("year", "month", "day", "hour", "minute") if c in df.columns])
+    df["datetime"] = pd.to_datetime(df["datetime"], errors="coerce")
+    for c in _BAR_NUMERIC_COLUMNS:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce").astype("float64")
+    df = df.dropna(subset=["datetime"]).drop_duplicates(subset=["datetime"], keep="last")
+    df = df.sort_values("datetime").reset_index(drop=True)
+    df.insert(0, "code", str(code))
+    df.insert(0, "market", int(market))
+    head = ["market", "code", "datetime"]
+    return df[head + [c for c in df.columns if c not in head]]
+
+
+def get_bars_many(
+    symbols: List[Tuple[int, str]],
+    category: int = 9,
+    count: int = 800,
+    as_dict: bool = False,
+    workers: Optional[int] = None,
+    pool: Optional[TdxConnectionPool] = None,
+    errors: Optional[Dict[Tuple[int, str], str]] = None,
+):
+    """
+    批量拉取多只股票的 K 线。请求分散到连接池的各个连接上并发执行，
+    count 超过单次上限 (800) 时自动分页。
+
+    返回:
+        as_dict=False: 长表 DataFrame，列为 market, code, datetime, open, close, high, low, vol, amount
+        as_dict=True: {(market, code): DataFrame}
+    失败或无数据的股票会被跳过；传入 errors 字典可收集 {(market, code): reason}。
+    """
+    import pandas as pd
+
+    pool = pool or get_pool()
+    keys: List[Tuple[int, str]] = []
+    seen: set[Tuple[int, str]] = set()
+    for market, code in symbols:
+        key = (int(market), str(code).zfill(6))
+        if key not in seen:
+            seen.add(key)
+            keys.append(key)
+
+    frames: Dict[Tuple[int, str], Any] = {}
+
+    def _one(key: Tuple[int, str]):
+        bars = _fetch_bars_paged(pool, category, key[0], key[1], count)
+        return _bars_to_frame(bars, key[0], key[1]) if bars else None
+
+    n_workers = max(1, int(workers or pool.size))
+    with ThreadPoolExecutor(max_workers=n_workers) as ex:
+        fut_map = {ex.submit(_one, key): key for key in keys}
+        for fut in as_completed(fut_map):
+            key = fut_map[fut]
+            try:
+                df = fut.result()
+            except Exception as e:
+                if errors is not None:
+                    errors[key] = f"{type(e).__name__}:{e}"
+                continue
+            if df is None or df.empty:
+                if errors is not None:
+                    errors[key] = "bars_empty"
+                continue
+            frames[key] = df
+
+    if as_dict:
+        return {key: frames[key] for key in keys if key in frames}
+    ordered = [frames[key] for key in keys if key in frames]
+    if not ordered:
+        return pd.DataFrame(columns=["market", "code", "datetime", *_BAR_NUMERIC_COLUMNS])
+    return pd.concat(ordered, axis=0, ignore_index=True)
+
+
 atexit.register(disconnect)
+atexit.register(close_pool)
 
 api = get_api()
 
@@ -435,12 +777,39 @@ class _AutoTdxHq:
         self._ip = ip
         self._port = port
         self._entered = False
+        self._pool: Optional[TdxConnectionPool] = None
 
     def configure(self, ip: str = DEFAULT_IP, port: int = DEFAULT_PORT) -> "_AutoTdxHq":
         self._ip = ip
         self._port = port
         return self
 
+    def enable_pool(self, size: Optional[int] = None) -> "_AutoTdxHq":
+        """开启连接池模式：get_security_bars 等调用走连接池，可在多线程中并发调用。"""
+        self._pool = get_pool(size, ip=self._ip, port=self._port)
+        return self
+
+    def disable_pool(self) -> "_AutoTdxHq":
+        self._pool = None
+        return self
+
+    @property
+    def pool(self) -> Optional[TdxConnectionPool]:
+        return self._pool
+
+    def get_bars_many(
+        self,
+        symbols: List[Tuple[int, str]],
+        category: int = 9,
+        count: int = 800,
+        as_dict: bool = False,
+        workers: Optional[int] = None,
+        errors: Optional[Dict[Tuple[int, str], str]] = None,
+    ):
+        """批量 K 线，见模块级 get_bars_many；未开启连接池时使用默认连接池。"""
+        pool = self._pool or get_pool(ip=self._ip, port=self._port)
+        return get_bars_many(symbols, category=category, count=count, as_dict=as_dict, workers=workers, pool=pool, errors=errors)
+
     def _switch_to_best_endpoint(self) -> Optional[Tuple[str, int]]:
         primary = (str(self._ip), int(self._port))
         best = _select_best_endpoint_fast(primary) if AUTO_SELECT_IP_ON_FAIL else None
@@ -475,6 +844,9 @@ class _AutoTdxHq:
         return last_result
 
     def __getattr__(self, name: str):
+        pool = self.__dict__.get("_pool")
+        if pool is not None and str(name) in {"get_security_bars", "get_security_list", "get_security_count"}:
+            return lambda *args, **kwargs: pool.call(str(name), *args, **kwargs)
         api = connect(self._ip, self._port)
         attr = getattr(api, name)
         if callable(attr) and str(name) in {"get_security_bars", "get_security_list", "get_security_count"}:
@@ -505,6 +877,8 @@ class _AutoTdxHq:
 
 
 tdx = _AutoTdxHq()
+if POOL_SIZE > 0:
+    tdx.enable_pool(POOL_SIZE)
 
 __all__ = [
     "DEFAULT_IP",
@@ -518,6 +892,10 @@ __all__ = [
     "connected_endpoint",
     "reset_api",
     "get_api",
+    "get_pool",
+    "close_pool",
+    "get_bars_many",
+    "TdxConnectionPool",
     "tdx",
 ]
 
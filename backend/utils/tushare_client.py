@@ -1,9 +1,15 @@
 import argparse
+import json
 import os
 import time
 
 import tushare as ts
 
+from core.single_flight import SingleFlight
+from core.upstream_limits import upstream_slot
+
+_query_flight = SingleFlight()
+
 
 def _wrap_query_with_failover(pro, urls, failover_on_empty: bool):
     orig_query = pro.query
@@ -43,6 +49,25 @@ def _wrap_query_with_failover(pro, urls, failover_on_empty: bool):
     pro.query = query
 
 
+def _wrap_query_with_single_flight(pro):
+    """
+    合并并发的相同查询：同一 (api_name, fields, 参数) 在途时，其余调用等待并共享结果。
+    每个调用方拿到独立的 DataFrame 副本
+    """
+    orig_query = pro.query
+
+    def limited_query(api_name, fields="", **kwargs):
+        with upstream_slot("tushare"):
+            return orig_query(api_name, fields=fields, **kwargs)
+
+    def query(api_name, fields="", **kwargs):
+        key = (str(api_name), str(fields or ""), json.dumps(kwargs, sort_keys=True, ensure_ascii=False, default=str))
+        res = _query_flight.do(key, limited_query, api_name, fields=fields, **kwargs)
+        return res.copy() if hasattr(res, "copy") else res
+
+    pro.query = query
+
+
 try:
     try:
         from dotenv import load_dotenv
@@ -60,7 +85,8 @@ try:
     except Exception:
         pass
     failover_on_empty = str(os.getenv("TUSHARE_FAILOVER_ON_EMPTY", "0")).strip() in ("1", "true", "True", "yes", "YES")
-    
+    _wrap_query_with_single_flight(pro)
+
     print("Tushare client initialized successfully with custom config.")
 except Exception as e:
     print(f"Warning: Tushare initialization failed: {e}")
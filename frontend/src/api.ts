@@ -1,5 +1,5 @@
 import axios from 'axios';
-import type { Stock, StockPricePoint, AIConfig, Log, IndicatorDefinition, AIConfigTestRequest, AIConfigTestResponse, StockTestRunResponse, EmailConfig, GlobalPromptConfig, AlertRateLimitConfig, IndicatorTestRequest, IndicatorTestResponse, ResearchScript, ResearchRunResponse, RuleScript, RuleTestPayload, RuleTestResponse, StockAIWatchConfig, AIWatchAnalyzeRequest, AIWatchAnalyzeResponse, IndicatorPreviewResponse, StockNews, SentimentAnalysis } from './types';
+import type { Stock, StockPricePoint, AIConfig, Log, LogSummary, IndicatorDefinition, AIConfigTestRequest, AIConfigTestResponse, StockTestRunResponse, EmailConfig, GlobalPromptConfig, AlertRateLimitConfig, IndicatorTestRequest, IndicatorTestResponse, ResearchScript, ResearchRunResponse, RuleScript, RuleTestPayload, RuleTestResponse, StockAIWatchConfig, AIWatchAnalyzeRequest, AIWatchAnalyzeResponse, IndicatorPreviewResponse, StockNews, SentimentAnalysis } from './types';
 
 const API_URL = 'http://localhost:8000';
 
@@ -36,12 +36,12 @@ export const getStockHistory = (symbol: string, period: string = 'daily') =>
 export const getIndicators = () => api.get<IndicatorDefinition[]>('/indicators/');
 export const createIndicator = (
   indicator: Pick<IndicatorDefinition, 'name'> &
-    Partial<Pick<IndicatorDefinition, 'python_code' | 'is_pinned'>>,
+    Partial<Pick<IndicatorDefinition, 'python_code' | 'is_pinned' | 'cache_ttl_seconds' | 'priority'>>,
 ) =>
   api.post<IndicatorDefinition>('/indicators/', indicator);
 export const updateIndicator = (
   id: number,
-  indicator: Partial<Pick<IndicatorDefinition, 'name' | 'python_code' | 'is_pinned'>>,
+  indicator: Partial<Pick<IndicatorDefinition, 'name' | 'python_code' | 'is_pinned' | 'cache_ttl_seconds' | 'priority'>>,
 ) =>
   api.put<IndicatorDefinition>(`/indicators/${id}`, indicator);
 export const deleteIndicator = (id: number) => api.delete(`/indicators/${id}`);
@@ -55,7 +55,12 @@ export const deleteAIConfig = (id: number) => api.delete(`/ai-configs/${id}`);
 export const testAIConfig = (id: number, payload: AIConfigTestRequest) =>
   api.post<AIConfigTestResponse>(`/ai-configs/${id}/test`, payload);
 
-export const getLogs = (stockId?: number) => api.get<Log[]>('/logs/', { params: { stock_id: stockId } });
+export const getLogs = (params?: { stockId?: number; limit?: number; beforeId?: number }) =>
+  api.get<LogSummary[]>('/logs/', {
+    params: { stock_id: params?.stockId, limit: params?.limit, before_id: params?.beforeId },
+  });
+export const getLog = (logId: number) => api.get<Log>(`/logs/${logId}`);
+export const getLogsCount = (stockId?: number) => api.get<{ total: number }>('/logs/count', { params: { stock_id: stockId } });
 export const clearLogs = (logIds?: number[]) => api.delete('/logs/', { data: logIds });
 
 export const getEmailConfig = () => api.get<EmailConfig>('/settings/email');
@@ -118,7 +118,7 @@ const AISettings: React.FC = () => {
     { title: '厂商', dataIndex: 'provider', key: 'provider' },
     { title: '模型', dataIndex: 'model_name', key: 'model_name' },
     { title: '温度', dataIndex: 'temperature', key: 'temperature', render: (val) => val ?? 0.1 },
-    { title: '上下文限制', dataIndex: 'max_tokens', key: 'max_tokens', render: (val) => val ? `${val.toLocaleString()} chars` : '-' },
+    { title: '上下文限制', dataIndex: 'max_tokens', key: 'max_tokens', render: (val) => val ? `${val.toLocaleString()} tokens` : '-' },
     { 
       title: '操作', 
       key: 'action',
@@ -177,8 +177,8 @@ const AISettings: React.FC = () => {
             name="max_tokens" 
             label={
               <span>
-                最大上下文限制 (字符数) 
-                <Tooltip title="通常 1 Token ≈ 3~4 字符。DeepSeek-V3 160K Token 约等于 500,000 字符。默认 100,000 以平衡成本与性能。">
+                最大上下文限制 (Token 数) 
+                <Tooltip title="发送给 AI 的指标数据的 token 预算。超出时表格数据保留最近的行，并按指标优先级先丢弃低优先级指标。默认 100,000 以平衡成本与性能。">
                   <InfoCircleOutlined style={{ marginLeft: 4 }} />
                 </Tooltip>
               </span>
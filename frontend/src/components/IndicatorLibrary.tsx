@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from 'react';
-import { Button, Form, Input, Modal, Table, message, Space, Tag, Tooltip, Typography } from 'antd';
+import { Button, Form, Input, InputNumber, Modal, Table, message, Space, Tag, Tooltip, Typography } from 'antd';
 import { DeleteOutlined, EditOutlined, CodeOutlined, PlayCircleOutlined, PushpinOutlined, PushpinFilled } from '@ant-design/icons';
 import type { IndicatorDefinition, IndicatorTestResponse } from '../types';
 import { createIndicator, deleteIndicator, getIndicators, testIndicator, updateIndicator } from '../api';
@@ -14,6 +14,8 @@ import 'prismjs/themes/prism.css';
 type IndicatorCreateFormValues = {
   name: string;
   python_code?: string | null;
+  cache_ttl_seconds?: number | null;
+  priority?: number | null;
 };
 
 const IndicatorLibrary: React.FC = () => {
@@ -63,6 +65,8 @@ const IndicatorLibrary: React.FC = () => {
       const payload: IndicatorCreateFormValues = {
         name: values.name,
         python_code: values.python_code || '',
+        cache_ttl_seconds: values.cache_ttl_seconds ?? null,
+        priority: values.priority ?? 0,
       };
       if (editingId) {
         await updateIndicator(editingId, payload);
@@ -85,6 +89,8 @@ const IndicatorLibrary: React.FC = () => {
     form.setFieldsValue({
       name: record.name,
       python_code: record.python_code || '',
+      cache_ttl_seconds: record.cache_ttl_seconds ?? null,
+      priority: record.priority ?? 0,
     });
     setOpen(true);
   };
@@ -290,6 +296,22 @@ const IndicatorLibrary: React.FC = () => {
           >
             <PythonEditor />
           </Form.Item>
+
+          <Form.Item
+            name="cache_ttl_seconds"
+            label="数据缓存秒数"
+            help="脚本中 ak.* 调用结果在该时间内跨股票复用；留空使用默认值，0 表示不缓存。"
+          >
+            <InputNumber min={0} precision={0} placeholder="默认" style={{ width: 200 }} />
+          </Form.Item>
+
+          <Form.Item
+            name="priority"
+            label="上下文优先级"
+            help="发送给 AI 的数据超出 token 预算时，优先级低的指标先被截短或丢弃；数值越大越重要，默认 0。"
+          >
+            <InputNumber precision={0} placeholder="0" style={{ width: 200 }} />
+          </Form.Item>
         </Form>
       </Modal>
 
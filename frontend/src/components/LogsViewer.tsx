@@ -1,7 +1,7 @@
 import React, { useState, useEffect, useMemo, useCallback } from 'react';
 import { Table, Tag, Button, Tooltip, Space, Input, message, Popconfirm, Switch, Collapse, Modal } from 'antd';
-import type { Log } from '../types';
-import { getLogs, clearLogs } from '../api';
+import type { LogSummary } from '../types';
+import { getLogs, getLog, getLogsCount, clearLogs } from '../api';
 import { ReloadOutlined, DeleteOutlined, SearchOutlined, CopyOutlined } from '@ant-design/icons';
 import type { ColumnsType } from 'antd/es/table';
 
@@ -11,6 +11,7 @@ interface Props {
 
 const GROUP_BY_STOCK_STORAGE_KEY = 'ai_watch_stock.logsViewer.groupByStock';
 const AI_REQUEST_PAYLOAD_MARKER = 'AI Request Payload:\n';
+const LOGS_PAGE_SIZE = 100;
 
 const parseAiRequestPayloadFromRawData = (text: string) => {
   const raw = text ?? '';
@@ -97,8 +98,11 @@ const RenderRawData: React.FC<{ text: string }> = React.memo(({ text }) => {
 });
 
 const LogsViewer: React.FC<Props> = ({ stockId }) => {
-  const [logs, setLogs] = useState<Log[]>([]);
+  const [logs, setLogs] = useState<LogSummary[]>([]);
+  const [total, setTotal] = useState(0);
+  const [hasMore, setHasMore] = useState(false);
   const [loading, setLoading] = useState(false);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [searchText, setSearchText] = useState('');
   const [selectedRowKeys, setSelectedRowKeys] = useState<React.Key[]>([]);
   const [detailModal, setDetailModal] = useState<{ open: boolean; title: string; content: string }>({
@@ -125,22 +129,51 @@ const LogsViewer: React.FC<Props> = ({ stockId }) => {
     }
   }, [groupByStock]);
 
-  const fetchLogs = useCallback(async () => {
+  // keepLoaded: 定时刷新时只合并最新一页，保留已经“加载更多”取到的旧日志
+  const fetchLogs = useCallback(async (keepLoaded = false) => {
     setLoading(true);
     try {
-      const res = await getLogs();
-      let data = res.data;
-      if (stockId) {
-        data = data.filter(l => l.stock_id === stockId);
+      const [res, countRes] = await Promise.all([
+        getLogs({ stockId, limit: LOGS_PAGE_SIZE }),
+        getLogsCount(stockId),
+      ]);
+      const data = res.data;
+      if (keepLoaded) {
+        setLogs(prev => {
+          const last = data[data.length - 1];
+          if (!last || prev.length <= data.length) return data;
+          const ids = new Set(data.map(l => l.id));
+          const older = prev.filter(l => !ids.has(l.id) && l.id < last.id);
+          return [...data, ...older];
+        });
+        setHasMore(h => h || data.length >= LOGS_PAGE_SIZE);
+      } else {
+        setLogs(data);
+        setHasMore(data.length >= LOGS_PAGE_SIZE);
+      }
+      setTotal(countRes.data.total);
+      if (!keepLoaded) {
+        // Clear selection after refresh if items are gone
+        setSelectedRowKeys(keys => keys.filter(k => data.find(l => l.id === k)));
       }
-      setLogs(data);
-      // Clear selection after refresh if items are gone
-      setSelectedRowKeys(keys => keys.filter(k => data.find(l => l.id === k)));
     } finally {
       setLoading(false);
     }
   }, [stockId]);
 
+  const fetchMoreLogs = useCallback(async () => {
+    const last = logs[logs.length - 1];
+    if (!last) return;
+    setLoadingMore(true);
+    try {
+      const res = await getLogs({ stockId, limit: LOGS_PAGE_SIZE, beforeId: last.id });
+      setLogs(prev => [...prev, ...res.data.filter(l => !prev.some(p => p.id === l.id))]);
+      setHasMore(res.data.length >= LOGS_PAGE_SIZE);
+    } finally {
+      setLoadingMore(false);
+    }
+  }, [logs, stockId]);
+
   const handleClear = useCallback(async (ids?: number[]) => {
     try {
       await clearLogs(ids);
@@ -156,7 +189,7 @@ const LogsViewer: React.FC<Props> = ({ stockId }) => {
 
   useEffect(() => {
     fetchLogs();
-    const interval = setInterval(fetchLogs, 10000);
+    const interval = setInterval(() => fetchLogs(true), 10000);
     return () => clearInterval(interval);
   }, [fetchLogs]);
 
@@ -172,7 +205,7 @@ const LogsViewer: React.FC<Props> = ({ stockId }) => {
 
   const groupedLogs = useMemo(() => {
     if (!groupByStock) return null;
-    const groups: Record<string, Log[]> = {};
+    const groups: Record<string, LogSummary[]> = {};
     filteredLogs.forEach(log => {
       const key = log.stock ? `${log.stock.name} (${log.stock.symbol})` : '未分类';
       if (!groups[key]) groups[key] = [];
@@ -188,17 +221,35 @@ const LogsViewer: React.FC<Props> = ({ stockId }) => {
     },
   };
 
-  const handleCopyLog = useCallback((log: Log) => {
-    const content = JSON.stringify(log, null, 2);
-    navigator.clipboard.writeText(content).then(() => {
+  const handleCopyLog = useCallback(async (log: LogSummary) => {
+    try {
+      const res = await getLog(log.id);
+      const content = JSON.stringify(res.data, null, 2);
+      await navigator.clipboard.writeText(content);
       message.success('日志信息已复制');
-    });
+    } catch {
+      message.error('获取日志详情失败');
+    }
   }, []);
 
   const openDetailModal = useCallback((title: string, content: string) => {
     setDetailModal({ open: true, title, content: content ?? '' });
   }, []);
 
+  // 列表接口不返回 raw_data / ai_response，查看时再按 id 拉取详情
+  const openLogFieldModal = useCallback(async (title: string, log: LogSummary, field: 'raw_data' | 'ai_response') => {
+    try {
+      const res = await getLog(log.id);
+      let content = res.data[field] ?? '';
+      if (field === 'ai_response' && !content && typeof log.ai_analysis?.raw_response === 'string') {
+        content = log.ai_analysis.raw_response;
+      }
+      openDetailModal(title, content);
+    } catch {
+      message.error('获取日志详情失败');
+    }
+  }, [openDetailModal]);
+
   // Pre-compute stock filters to avoid recalculating on every render
   const stockFilters = useMemo(() => {
     return Array.from(new Set(logs.map(l => l.stock ? `${l.stock.name}|${l.stock.symbol}` : '')))
@@ -209,7 +260,7 @@ const LogsViewer: React.FC<Props> = ({ stockId }) => {
       });
   }, [logs]);
 
-  const columns: ColumnsType<Log> = useMemo(() => [
+  const columns: ColumnsType<LogSummary> = useMemo(() => [
     {
       title: '时间',
       dataIndex: 'timestamp',
@@ -336,53 +387,23 @@ const LogsViewer: React.FC<Props> = ({ stockId }) => {
     },
     {
       title: 'AI 原始返回',
-      dataIndex: 'ai_response',
       key: 'ai_response',
-      width: 200,
-      render: (text, record) => {
-        const rawFromAiAnalysis = typeof record.ai_analysis?.raw_response === 'string' ? record.ai_analysis.raw_response : '';
-        const displayText = (text && String(text)) || rawFromAiAnalysis || '';
-        const previewText = displayText.length > 100 ? displayText.slice(0, 100) + '...' : displayText;
-        return (
-          <Space direction="vertical" size={0}>
-            <Button type="link" size="small" onClick={() => openDetailModal(`AI 原始返回：${record.stock?.symbol ?? record.stock_id}`, displayText)}>
-              查看完整
-            </Button>
-            <div style={{
-              fontFamily: 'monospace',
-              color: '#666',
-              fontSize: '12px',
-            }}>
-              {previewText}
-            </div>
-          </Space>
-        );
-      },
+      width: 120,
+      render: (_, record) => (
+        <Button type="link" size="small" onClick={() => openLogFieldModal(`AI 原始返回：${record.stock?.symbol ?? record.stock_id}`, record, 'ai_response')}>
+          查看完整
+        </Button>
+      ),
     },
     {
       title: '发送内容',
-      dataIndex: 'raw_data',
       key: 'raw_data',
-      width: 200,
-      render: (text, record) => {
-        const previewText = text?.length > 100 ? text.slice(0, 100) + '...' : (text ?? '');
-        return (
-          <Space direction="vertical" size={0}>
-            <Button type="link" size="small" onClick={() => openDetailModal(`发送内容：${record.stock?.symbol ?? record.stock_id}`, text)}>
-              查看完整
-            </Button>
-            <div
-              style={{
-                fontFamily: 'monospace',
-                color: '#666',
-                fontSize: '12px',
-              }}
-            >
-              {previewText}
-            </div>
-          </Space>
-        );
-      },
+      width: 120,
+      render: (_, record) => (
+        <Button type="link" size="small" onClick={() => openLogFieldModal(`发送内容：${record.stock?.symbol ?? record.stock_id}`, record, 'raw_data')}>
+          查看完整
+        </Button>
+      ),
     },
     {
       title: '操作',
@@ -397,7 +418,7 @@ const LogsViewer: React.FC<Props> = ({ stockId }) => {
         />
       )
     }
-  ], [stockFilters, openDetailModal, handleCopyLog]);
+  ], [stockFilters, openDetailModal, openLogFieldModal, handleCopyLog]);
 
   return (
     <div>
@@ -421,7 +442,7 @@ const LogsViewer: React.FC<Props> = ({ stockId }) => {
             checkedChildren="分组" 
             unCheckedChildren="列表" 
           />
-          <Button icon={<ReloadOutlined />} onClick={fetchLogs}>刷新</Button>
+          <Button icon={<ReloadOutlined />} onClick={() => fetchLogs()}>刷新</Button>
           <Input 
             placeholder="搜索股票名称/代码/消息..." 
             prefix={<SearchOutlined />} 
@@ -482,6 +503,12 @@ const LogsViewer: React.FC<Props> = ({ stockId }) => {
           scroll={{ x: 'max-content' }}
         />
       )}
+      <div style={{ marginTop: 16, display: 'flex', justifyContent: 'center', alignItems: 'center', gap: 12 }}>
+        <span style={{ color: '#999' }}>已加载 {logs.length} / {total} 条</span>
+        {hasMore && (
+          <Button onClick={fetchMoreLogs} loading={loadingMore}>加载更多</Button>
+        )}
+      </div>
     </div>
   );
 };
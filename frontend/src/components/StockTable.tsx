@@ -439,7 +439,8 @@ const StockTable: React.FC = () => {
             </div>
             {testResult.data_truncated && (
               <div style={{ marginBottom: 8 }}>
-                提示：数据过长已截断（最多 {testResult.data_char_limit ?? '-'} 字符）
+                提示：数据超出上下文预算已截断（最多 {testResult.data_token_limit ?? '-'} tokens）
+                {testResult.data_dropped?.length ? `，已丢弃低优先级指标：${testResult.data_dropped.join('、')}` : ''}
               </div>
             )}
             {testResult.system_prompt ? (
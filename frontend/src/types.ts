@@ -56,6 +56,8 @@ export interface IndicatorDefinition {
   name: string;
   python_code?: string | null;
   is_pinned?: boolean;
+  cache_ttl_seconds?: number | null;
+  priority?: number | null;
 }
 
 export interface IndicatorTestRequest {
@@ -126,6 +128,15 @@ export interface Log {
   stock?: Stock;
 }
 
+export interface LogSummary {
+  id: number;
+  stock_id: number;
+  timestamp: string;
+  ai_analysis: AIAnalysisResult;
+  is_alert: boolean;
+  stock?: { id: number; symbol: string; name: string };
+}
+
 export interface StockTestRunResponse {
   ok: boolean;
   run_id?: string | null;
@@ -147,7 +158,8 @@ export interface StockTestRunResponse {
   raw_response?: string | null;
 
   data_truncated?: boolean | null;
-  data_char_limit?: number | null;
+  data_token_limit?: number | null;
+  data_dropped?: string[] | null;
 
   fetch_ok?: number | null;
   fetch_error?: number | null;